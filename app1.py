@@ -1,10 +1,23 @@
 import os
 import streamlit as st
-from supabase import create_client, Client
+from streamlit.errors import StreamlitAPIException
+from postgrest.exceptions import APIError
+from supabase import ClientOptions, create_client, Client
 from typing import List
-from datetime import datetime
+from urllib.parse import urlencode
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 load_dotenv()
+from fetch_layer import DEFAULT_TIMEOUT, BackendUnavailable, CacheWarmer, run_query, swr_cached
+from catalogue import (RatingRecord, SeriesCatalogue, UserRecord, build_records, platform_index, series_image,
+                       user_search_index)
+from presence import HEARTBEAT_SECONDS, LobbyView, presence
+from party_index import load_user_party_index
+from render import card, grid, inject_styles, render_html
+from social import SocialGraph, load_friendships, load_recent_ratings
+from events import EventTracker
+from write_queue import RatingWriteQueue
+from schedule import PARTY_DURATION, between_query, format_party_time, happening_now_query, normalize_party_time, upcoming_query
 
 
 # -----------------------
@@ -18,14 +31,23 @@ SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
 # ID inicial (fijo)
 INITIAL_USER_ID = os.environ.get("DEFAULT_USER_ID", "U1")
 
-# Inicializar estado de usuario si no existe
+# Inicializar estado de usuario si no existe. Las cards son links que recargan
+# la página (sesión nueva): traen el usuario activo en `?user=`
 if "current_user_id" not in st.session_state:
-    st.session_state["current_user_id"] = INITIAL_USER_ID
+    st.session_state["current_user_id"] = st.query_params.get("user", INITIAL_USER_ID)
 
 # ⚠️ CLAVE: Ahora DEFAULT_USER_ID cambia según lo que elijas en el dropdown
 DEFAULT_USER_ID = st.session_state["current_user_id"]
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# SCREENMATES_BACKEND=local usa los CSV en memoria (sin red), p. ej. para loadtest.py
+if os.environ.get("SCREENMATES_BACKEND") == "local":
+    import local_backend
+    supabase = local_backend.create_client()
+else:
+    # Timeout HTTP igual al de fetch_layer: una llamada que ya venció no
+    # sigue ocupando un worker del pool por minutos
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY,
+                                     options=ClientOptions(postgrest_client_timeout=DEFAULT_TIMEOUT))
 
 if "show_tutorial" not in st.session_state:
     st.session_state["show_tutorial"] = True  # Activado por defecto
@@ -48,7 +70,7 @@ def show_page_guide(page_name):
         "Series": """
             ### 🔎 Catálogo de Series
             - **Filtros:** Usa los controles superiores para buscar por género, año o cantidad de episodios.
-            - **Detalles:** Haz clic en "Ver detalles" para ver la sinopsis, plataformas y reseñas.
+            - **Detalles:** Haz clic en una serie para ver la sinopsis, plataformas y reseñas.
             - **Acciones:** Desde el detalle puedes agregar series a tu *Watchlist* o dejar tu propia reseña.
         """,
         "Watch Parties": """
@@ -75,6 +97,7 @@ def show_page_guide(page_name):
         "Mi Watchlist": """
             ### 📝 Qué ver a continuación
             - Lleva registro de tus series pendientes, ratealas, o márcalas como vista.
+            - **Tip:** Selecciona varias filas de la tabla para marcarlas, calificarlas o quitarlas todas juntas.
             - No hace falta perderse en un mar de series por ver, están todas aquí.
         """
     }
@@ -93,42 +116,174 @@ def show_page_guide(page_name):
 # -----------------------
 # Utility helpers
 # -----------------------
-@st.cache_data(show_spinner=False)
+SERIES_PAGE_SIZE = 1000
+
+@swr_cached(shared=True)
+def fetch_series_store():
+    """Catálogo completo, una sola copia por proceso. Todas las vistas de series salen de acá."""
+    rows = []
+    while True:
+        resp = supabase.table("series").select("*").order("id").range(len(rows), len(rows) + SERIES_PAGE_SIZE - 1).execute()
+        page = resp.data or []
+        rows.extend(page)
+        if len(page) < SERIES_PAGE_SIZE:
+            break
+    return SeriesCatalogue(rows)
+
 def fetch_series(limit=100):
-    resp = supabase.table("series").select("*").limit(limit).execute()
-    return resp.data or []
+    return fetch_series_store().rows[:limit]
 
-@st.cache_data(show_spinner=False)
 def fetch_series_by_id(id):
-    resp = supabase.table("series").select("*").eq("id", id).limit(1).execute()
+    by_id = fetch_series_store().by_id
+    if id in by_id:
+        return by_id[id]
+    try:
+        return by_id.get(int(id))
+    except (TypeError, ValueError):
+        return None
+
+def series_href(series) -> str:
+    return "?" + urlencode({"page": "Series", "series_id": series.get("id"), "user": DEFAULT_USER_ID})
+
+WP_PAGE_SIZE = 12
+
+# Piden una fila de más para saber si hay página siguiente
+@swr_cached(ttl=30, shared=True)
+def fetch_upcoming_watchparties(offset=0):
+    return upcoming_query(supabase.table("watchparties"), datetime.now(), offset, WP_PAGE_SIZE + 1).execute().data or []
+
+@swr_cached(ttl=30, shared=True)
+def fetch_happening_watchparties(offset=0):
+    return happening_now_query(supabase.table("watchparties"), datetime.now(), offset, WP_PAGE_SIZE + 1).execute().data or []
+
+@swr_cached(ttl=30, shared=True)
+def fetch_watchparties_between(start, end, offset=0):
+    return between_query(supabase.table("watchparties"), start, end, offset, WP_PAGE_SIZE + 1).execute().data or []
+
+@swr_cached(ttl=30, shared=True)
+def fetch_watchparties_by_ids(watchparty_ids, offset=0):
+    if not watchparty_ids:
+        return []
+    return supabase.table("watchparties").select("*").in_("watchparty_id", list(watchparty_ids)) \
+        .order("time").range(offset, offset + WP_PAGE_SIZE).execute().data or []
+
+def series_duration(series):
+    minutes = series.get("runtime") if series else None
+    return timedelta(minutes=minutes) if minutes else PARTY_DURATION
+
+# Se actualiza en el lugar y tiene locks: no va a la caché compartida.
+# Sin timeout global: el scan pone uno por página
+@swr_cached(ttl=300, timeout=None)
+def fetch_user_party_index():
+    return load_user_party_index(supabase, lambda series_id: series_duration(fetch_series_by_id(series_id)))
+
+@swr_cached(ttl=300, timeout=None, shared=True)
+def fetch_friendships():
+    return load_friendships(supabase)
+
+# Los ratings que escriben otras réplicas: cada recarga rearma los feeds
+@swr_cached(ttl=60, shared=True)
+def fetch_recent_ratings():
+    return load_recent_ratings(supabase)
+
+# Uno por proceso: las amistades sólo se suman al grafo y los feeds se
+# rearman cuando cambian los ratings recientes, sin perder el fan-out local
+@st.cache_resource
+def social_graph():
+    return SocialGraph()
+
+def fetch_social_graph():
+    graph = social_graph()
+    graph.merge_friends(fetch_friendships())
+    ratings = fetch_recent_ratings()
+    # La lectura pudo empezar hasta un timeout antes de que se guardara
+    graph.reseed(ratings, age=fetch_recent_ratings.age() + DEFAULT_TIMEOUT)
+    return graph
+
+@swr_cached(shared=True)
+def fetch_watchparty(watchparty_id):
+    resp = supabase.table("watchparties").select("*").eq("watchparty_id", watchparty_id).limit(1).execute()
     return resp.data[0] if resp.data else None
 
-@st.cache_data(show_spinner=False)
-def fetch_watchparties(limit=100):
-    resp = supabase.table("watchparties").select("*").limit(limit).execute()
-    return resp.data or []
+USERS_PAGE_SIZE = 1000
 
-@st.cache_data(show_spinner=False)
+# PostgREST corta cada respuesta en max-rows (1000 por defecto): se pagina por
+# user_id, con un timeout por página y no uno para todo el scan
+@swr_cached(timeout=None, shared=True)
 def fetch_users():
-    resp = supabase.table("users").select("*").execute()
-    return resp.data or []
+    rows = []
+    while True:
+        query = supabase.table("users").select("*").order("user_id").limit(USERS_PAGE_SIZE)
+        if rows:
+            query = query.gt("user_id", rows[-1]["user_id"])
+        page = run_query(query).data or []
+        rows.extend(page)
+        if len(page) < USERS_PAGE_SIZE:
+            break
+    return build_records(UserRecord, rows)
+
+def fetch_user_index():
+    return user_search_index(fetch_users())
+
+def fetch_platform_index():
+    return platform_index(fetch_series_store(), fetch_users())
 
-@st.cache_data(show_spinner=False)
 def fetch_platforms():
-    resp = supabase.table("series").select("platforms").execute()
-    data = resp.data or []
-    unique_plats = set()
-    for row in data:
-        if row.get("platforms"): 
-            for p in row["platforms"]:
-                unique_plats.add(p)
-                
-    return sorted(list(unique_plats))
-
-@st.cache_data(show_spinner=False)
+    index = fetch_platform_index()
+    used = 0
+    for mask in index.series_masks:
+        used |= mask
+    return index.names_of(used)
+
+def fetch_series_by_platform(name):
+    index = fetch_platform_index()
+    bit = index.bits.get(name, 0)
+    return [s for s in fetch_series_store().rows if index.series_masks[s.idx] & bit]
+
+@swr_cached(shared=True)
 def fetch_ratings_for_series(id):
     resp = supabase.table("ratings").select("*").eq("id", id).execute()
-    return resp.data or []
+    return build_records(RatingRecord, resp.data)
+
+def rerun_fragment():
+    # Fuera de un rerun de fragmento (p. ej. AppTest, que siempre corre el script entero) no hay fragmento que reejecutar
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+def backend_unavailable(e):
+    st.error(f"⚠️ No pudimos conectar con la base de datos ({e}). Intenta de nuevo en unos segundos.")
+    st.stop()
+
+def clear_watchparty_caches(watchparty_id=None):
+    fetch_upcoming_watchparties.clear()
+    fetch_happening_watchparties.clear()
+    fetch_watchparties_between.clear()
+    fetch_watchparties_by_ids.clear()
+    if watchparty_id is not None:
+        # Las listas se refrescan en segundo plano; la party que se acaba de
+        # tocar se relee ya, para que su card no muestre la lista vieja. Las
+        # demás filas no cambiaron: siguen frescas y la página no las relee
+        fetch_watchparty.invalidate(watchparty_id)
+        try:
+            fetch_watchparty.refresh(watchparty_id)
+        except BackendUnavailable:
+            pass
+
+def update_party_views(update_index, members=None):
+    # La escritura ya entró: si el índice o el grafo no se pueden cargar
+    # ahora, no se reporta como error (el usuario reintentaría y duplicaría
+    # la party); se ponen al día solos en su próximo refresco
+    try:
+        update_index(fetch_user_party_index())
+    except BackendUnavailable:
+        pass
+    if members:
+        try:
+            fetch_social_graph().connect(members)
+        except BackendUnavailable:
+            pass
 
 def create_watchparty(series_id: int, host: str, time_iso: str, platforms: str, participants: List[str]):
     try:
@@ -151,7 +306,7 @@ def create_watchparty(series_id: int, host: str, time_iso: str, platforms: str,
             "watchparty_id": new_id,
             "series": series_id,
             "host": host,
-            "time": time_iso,
+            "time": normalize_party_time(time_iso),
             "platforms": platforms,
             "participants": clean_participants 
         }
@@ -160,6 +315,9 @@ def create_watchparty(series_id: int, host: str, time_iso: str, platforms: str,
 
         if hasattr(res, 'error') and res.error:
             return False, f"Supabase Error: {res.error}"
+        update_party_views(lambda index: index.add_party(new_id, host, clean_participants, payload["time"], series_id),
+                           [host] + clean_participants)
+        clear_watchparty_caches()
             
         return True, res.data[0]
 
@@ -167,14 +325,16 @@ def create_watchparty(series_id: int, host: str, time_iso: str, platforms: str,
         return False, f"Python Error: {str(e)}"
 
 def add_participant_to_watchparty(watchparty_id: str, participant_id: str):
-    current_wp = supabase.table("watchparties").select("participants").eq("watchparty_id", watchparty_id).single().execute()
+    current_wp = supabase.table("watchparties").select("participants, host").eq("watchparty_id", watchparty_id).single().execute()
     current_list = current_wp.data.get("participants") or []
 
     if participant_id not in current_list:
         current_list.append(participant_id)
 
         res = supabase.table("watchparties").update({"participants": current_list}).eq("watchparty_id", watchparty_id).execute()
-        fetch_watchparties.clear()
+        update_party_views(lambda index: index.add_participant(watchparty_id, participant_id),
+                           [current_wp.data.get("host")] + current_list)
+        clear_watchparty_caches(watchparty_id)
         return True, None
     else:
         return False, "User already in party"
@@ -187,110 +347,319 @@ def remove_participant_from_watchparty(watchparty_id: str, participant_id: str):
         current_list.remove(participant_id)
 
         res = supabase.table("watchparties").update({"participants": current_list}).eq("watchparty_id", watchparty_id).execute()
-        fetch_watchparties.clear()
+        update_party_views(lambda index: index.remove_participant(watchparty_id, participant_id))
+        clear_watchparty_caches(watchparty_id)
         return res
     return None
 
-def add_rating(user_id: str, id: int, stars: int, review: str = "", status: str = "watched"):
-    payload = {
-        "user_id": user_id,
-        "id": id,
-        "stars": stars,
-        "review": review,
-        "status": status
-    }
-    res = supabase.table("ratings").insert(payload).execute()
+def write_ratings(rows):
+    run_query(supabase.table("ratings").upsert(rows, on_conflict="user_id,id"))
+
+def delete_ratings(user_id, series_ids):
+    run_query(supabase.table("ratings").delete().eq("user_id", user_id).in_("id", list(series_ids)))
+
+def on_ratings_written(written):
     fetch_ratings_for_series.clear()
-    return res
+    # La cola sigue superponiendo estas filas hasta que esto termina: las
+    # reseñas que alguien tiene en pantalla se releen ya, así no desaparecen
+    # entre que se escriben y se refresca la caché
+    for series_id in {series_id for _, series_id in written}:
+        if fetch_ratings_for_series.age(series_id) is not None:
+            try:
+                fetch_ratings_for_series.refresh(series_id)
+            except BackendUnavailable:
+                pass
+    graph = fetch_social_graph()
+    for r in written.values():
+        if r is not None and r["status"] == "watched" and r["stars"] is not None:
+            graph.publish_rating(r["user_id"], r["id"], r["stars"])
+
+def rejected_by_database(e):
+    # Constraint, dato o columna inválidos: reintentar no lo arregla
+    cause = e.__cause__ if isinstance(e, BackendUnavailable) else e
+    return isinstance(cause, APIError) and str(cause.code or "")[:2] in ("22", "23", "42")
+
+# Una cola por proceso: las escrituras de todas las sesiones se juntan en el mismo upsert
+@st.cache_resource
+def rating_queue():
+    return RatingWriteQueue(write_ratings, delete_ratings, on_ratings_written, permanent=rejected_by_database)
+
+def record_events(batch):
+    run_query(supabase.table("view_events").insert([
+        {"kind": kind, "subject_id": str(subject_id), "user_id": user_id,
+         "at": datetime.fromtimestamp(at).isoformat(timespec="seconds")}
+        for kind, subject_id, user_id, at in batch
+    ]))
+
+# Vistas y clicks: se juntan en memoria y se escriben por lotes (ver events.py)
+@st.cache_resource
+def event_tracker():
+    return EventTracker(record_events)
+
+def add_rating(user_id: str, id: int, stars: int, review: str = "", status: str = "watched"):
+    # Reemplaza el rating anterior del usuario para esa serie; se escribe en segundo plano
+    return rating_queue().submit(user_id, id, stars, review, status)
 
 def add_to_watchlist(user_id: str, id: int):
     return add_rating(user_id, id, stars=None, review="", status="watchlist")
 
-SERIES_IMAGES = {
-    "How I Met Your Mother": "https://disney.images.edge.bamgrid.com/ripcut-delivery/v2/variant/disney/559b4b05-9c8e-4e19-89d2-30a74febb0c0/compose?aspectRatio=1.78&format=webp&width=1200",
-    "Suits ": "https://image-cdn.netflixjunkie.com/wp-content/uploads/imago0141810645h-scaled-e1693036504112.jpg",
-    "The Big Bang Theory ": "https://beam-images.warnermediacdn.com/BEAM_LWM_DELIVERABLES/c8ea8e19-cae7-4683-9b62-cdbbed744784/914da85b-244a-11ef-8e04-12093494333d?host=wbd-images.prod-vod.h264.io&partner=beamcom",
-    "New Girl ": "https://adictasromantica.com/wp-content/uploads/2018/01/new-girl.jpg?w=640",
-    "Brooklyn 99": "https://i.blogs.es/397810/brooklyn-99-temporada-8/650_1200.jpeg",
-    "Community ": "https://encrypted-tbn1.gstatic.com/images?q=tbn:ANd9GcTPuFUIZ_IOYN8XQzLL0XXcKT7j-JbnqFcOUCUw-h6EyIupeJeIqDCECItir7yldkLCHiBj1w",
-    "The O.C.": "https://beam-images.warnermediacdn.com/BEAM_LWM_DELIVERABLES/893e4fea-3137-44c7-a6ab-9f6ee9914981/4b51289ba9bbdeae7cf80ca1f7bbf3b7eea6a4d3.jpg?host=wbd-images.prod-vod.h264.io&partner=beamcom&w=500",
-    "The Flash ": "https://ntvb.tmsimg.com/assets/p10781465_b_h8_ay.jpg?w=960&h=540g",
-    "Supergirl ": "https://film-book.com/wp-content/uploads/2021/02/supergirl-season-six-tv-show-poster-01-700x400-1.jpg",
-    "WandaVision": "https://disney.images.edge.bamgrid.com/ripcut-delivery/v2/variant/disney/44f18e37-cce7-4813-b407-fc8d2ebe3f60/compose?aspectRatio=1.78&format=webp&width=1200",
-    "Yellowstone": "https://www.mlive.com/resizer/v2/LOGYPARDQBCKDML2IIH5ESOIGI.jpg?auth=06545d3a992e72cb2da7aa4566c7965ecd5806936e71a13329850544269079b6&width=800&smart=true&quality=90",
-    "The Office (US)": "https://resizing.flixster.com/KHP8WIWqGr-3MmT1Sa9GvDtb3Q8=/fit-in/705x460/v2/https://resizing.flixster.com/-XZAfHZM39UwaGJIFWKAE8fS0ak=/v3/t/assets/p185008_b_h9_ac.jpg",
-    "The Summer I Turned Pretty": "https://m.media-amazon.com/images/S/pv-target-images/4a68ee50fe8a1fb1147ad9fca8d2c48e4c86c8243397c3d687e54a3e1bfcf322.png",
-    "The Bear": "https://s10019.cdn.ncms.io/wp-content/uploads/2024/05/The-Bear.png",
-    "Gilmore Girls ": "https://beam-images.warnermediacdn.com/BEAM_LWM_DELIVERABLES/72bd8235-6bf8-41ef-bc78-14e0f7292c73/76f121d1-fb04-11ef-93b6-12953788022d?host=wbd-images.prod-vod.h264.io&partner=beamcom"
-}
-def get_image_for_series(name: str) -> str:
-    return SERIES_IMAGES.get(name, "https://via.placeholder.com/300x450?text=No+Image")
+def rate_many(user_id: str, ratings, stars: int):
+    """Marca como vistas (o recalifica) varias series en una sola escritura; conserva las reseñas."""
+    rating_queue().submit_many([
+        {"user_id": user_id, "id": r["id"], "stars": stars, "review": r.get("review") or "", "status": "watched"}
+        for r in ratings
+    ])
+
+def remove_ratings(user_id: str, series_ids):
+    rating_queue().remove(user_id, series_ids)
+
+def fetch_my_ratings(user_id: str):
+    # Una sola query: los ratings del usuario con los datos de la serie embebidos
+    rows = run_query(
+        supabase.table("ratings")
+        .select("user_id, id, stars, review, status, series(name, genre, year)")
+        .eq("user_id", user_id)
+    ).data or []
+    return rating_queue().overlay(rows, user_id=user_id)
+
+# Una sola vez por proceso: precarga el catálogo antes del primer render y lo
+# refresca en segundo plano, así ningún rerun paga una carga en frío.
+@st.cache_resource(show_spinner="Preparando ScreenMates...")
+def start_cache_warmer():
+    return CacheWarmer([
+        (fetch_users, (), {}),
+        (fetch_upcoming_watchparties, (), {}),
+        (fetch_happening_watchparties, (), {}),
+        (fetch_user_party_index, (), {}),
+        (fetch_friendships, (), {}),
+        (fetch_recent_ratings, (), {}),
+        (fetch_series_store, (), {}),
+    ]).start()
+
+
+# -----------------------
+# Fragments
+# -----------------------
+# Cada acción (unirse, marcar vista, reseñar) reejecuta solo su fragmento con
+# sus propios datos, no todo el script con el sidebar y las queries de la página.
+
+@st.fragment
+def watchparty_card(wp_id, user_map):
+    try:
+        wp = fetch_watchparty(wp_id)
+    except BackendUnavailable:
+        st.caption(f"⚠️ No pudimos cargar la party {wp_id}.")
+        return
+    if not wp:
+        return
+    # La fila ya dice quién está: la card no depende del índice de parties
+    is_host = wp.get("host") == DEFAULT_USER_ID
+    is_guest = DEFAULT_USER_ID in (wp.get("participants") or [])
+    series_obj = fetch_series_by_id(wp.get("series")) or {}
+    host_username = user_map.get(wp.get("host"), wp.get("host"))
+    usernames = [user_map.get(pid, "Usuario desconocido") for pid in (wp.get("participants") or [])]
+
+    with st.container():
+        render_html(card(
+            "wp_card",
+            title=series_obj.get('name', '(No title)'),
+            host=host_username or '—',
+            time=format_party_time(wp.get('time')),
+            participants=', '.join(usernames) or '—',
+        ))
+
+        if is_host:
+            st.success("👑 Eres el anfitrión de esta party")
+            if st.button(f"Ingresa el Lobby 🎬", key=f"enter_{wp_id}"):
+                event_tracker().track("party_view", wp_id, DEFAULT_USER_ID)
+                st.session_state["page"] = "Party Lobby"
+                st.session_state["open_party"] = wp_id
+                st.rerun()
+
+        elif is_guest:
+            st.success("✅ Ya estás en esta party!")
+
+            c1, c2 = st.columns([1, 1])
+            with c1:
+                if st.button(f"Ingresa el Lobby 🎬", key=f"enter_{wp_id}"):
+                    event_tracker().track("party_view", wp_id, DEFAULT_USER_ID)
+                    st.session_state["page"] = "Party Lobby"
+                    st.session_state["open_party"] = wp_id
+                    st.rerun()
+            with c2:
+                if st.button(f"Dejar ❌", key=f"leave_{wp_id}"):
+                    remove_participant_from_watchparty(wp_id, DEFAULT_USER_ID)
+                    st.toast("Dejaste la party 👋")
+                    rerun_fragment()
+
+        else:
+            if st.button("Unirse", key=f"join_{wp_id}"):
+                event_tracker().track("party_join", wp_id, DEFAULT_USER_ID)
+                ok, err = add_participant_to_watchparty(wp_id, DEFAULT_USER_ID)
+                if ok:
+                    st.toast("Te uniste de manera exitosa! ✅")
+                    rerun_fragment()
+                else:
+                    st.warning(err or "Ya estás en esta party.")
+
+@st.fragment
+def series_interactions(series_id, names_by_id):
+    col1, col2 = st.columns([2, 1])
+
+    with col1:
+        st.markdown("### Reseñas de la comunidad")
+        reviews = rating_queue().overlay(fetch_ratings_for_series(series_id), series_id=series_id)
+        if not reviews:
+            st.write("No hay reseñas todavía.")
+        else:
+            for r in reviews:
+                st.write(f"- *{names_by_id.get(r.get('user_id'), r.get('user_id'))}* — {r.get('stars') or '-'} ★: {r.get('review') or ''}")
+
+        st.markdown("### Acciones")
+        if st.button("Agregar a mi watchlist"):
+            add_to_watchlist(DEFAULT_USER_ID, series_id)
+            st.toast("Agregada a la watchlist correctamente")
+            rerun_fragment()
+
+    with col2:
+        st.markdown("### Calificar esta serie")
+        stars = st.slider("Estrellas", 0, 10, 4)
+        review_text = st.text_area("Reseña", height=120)
+        if st.button("Enviar reseña"):
+            add_rating(
+                DEFAULT_USER_ID,
+                series_id,
+                stars,
+                review_text,
+                status="watched"
+            )
+            st.toast("¡Gracias por tu reseña!")
+            rerun_fragment()
+
+def ratings_table(rows, key, show_rating=False):
+    """Tabla con una columna para seleccionar; devuelve los ratings marcados."""
+    table = []
+    for r in rows:
+        s = r.get("series") or fetch_series_by_id(r.get("id")) or {}
+        item = {"Seleccionar": False, "Serie": s.get("name") or f"#{r.get('id')}",
+                "Género": s.get("genre") or "—", "Año": s.get("year")}
+        if show_rating:
+            item["Estrellas"] = r.get("stars")
+            item["Reseña"] = r.get("review") or ""
+        table.append(item)
+    edited = st.data_editor(
+        table,
+        key=key,
+        hide_index=True,
+        disabled=[c for c in (table[0] if table else {}) if c != "Seleccionar"],
+    )
+    return [r for r, item in zip(rows, edited) if item.get("Seleccionar")]
+
+@st.fragment
+def watchlist_panel():
+    try:
+        my_ratings = fetch_my_ratings(DEFAULT_USER_ID)
+    except BackendUnavailable as e:
+        st.error(f"⚠️ No pudimos cargar tu watchlist ({e}).")
+        return
+    watchlist = [r for r in my_ratings if r.get("status") == "watchlist"]
+    watched = [r for r in my_ratings if r.get("status") == "watched"]
+    # Cambiar la versión descarta las selecciones de las tablas después de cada acción
+    version = st.session_state.setdefault("watchlist_version", 0)
+
+    def done(message):
+        st.session_state["watchlist_version"] += 1
+        st.toast(message)
+        rerun_fragment()
+
+    st.subheader(f"Pendientes ({len(watchlist)})")
+    if not watchlist:
+        st.write("No tienes series pendientes.")
+    else:
+        selected = ratings_table(watchlist, key=f"watchlist_table_{version}")
+        col1, col2, col3 = st.columns([2, 1, 1])
+        stars = col1.slider("Estrellas para las marcadas", 0, 10, 7, key="watchlist_stars")
+        if col2.button("Marcar como vistas", disabled=not selected, key="watchlist_mark"):
+            rate_many(DEFAULT_USER_ID, selected, stars)
+            done(f"{len(selected)} series marcadas como vistas ✅")
+        if col3.button("Quitar", disabled=not selected, key="watchlist_remove"):
+            remove_ratings(DEFAULT_USER_ID, [r["id"] for r in selected])
+            done(f"{len(selected)} series quitadas de la watchlist")
+
+    st.subheader(f"Vistas ({len(watched)})")
+    if not watched:
+        st.write("Todavía no marcaste series como vistas.")
+    else:
+        selected = ratings_table(watched, key=f"watched_table_{version}", show_rating=True)
+        col1, col2, col3 = st.columns([2, 1, 1])
+        stars = col1.slider("Nueva calificación", 0, 10, 7, key="watched_stars")
+        if col2.button("Calificar", disabled=not selected, key="watched_rate"):
+            rate_many(DEFAULT_USER_ID, selected, stars)
+            done(f"{len(selected)} series calificadas ⭐")
+        if col3.button("Quitar", disabled=not selected, key="watched_remove"):
+            remove_ratings(DEFAULT_USER_ID, [r["id"] for r in selected])
+            done(f"{len(selected)} series quitadas")
 
 
 # -----------------------
 # UI
 # -----------------------
 st.set_page_config(page_title="ScreenMates", layout="wide")
-st.markdown("""
-<style>
-/* Fondo general */
-body, .stApp {
-    background-color: #0e1117;
-    color: #f5f5f5;
-    font-family: 'Inter', sans-serif;
-}
-
-/* Títulos */
-h1, h2, h3, h4 {
-    color: #ff6b6b;
-}
-
-/* Botones */
-.stButton>button {
-    background-color: #c91a4f;
-    color: white;
-    border-radius: 8px;
-    padding: 0.5rem 1rem;
-    border: none;
-    transition: 0.2s;
-}
-.stButton>button:hover {
-    background-color: #63b3ed;
-}
-
-/* Inputs */
-.stTextInput>div>div>input, .stTextArea>div>textarea {
-    border-radius: 6px;
-    border: 1px solid #444;
-    background-color: #1a1c22;
-    color: #fff;
-}
-
-/* Sidebar */
-section[data-testid="stSidebar"] {
-    background-color: #161a20;
-    padding-top: 1rem;
-}
-</style>
-""", unsafe_allow_html=True)
+start_cache_warmer()
+inject_styles()
 
 st.markdown("<h1 style='margin-bottom:0.2rem'>ScreenMates </h1>", unsafe_allow_html=True)
 
 
+# Link de una card (`?page=Series&series_id=…`): abre esa serie
+if "page" in st.query_params and "page" not in st.session_state:
+    st.session_state["page"] = st.query_params["page"]
+if "series_id" in st.query_params:
+    try:
+        linked_series = fetch_series_by_id(st.query_params["series_id"])
+    except BackendUnavailable as e:
+        backend_unavailable(e)
+    if linked_series and st.session_state.get("open_series") != linked_series.get("id"):
+        event_tracker().track("series_view", linked_series.get("id"), DEFAULT_USER_ID)
+        st.session_state["open_series"] = linked_series.get("id")
+        st.session_state["page"] = "Series"
+
 # Sidebar
 
 with st.sidebar:
     st.header("Perfil")
     
-    users = fetch_users()
+    try:
+        users = fetch_users()
+    except BackendUnavailable as e:
+        backend_unavailable(e)
     
-    current_user_obj = next((u for u in users if u.get("user_id") == DEFAULT_USER_ID), None)
+    user_index = fetch_user_index()
+    current_user_obj = user_index.by_id.get(DEFAULT_USER_ID)
     
     if current_user_obj:
         st.subheader(f"Hola, {current_user_obj.get('name')} 👋")
     else:
         st.subheader(DEFAULT_USER_ID)
 
+    # Los ratings se escriben en segundo plano: si la base los rechazó, se avisa acá
+    ratings_queue = rating_queue()
+    rejected = ratings_queue.rejections(DEFAULT_USER_ID)
+    if rejected:
+        names = ", ".join(
+            (fetch_series_by_id(series_id) or {}).get("name", f"serie {series_id}").strip()
+            for series_id, _, _ in rejected
+        )
+        error = rejected[0][2]
+        st.warning(f"⚠️ No pudimos guardar tus cambios en: {names}. "
+                   f"({getattr(error.__cause__, 'message', None) or error})")
+        if st.button("Entendido", key="dismiss_rating_errors"):
+            ratings_queue.dismiss(DEFAULT_USER_ID)
+            st.rerun()
+    elif ratings_queue.failures:
+        st.caption(f"⏳ Tus últimos cambios todavía no se guardaron; reintentamos en segundo plano. "
+                   f"({ratings_queue.last_error})")
+
     st.write("Pestañas")
     pages = ["Home", "Series", "Watch Parties", "Trending", "Plataformas", "Mi Watchlist", "Party Lobby"]
 
@@ -316,23 +685,22 @@ with st.sidebar:
 
     st.markdown("### 👤 Cambiar Usuario")
     
-    name_to_id = {u['name']: u['user_id'] for u in users if u.get('name')}
-    id_to_name = {v: k for k, v in name_to_id.items()}
+    # Solo se mandan al navegador el usuario actual y las coincidencias de la búsqueda
+    user_query = st.text_input("Buscar usuario", key="user_search_sidebar", placeholder="Escribe un nombre...")
+    switch_options = [DEFAULT_USER_ID] + [uid for uid in user_index.search(user_query) if uid != DEFAULT_USER_ID]
 
-    current_name_selection = id_to_name.get(DEFAULT_USER_ID)
-    
-    if current_name_selection:
-        selected_user_name = st.selectbox(
+    if current_user_obj:
+        new_user_id = st.selectbox(
             "Sesión activa:",
-            options=list(name_to_id.keys()),
-            index=list(name_to_id.keys()).index(current_name_selection),
+            options=switch_options,
+            index=0,
+            format_func=user_index.name,
             key="user_switcher_sidebar"
         )
 
-        new_user_id = name_to_id[selected_user_name]
         if new_user_id != st.session_state["current_user_id"]:
             st.session_state["current_user_id"] = new_user_id
-            st.toast(f"Cambiando perfil a {selected_user_name}...", icon="🔄")
+            st.toast(f"Cambiando perfil a {user_index.name(new_user_id)}...", icon="🔄")
             st.rerun()
 
 #-----------------------
@@ -345,85 +713,24 @@ if page == "Home":
     show_page_guide("Home")
     with col1: 
         st.markdown("## 🎬 En tendencia") 
-        series = fetch_series(limit=20) 
+        try:
+            series = fetch_series(limit=20)
+        except BackendUnavailable as e:
+            backend_unavailable(e)
         sorted_trend = sorted(series, key=lambda s: (s.get("rating") or 0), reverse=True)[:15]
  
-        st.markdown("""
-        <style>
-        .series-grid {
-          display: grid;
-          grid-template-columns: repeat(auto-fill, minmax(400px, 1fr));
-          gap: 20px;
-          margin-top: 1rem;
-        }
-        .series-item {
-          background-color: #1a1c22;
-          border-radius: 12px;
-                aspect-ratio: 7 / 3;
-                    width:500px;
-          text-align: center;
-                
-          padding: 12px;
-          box-shadow: 0 0 8px rgba(0,0,0,0.4);
-          transition: transform 0.25s ease;
-            width: 380px;
-        }
-        .series-item:hover {
-          transform: translateY(-5px);
-        }
-        .series-item img {
-          width: 100%;
-          border-radius: 12px;
-          height: 290px;
-          object-fit: cover;
-                    display: block;
-                    align-items: center;
-        }
-        .series-item h4 {
-          color: #ff6b6b;
-          margin: 0.4rem 0 0.2rem;
-          font-size: 1rem;
-        }
-        .series-item p {
-          color: #bbb;
-          margin: 0;
-          font-size: 0.85rem;
-        }
-        </style>
-        """, unsafe_allow_html=True)
-
-        st.markdown("<div class='series-grid'>", unsafe_allow_html=True)
-        
-
-        for s in sorted_trend:
-            name = s.get("name", "Serie sin nombre")
-            img_url = get_image_for_series(name)
-            genre = s.get("genre", "—")
-            year = s.get("year", "—")
-            rating = s.get("rating", "—")
-            series_id = s.get("id")
-
-            
-
-            st.markdown(
-        f"""
-        <div class='series-item'>
-            <img src="{img_url}" alt="{name}">
-            <h4>{name}</h4>
-            <p>{genre} • {year}</p>
-            <p>⭐ {rating}</p>
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
-            if st.button("Ver detalles", key=f"details_{series_id}"):
-                st.session_state["open_series"] = series_id
-                st.session_state["page"] = "Series"
-                st.rerun()
-
-
-
-        st.markdown("</div>", unsafe_allow_html=True)
+        render_html(grid("home-grid", (
+            card(
+                "home_card",
+                img=series_image(s.get("name", "Serie sin nombre")),
+                name=s.get("name", "Serie sin nombre"),
+                genre=s.get("genre", "—"),
+                year=s.get("year", "—"),
+                rating=s.get("rating", "—"),
+                href=series_href(s),
+            )
+            for s in sorted_trend
+        )))
 
     with col2: 
         st.markdown("### 🍿 Crea una watch party") 
@@ -442,28 +749,66 @@ if page == "Home":
         
         available_platforms = current_series.get("platforms") or []
 
+        # Primero las plataformas que tienen el host y todos los invitados
+        plat_index = fetch_platform_index()
+        party_ids = [DEFAULT_USER_ID] + list(st.session_state.get("invite_ids", []))
+        shared = plat_index.series_mask(current_series) & plat_index.shared_mask(party_ids)
+        shared_platforms = plat_index.names_of(shared)
+        if shared_platforms:
+            available_platforms = shared_platforms + [p for p in available_platforms if p not in shared_platforms]
+
         if available_platforms:
             platform = st.selectbox("Plataforma", options=available_platforms)
+            if not shared_platforms:
+                st.caption("Ninguna plataforma de esta serie la tienen todos los participantes.")
         else:
             platform = st.text_input("Plataforma (ej. Netflix)")
 
-        date = st.date_input("Fecha", value=datetime.now().date()) 
-        time = st.time_input("Hora", key="time_input", value=st.session_state.get("time_input", datetime.now().time()))
+        st.session_state.setdefault("party_date", datetime.now().date())
+        st.session_state.setdefault("time_input", datetime.now().time())
+        date = st.date_input("Fecha", key="party_date") 
+        time = st.time_input("Hora", key="time_input")
         dt = datetime.combine(date, time)
 
-        all_users = fetch_users()
-        user_map = {u['name']: u['user_id'] for u in all_users if u.get('name')}
-        
-        selected_names = st.multiselect(
+        user_index = fetch_user_index()
+        invite_query = st.text_input("Buscar amigos", key="invite_search", placeholder="Escribe un nombre...")
+        already_invited = list(st.session_state.get("invite_ids", []))
+        invited_ids = st.multiselect(
             "Invita participantes", 
-            options=list(user_map.keys()),
-            placeholder="Selecciona amigos..."
+            options=already_invited + [uid for uid in user_index.search(invite_query) if uid not in already_invited and uid != DEFAULT_USER_ID],
+            format_func=user_index.name,
+            placeholder="Selecciona amigos...",
+            key="invite_ids"
         )
 
-        if st.button("Crear watchparty"): 
-            st.info("Procesando...")
+        # Chequeo de superposición contra el índice de intervalos por usuario
+        try:
+            party_index = fetch_user_party_index()
+        except BackendUnavailable:
+            party_index = None
+            st.caption("⚠️ No pudimos revisar si se superpone con otras watch parties. Intenta de nuevo en unos segundos.")
+        duration = series_duration(current_series)
+        clashes = party_index.conflicts([DEFAULT_USER_ID] + invited_ids, dt, dt + duration) if party_index else []
+        force_create = False
+        if clashes:
+            lines = [f"- {user_index.name(uid)}: {wid} ({format_party_time(start)})" for uid, wid, start, _ in clashes]
+            st.warning("⚠️ Se superpone con otras watch parties:\n" + "\n".join(lines))
+
+            def use_slot(slot):
+                st.session_state["party_date"] = slot.date()
+                st.session_state["time_input"] = slot.time()
+
+            slots = party_index.suggest_free_slots(
+                [DEFAULT_USER_ID] + invited_ids, duration, max(datetime.now(), datetime.combine(date, datetime.min.time()))
+            )
+            if slots:
+                st.caption("Horarios libres para todos:")
+                for slot in slots:
+                    st.button(f"🕒 {slot.strftime('%d/%m %H:%M')}", key=f"slot_{slot.isoformat()}", on_click=use_slot, args=(slot,))
+            force_create = st.checkbox("Crear de todos modos")
 
-            invited_ids = [user_map[name] for name in selected_names]
+        if st.button("Crear watchparty", disabled=bool(clashes) and not force_create): 
+            st.info("Procesando...")
 
             ok, msg = create_watchparty(
                 int(sel), 
@@ -485,10 +830,13 @@ if page == "Series":
     st.header("Catálogo de Series")
     show_page_guide("Series")
     selected_series = None
-    all_series = fetch_series(limit=500)
+    try:
+        all_series = fetch_series(limit=500)
+    except BackendUnavailable as e:
+        backend_unavailable(e)
     series = all_series 
-    user_data = supabase.table("users").select("platforms").eq("user_id", DEFAULT_USER_ID).single().execute()
-    my_platforms_set = set(user_data.data.get("platforms") or [])
+    plat_index = fetch_platform_index()
+    my_platforms_mask = plat_index.user_mask(DEFAULT_USER_ID)
     with st.expander("🔎 Buscar o filtrar catálogo", expanded=False):
         search_query = st.text_input("Buscar por título", placeholder="Ej: Breaking Bad")
 
@@ -505,7 +853,7 @@ if page == "Series":
             selected_year = st.selectbox("Filtrar por año", ["Todos"] + [str(y) for y in years_list])
         with col3:
             filter_by_my_platforms = st.checkbox("Series disponibles en mis plataformas")
-            if filter_by_my_platforms and not my_platforms_set:
+            if filter_by_my_platforms and not my_platforms_mask:
                  st.caption("⚠️ No tienes plataformas configuradas en tu perfil.")
             ep_min, ep_max = st.slider(
                 "Rango de episodios",
@@ -529,11 +877,7 @@ if page == "Series":
                 genre_match = selected_genre == "Todos" or s.get("genre") == selected_genre
                 year_match = selected_year == "Todos" or str(s.get("year")) == selected_year
                 episodes_match = ep_min <= (s.get("episodes") or 0) <= ep_max
-                platform_match = True
-                if filter_by_my_platforms:
-                    series_plats_set = set(s.get("platforms") or [])
-                    if my_platforms_set.isdisjoint(series_plats_set):
-                        platform_match = False
+                platform_match = not filter_by_my_platforms or plat_index.available(s, my_platforms_mask)
 
                 if name_match and genre_match and year_match and episodes_match and platform_match:
                     filtered.append(s)
@@ -543,7 +887,6 @@ if page == "Series":
             if not series:
                 st.warning("No se encontraron series con estos filtros.")
 
-    users = fetch_users()
     series_to_open = st.session_state.get("open_series", None)
     if series_to_open:
         selected_series = fetch_series_by_id(series_to_open)
@@ -552,75 +895,22 @@ if page == "Series":
     if selected_series:
         st.markdown("---")
         st.subheader(selected_series.get("name"))
-        col1, col2 = st.columns([2, 1])
-
-        with col1:
-            plat_list = selected_series.get('platforms') or []
-            plat_str = ", ".join(plat_list)
-            st.markdown(f"*Género:* {selected_series.get('genre', '—')}")
-            st.markdown(f"*Año:* {selected_series.get('year', '—')}")
-            st.markdown(f"*Episodios:* {selected_series.get('episodes', '—')}")
-            st.markdown(f"*Plataformas:* {plat_str}")
-            st.markdown(f"*Rating promedio:* {selected_series.get('rating', '—')}")
-
-            st.markdown("### Reseñas de la comunidad")
-            reviews = fetch_ratings_for_series(selected_series.get("id"))
-            if not reviews:
-                st.write("No hay reseñas todavía.")
-            else:
-                for r in reviews:
-                    u = next((uu for uu in users if uu.get("user_id") == r.get("user_id")), {})
-                    st.write(f"- *{u.get('name', r.get('user_id'))}* — {r.get('stars') or '-'} ★: {r.get('review') or ''}")
-
-            st.markdown("### Acciones")
-            if st.button("Agregar a mi watchlist"):
-                supabase.table("ratings") \
-                    .delete() \
-                    .eq("user_id", DEFAULT_USER_ID) \
-                    .eq("id", selected_series.get("id")) \
-                    .execute()
-                res = supabase.table("ratings").insert({
-                    "user_id": DEFAULT_USER_ID,
-                    "id": selected_series.get("id"),
-                    "stars": None,
-                    "review": "",
-                    "status": "watchlist"
-                }).execute()
-
-                if not res or getattr(res, "error", None):
-                    st.error("No se pudo agregar a la watchlist")
-                else:
-                    st.success("Agregada a la watchlist correctamente")
-        
-
-
-            if st.button("⬅ Volver al catálogo"):
-                if "open_series" in st.session_state:
-                    del st.session_state["open_series"]
-                st.rerun()
-
-        with col2:
-            st.markdown("### Calificar esta serie")
-            stars = st.slider("Estrellas", 0, 10, 4)
-            review_text = st.text_area("Reseña", height=120)
-            if st.button("Enviar reseña"):
-                supabase.table("ratings") \
-                    .delete() \
-                    .eq("user_id", DEFAULT_USER_ID) \
-                    .eq("id", selected_series.get("id")) \
-                    .execute()
-                res = add_rating(
-                    DEFAULT_USER_ID,
-                    selected_series.get("id"),
-                    stars,
-                    review_text,
-                    status="watched"
-                )
-                if not res or getattr(res, "error", None):
-                    st.error("No se pudo enviar la reseña")
-                else:
-                    st.success("¡Gracias por tu reseña!")
-                    fetch_ratings_for_series.clear()
+        plat_list = selected_series.get('platforms') or []
+        plat_str = ", ".join(plat_list)
+        st.markdown(f"*Género:* {selected_series.get('genre', '—')}")
+        st.markdown(f"*Año:* {selected_series.get('year', '—')}")
+        st.markdown(f"*Episodios:* {selected_series.get('episodes', '—')}")
+        st.markdown(f"*Plataformas:* {plat_str}")
+        st.markdown(f"*Rating promedio:* {selected_series.get('rating', '—')}")
+
+        series_interactions(selected_series.get("id"), user_index.names_by_id)
+
+        if st.button("⬅ Volver al catálogo"):
+            if "open_series" in st.session_state:
+                del st.session_state["open_series"]
+            if "series_id" in st.query_params:
+                del st.query_params["series_id"]
+            st.rerun()
 
 
 
@@ -631,132 +921,20 @@ if page == "Series":
             st.query_params["page"] = "Home"
             st.rerun()
 
-        # 💅 Estilos tipo Netflix pero con tamaño fijo
-        st.markdown("""
-        <style>
-        /* ======= GRID ======= */
-        .series-grid {
-          display: grid;
-          grid-template-columns: repeat(auto-fill, minmax(260px, 0px)); /* ancho fijo */
-          justify-content: center; /* centra el grid horizontalmente */
-          gap: 28px;
-          margin-top: 2rem;
-        }
-
-        /* ======= CARD ======= */
-        .series-card {
-          position: relative;
-          width: 650px;       /* ancho fijo */
-          height: 430px;      /* alto fijo */
-          border-radius: 12px;
-          overflow: hidden;
-          background-color: #1a1c22;
-          box-shadow: 0 4px 10px rgba(0,0,0,0.3);
-          transition: transform 0.25s ease, box-shadow 0.25s ease;
-          flex-shrink: 0;
-        }
-
-        .series-card:hover {
-          transform: scale(1.05);
-          box-shadow: 0 8px 20px rgba(0,0,0,0.6);
-        }
-
-        /* ======= IMAGEN ======= */
-        .series-card img {
-          width: 100%;
-          height: 100%;
-          object-fit: cover; /* mantiene proporción */
-          border-radius: 12px;
-          transition: opacity 0.25s ease, transform 0.25s ease;
-        }
-
-        /* ======= OVERLAY ======= */
-        .series-overlay {
-          position: absolute;
-          top: 0;
-          left: 0;
-          width: 100%;
-          height: 100%;
-          background: rgba(0, 0, 0, 0.75);
-          opacity: 0;
-          transition: opacity 0.3s ease;
-          display: flex;
-          flex-direction: column;
-          justify-content: center;
-          align-items: center;
-          padding: 10px;
-          text-align: center;
-        }
-
-        .series-card:hover .series-overlay {
-          opacity: 1;
-        }
-
-        .series-overlay h4 {
-          color: #fff;
-          font-size: 1rem;
-          margin-bottom: 6px;
-        }
-
-        .series-overlay p {
-          color: #bbb;
-          font-size: 0.85rem;
-          margin: 0;
-        }
-
-        /* ======= BOTÓN ======= */
-        .details-btn {
-          background-color: #ff2e63;
-          color: white;
-          border: none;
-          border-radius: 8px;
-          padding: 0.5rem 1rem;
-          margin-top: 10px;
-          cursor: pointer;
-          transition: background 0.25s ease;
-        }
-
-        .details-btn:hover {
-          background-color: #63b3ed;
-        }
-        </style>
-        """, unsafe_allow_html=True)
-
         # 💠 Grilla principal
-        st.markdown("<div class='series-grid'>", unsafe_allow_html=True)
-
-        for s in series:
-            name = s.get("name", "Sin nombre")
-            genre = s.get("genre", "—")
-            year = s.get("year", "—")
-            rating = s.get("rating", "—")
-            episodes = s.get("episodes", "—")
-            img = get_image_for_series(name)
-            series_id = s.get("id")
-
-            st.markdown(
-                f"""
-                <div class="series-card">
-                    <img src="{img}" alt="{name}">
-                    <div class="series-overlay">
-                        <h4>{name}</h4>
-                        <p>{genre} • {year}</p>
-                        <p>⭐ {rating} — {episodes} episodios</p>
-                    </div>
-                </div>
-                """,
-                unsafe_allow_html=True
+        render_html(grid("series-grid", (
+            card(
+                "series_card",
+                img=series_image(s.get("name", "Sin nombre")),
+                name=s.get("name", "Sin nombre"),
+                genre=s.get("genre", "—"),
+                year=s.get("year", "—"),
+                rating=s.get("rating", "—"),
+                episodes=s.get("episodes", "—"),
+                href=series_href(s),
             )
-
-            # 🔹 Botón Streamlit real debajo de la card
-            if st.button(f"Ver detalles de {name}", key=f"open_{series_id}"):
-                st.session_state["open_series"] = series_id
-                st.session_state["page"] = "Series"
-                st.query_params["page"] = "Series"
-                st.query_params["series_id"] = str(series_id)
-                st.rerun()
-
-        st.markdown("</div>", unsafe_allow_html=True)
+            for s in series
+        )))
 
 
 # -----------------------
@@ -765,160 +943,105 @@ if page == "Series":
 if page == "Watch Parties":
     st.header("🍿 Watch Parties")
     show_page_guide("Watch Parties")
-    wps = fetch_watchparties()
-    all_users = fetch_users()
-    user_map = {u["user_id"]: u["name"] for u in all_users}
+    wp_view = st.radio("Mostrar", ["Próximas", "En curso", "Por fecha", "Mis parties"], horizontal=True, key="wp_view")
+    if wp_view == "Por fecha":
+        c_from, c_to = st.columns(2)
+        with c_from:
+            wp_from = st.date_input("Desde", value=datetime.now().date(), key="wp_from")
+        with c_to:
+            wp_to = st.date_input("Hasta", value=datetime.now().date() + timedelta(days=30), key="wp_to")
+    else:
+        wp_from = wp_to = None
+
+    # Volver a la primera página cuando cambia el filtro
+    if st.session_state.get("wp_page_filter") != (wp_view, wp_from, wp_to):
+        st.session_state["wp_page_filter"] = (wp_view, wp_from, wp_to)
+        st.session_state["wp_page"] = 0
+    wp_offset = st.session_state["wp_page"] * WP_PAGE_SIZE
+
+    try:
+        if wp_view == "Mis parties":
+            my_hosted, my_invited = fetch_user_party_index().parties_for(DEFAULT_USER_ID)
+            wps = fetch_watchparties_by_ids(tuple(sorted(my_hosted | my_invited)), wp_offset)
+        elif wp_view == "Próximas":
+            wps = fetch_upcoming_watchparties(wp_offset)
+        elif wp_view == "En curso":
+            wps = fetch_happening_watchparties(wp_offset)
+        else:
+            wps = fetch_watchparties_between(wp_from, wp_to, wp_offset)
+    except BackendUnavailable as e:
+        backend_unavailable(e)
+    has_next_page = len(wps) > WP_PAGE_SIZE
+    wps = wps[:WP_PAGE_SIZE]
+    user_map = user_index.names_by_id
 
     if not wps:
-        st.info("No hay watch parties todavía.")
+        st.info("No hay watch parties para mostrar.")
     else:
-        # 🎨 CSS para las tarjetas
-        st.markdown("""
-        <style>
-        .wp-grid {
-          display: grid;
-          grid-template-columns: repeat(auto-fill, minmax(400px, 1fr));
-          gap: 20px;
-          margin-top: 1.5rem;
-        }
-        .wp-card {
-          background-color: #1a1c22;
-          border-radius: 10px;
-          padding: 16px;
-          box-shadow: 0 2px 8px rgba(0,0,0,0.4);
-          transition: transform 0.25s ease;
-        }
-        .wp-card:hover {
-          transform: translateY(-4px);
-        }
-        .wp-title {
-          color: #ff6b6b;
-          font-weight: 600;
-          margin-bottom: 4px;
-        }
-        .wp-details {
-          color: #ddd;
-          font-size: 0.9rem;
-        }
-        .wp-participants {
-          color: #bbb;
-          font-size: 0.85rem;
-          margin-top: 8px;
-        }
-        </style>
-        """, unsafe_allow_html=True)
-
-        st.markdown("<div class='wp-grid'>", unsafe_allow_html=True)
+        # Cada card es un fragmento con sus propios botones, así que no se juntan en un solo payload
         for wp in wps:
             wp_id = wp.get("watchparty_id") or wp.get("id")
+            fetch_watchparty.prime(wp, wp_id)
+            watchparty_card(wp_id, user_map)
 
-            series_id = wp.get("series")
-            series_obj = {}
-            if series_id:
-                series_resp = supabase.table("series").select("name").eq("id", series_id).execute()
-                if series_resp.data:
-                    series_obj = series_resp.data[0]
-
-            host_username = wp.get("host")
-            if host_username:
-                host_resp = supabase.table("users").select("name").eq("user_id", wp.get("host")).execute()
-                if host_resp.data:
-                    host_username = host_resp.data[0].get("name")
-
-            participants_resp = supabase.table("watchparties").select("participants").eq("watchparty_id", wp_id).execute()
-            participants = [p.get("participant") for p in (participants_resp.data or [])]
-
-            p_ids = wp.get("participants") or []
-            usernames = [user_map.get(pid, "Usuario desconocido") for pid in p_ids]
-
-            with st.container():
-                st.markdown(f"""
-                <div class='wp-card'>
-                    <div class='wp-title'>{series_obj.get('name','(No title)')}</div>
-                    <div class='wp-details'>Anfitrión: <b>{host_username or '—'}</b></div>
-                    <div class='wp-details'>🕒 {wp.get('time') or '—'}</div>
-                    <div class='wp-participants'>👥 Participantes: {', '.join(usernames) or '—'}</div>
-                </div>
-                """, unsafe_allow_html=True)
-
-                if DEFAULT_USER_ID in participants:
-                    st.success("✅ Ya estás en esta party!")
-
-                    c1, c2 = st.columns([1, 1])
-                    with c1:
-                        if st.button(f"Ingresa el Lobby 🎬", key=f"enter_{wp_id}"):
-                            st.session_state["page"] = "Party Lobby"
-                            st.session_state["open_party"] = wp_id
-                            st.rerun()
-                    with c2:
-                        if st.button(f"Dejar ❌", key=f"leave_{wp_id}"):
-                            remove_participant_from_watchparty(wp_id, DEFAULT_USER_ID)
-                            st.success("Dejaste la party 👋")
-                            st.rerun()
-
-                else:
-                    if st.button("Unirse", key=f"join_{wp_id}"):
-                        ok, err = add_participant_to_watchparty(wp_id, DEFAULT_USER_ID)
-                        if ok:
-                            st.success("Te uniste de manera exitosa! ✅")
-                            st.rerun()
-                        else:
-                            st.warning(err or "Ya estás en esta party.")
-        
-        st.markdown("</div>", unsafe_allow_html=True)
+    c_prev, c_next = st.columns(2)
+    with c_prev:
+        if st.session_state["wp_page"] > 0 and st.button("⬅ Anteriores", key="wp_prev"):
+            st.session_state["wp_page"] -= 1
+            st.rerun()
+    with c_next:
+        if has_next_page and st.button("Siguientes ➡", key="wp_next"):
+            st.session_state["wp_page"] += 1
+            st.rerun()
 
 # -----------------------
 # Party Lobby
 # -----------------------
+@st.fragment(run_every=HEARTBEAT_SECONDS)
+def lobby_presence(party_id, names_by_id):
+    # Corre solo cada HEARTBEAT_SECONDS: heartbeat + deltas del canal, sin queries
+    view = st.session_state.get("lobby_view")
+    if view is None or view.party_id != party_id or view.user_id != DEFAULT_USER_ID:
+        if view is not None:
+            view.close()
+        view = st.session_state["lobby_view"] = LobbyView(presence, party_id, DEFAULT_USER_ID)
+    here = view.heartbeat()
+    names = sorted(names_by_id.get(uid, uid) for uid in here)
+    st.markdown(f"**🟢 En sala ({len(names)}):** {', '.join(names) or '—'}")
+
+if page != "Party Lobby" and "lobby_view" in st.session_state:
+    st.session_state.pop("lobby_view").close()
+
 if page == "Party Lobby":
     wp_id = st.session_state.get("open_party", None)
     show_page_guide("Party Lobby")
     if not wp_id:
         st.warning("No hay party seleccionada. Ingresa el lobby en la sección de Watch Parties.")
     else:
-        # 🔹 Buscar la watchparty
-        wp = None
-        for key in ["watchparty_id", "id"]:
-            try:
-                res = supabase.table("watchparties").select("*").eq(key, wp_id).execute()
-                if res.data:
-                    wp = res.data[0]
-                    break
-            except Exception:
-                continue
+        try:
+            wp = fetch_watchparty(wp_id)
+        except BackendUnavailable as e:
+            backend_unavailable(e)
 
         if not wp:
             st.error("❌ No se encontró esta Watch Party en la base de datos.")
         else:
-            series_obj = {}
-            series_id = wp.get("series")
-            if series_id:
-                s_res = supabase.table("series").select("name").eq("id", series_id).execute()
-                if s_res.data:
-                    series_obj = s_res.data[0]
-
-            host_username = wp.get("host")
-            if host_username:
-                host_res = supabase.table("users").select("name").eq("user_id", wp.get("host")).execute()
-                if host_res.data:
-                    host_username = host_res.data[0].get("name")
-
-            participants_resp = supabase.table("participants").select("participant").eq("watchparty_id", wp_id).execute()
-            participant_ids = [p.get("participant") for p in (participants_resp.data or [])]
-
-            participant_names = []
-            if participant_ids:
-                users_res = supabase.table("users").select("user_id, name").in_("user_id", participant_ids).execute()
-                participant_names = [u.get("name") for u in (users_res.data or [])]
+            names_by_id = user_index.names_by_id
+            series_obj = fetch_series_by_id(wp.get("series")) or {}
+            host_username = names_by_id.get(wp.get("host"), wp.get("host"))
+            participant_names = [names_by_id.get(pid, pid) for pid in (wp.get("participants") or [])]
 
             st.header(f"🎬 Watch Party — {series_obj.get('name', '(No title)')}")
             st.markdown(f"**Anfitrión:** {host_username or '—'}")
-            st.markdown(f"**Hora:** {wp.get('time', '—')}")
+            st.markdown(f"**Hora:** {format_party_time(wp.get('time'))}")
             st.markdown(f"**Plataforma:** {wp.get('platforms', '—')}")
             st.markdown(f"**Participantes:** {', '.join(participant_names) or '—'}")
 
+            lobby_presence(wp_id, names_by_id)
+
             if st.button("⬅ Volver a Watch Parties"):
                 del st.session_state["open_party"]
+                st.session_state.pop("lobby_view").close()
                 st.session_state["page"] = "Watch Parties"
                 st.rerun()
 
@@ -928,115 +1051,41 @@ if page == "Party Lobby":
 if page == "Trending":
     st.header("🔥 Trending & Recomendaciones")
     show_page_guide("Trending")
-    series = fetch_series(limit=200)
-    users = fetch_users()
+    try:
+        series = fetch_series(limit=200)
+        friends_feed = fetch_social_graph().feed(DEFAULT_USER_ID)
+    except BackendUnavailable as e:
+        backend_unavailable(e)
     top_rated = sorted(series, key=lambda s: (s.get("rating") or 0), reverse=True)[:10]
-    recent_ratings = supabase.table("ratings").select("*").order("id", desc=True).limit(10).execute().data or []
-
-    # 🎨 CSS para el diseño dividido
-    st.markdown("""
-    <style>
-    .trend-container {
-        display: grid;
-        grid-template-columns: 1.5fr 1fr;
-        gap: 30px;
-        margin-top: 1.5rem;
-    }
-    .trend-card, .friends-card {
-        background-color: #1a1c22;
-        border-radius: 12px;
-        padding: 20px;
-        box-shadow: 0 2px 8px rgba(0,0,0,0.4);
-    }
-    .trend-title {
-        color: #ff6b6b;
-        font-weight: 700;
-        font-size: 1.4rem;
-        margin-bottom: 1rem;
-    }
-    .series-item {
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-        padding: 8px 0;
-        border-bottom: 1px solid #2a2d33;
-        transition: background 0.2s ease;
-    }
-    .series-item:hover {
-        background: rgba(255,255,255,0.03);
-    }
-    .series-name {
-        color: #f1f1f1;
-        font-weight: 600;
-    }
-    .series-meta {
-        color: #aaa;
-        font-size: 0.85rem;
-    }
-    .series-rating {
-        color: #ffd43b;
-        font-weight: 600;
-    }
-    .friend-item {
-        border-bottom: 1px solid #2a2d33;
-        padding: 6px 0;
-        font-size: 0.9rem;
-    }
-    .friend-name {
-        color: #63b3ed;
-        font-weight: 500;
-    }
-    .friend-series {
-        color: #f5f5f5;
-        font-weight: 500;
-    }
-    .friend-stars {
-        color: #ffd43b;
-        margin-left: 4px;
-    }
-    </style>
-    """, unsafe_allow_html=True)
-
-    st.markdown("<div class='trend-container'>", unsafe_allow_html=True)
-
-    # 🔹 COLUMNA IZQUIERDA – Top Rated
-    st.markdown("<div class='trend-card'>", unsafe_allow_html=True)
-    st.markdown("<div class='trend-title'>⭐ Top Ratings</div>", unsafe_allow_html=True)
-
-    for s in top_rated:
-        st.markdown(f"""
-        <div class='series-item'>
-            <div>
-                <div class='series-name'>{s.get("name", "—")}</div>
-                <div class='series-meta'>{s.get("genre","—")} • {s.get("year","—")}</div>
-            </div>
-            <div class='series-rating'>⭐ {s.get("rating","—")}</div>
-        </div>
-        """, unsafe_allow_html=True)
-
-    st.markdown("</div>", unsafe_allow_html=True)
-
-    # 🔹 COLUMNA DERECHA – Friends' Picks
-    st.markdown("<div class='friends-card'>", unsafe_allow_html=True)
-    st.markdown("<div class='trend-title'>👥 Favoritas de tus amigos</div>", unsafe_allow_html=True)
-
-    if not recent_ratings:
-        st.markdown("<p style='color:#bbb;'>Sin ratings recientes.</p>", unsafe_allow_html=True)
+
+    top_html = "".join(
+        card("trend_item", name=s.get("name", "—"), genre=s.get("genre", "—"), year=s.get("year", "—"), rating=s.get("rating", "—"))
+        for s in top_rated
+    )
+
+    most_viewed = event_tracker().top("series_view", limit=5)
+    if not most_viewed:
+        views_html = "<p style='color:#bbb;'>Todavía no hay vistas en las últimas 24 h.</p>"
     else:
-        for r in recent_ratings:
-            u = next((uu for uu in users if uu.get("user_id") == r.get("user_id")), {})
-            s = fetch_series_by_id(r.get("id")) or {}
-            stars = "★" * int(r.get("stars") or 0)
-            st.markdown(f"""
-            <div class='friend-item'>
-                <span class='friend-name'>{u.get('name','Unknown')}</span> rated 
-                <span class='friend-series'>{s.get('name','—')}</span>
-                <span class='friend-stars'>{stars}</span>
-            </div>
-            """, unsafe_allow_html=True)
-
-    st.markdown("</div>", unsafe_allow_html=True)
-    st.markdown("</div>", unsafe_allow_html=True)
+        views_html = "".join(
+            card("views_item", name=(fetch_series_by_id(series_id) or {}).get("name", "—"), views=views, viewers=viewers)
+            for series_id, views, viewers in most_viewed
+        )
+
+    if not friends_feed:
+        friends_html = "<p style='color:#bbb;'>Tus amigos todavía no calificaron series. ¡Organiza una watch party!</p>"
+    else:
+        friends_html = ""
+        for friend_id, series_id, stars in friends_feed:
+            s = fetch_series_by_id(series_id) or {}
+            friends_html += card("friend_item", user=user_index.name(friend_id), series=s.get('name', '—'), stars="★" * int(stars or 0))
+
+    # Las dos columnas en un solo payload
+    render_html(grid("trend-container", [
+        grid("trend-card", ["<div class='trend-title'>⭐ Top Ratings</div>", top_html,
+                            "<div class='trend-title'>👀 Más vistas (24 h)</div>", views_html]),
+        grid("friends-card", ["<div class='trend-title'>👥 Favoritas de tus amigos</div>", friends_html]),
+    ]))
 
 
 # -----------------------
@@ -1047,90 +1096,19 @@ if page == "Plataformas":
     st.write("💡Platformas disponibles")
     show_page_guide("Plataformas")
 
-    plats = fetch_platforms()
-
-    # 💅 Estilos visuales
-    st.markdown("""
-    <style>
-    .platform-container {
-      display: grid;
-      grid-template-columns: repeat(auto-fill, minmax(320px, 1fr));
-      gap: 40px;
-      margin-top: 2rem;
-    }
-
-    .platform-card {
-      background-color: #1a1c22;
-      border-radius: 14px;
-      padding: 1.2rem 1.5rem;
-      box-shadow: 0 4px 12px rgba(0,0,0,0.35);
-      transition: transform 0.25s ease, box-shadow 0.25s ease;
-                gap: 40px;
-    }
-
-    .platform-card:hover {
-      transform: translateY(-5px);
-      box-shadow: 0 8px 20px rgba(0,0,0,0.55);
-    }
-
-    .platform-title {
-      font-size: 1.3rem;
-      font-weight: 600;
-      margin-bottom: 0.8rem;
-      color: #ff6b6b;
-    }
-
-    .platform-list {
-      list-style: none;
-      padding-left: 0;
-      margin: 0;
-    }
-
-    .platform-list li {
-      color: #ddd;
-      font-size: 0.95rem;
-      margin: 0.3rem 0;
-    }
-
-    .platform-list li::before {
-      content: "🎬 ";
-      opacity: 0.8;
-    }
-
-    /* Colores temáticos por plataforma */
-    .PrimeVideo .platform-title { color: #00a8e1; }
-    .DisneyPlus .platform-title { color: #006ce0; }
-    .Netflix .platform-title { color: #e50914; }
-    .HBO .platform-title { color: #6f42c1; }
-    .MercadoPlay .platform-title { color: #ffb300; }
-
-    </style>
-    """, unsafe_allow_html=True)
-
-    #Contenedor de plataformas
-    st.markdown("<div class='platform-container'>", unsafe_allow_html=True)
+    try:
+        plats = fetch_platforms()
+    except BackendUnavailable as e:
+        backend_unavailable(e)
 
+    platform_cards = []
     for name in plats:
-            try:
-                series_res = supabase.table("series").select("*").contains("platforms", [name]).execute()
-                series_list = series_res.data or []
-
-                if series_list:
-                    lis_html = "".join([f"<li>{s.get('name')} ({s.get('year')})</li>" for s in series_list])
-                    
-                    st.markdown(
-                        f"""
-                        <div class='platform-card'>
-                            <div class='platform-title'>{name}</div>
-                            <ul class='platform-list'>
-                                {lis_html}
-                            </ul>
-                        </div>
-                        """,
-                        unsafe_allow_html=True
-                    )
-            except Exception as e:
-                st.error(f"Error cargando plataforma {name}: {e}")
+        series_list = fetch_series_by_platform(name)
+        if series_list:
+            items = "".join(card("platform_item", name=s.get("name"), year=s.get("year")) for s in series_list)
+            platform_cards.append(card("platform_card", name=name, items=items))
+
+    render_html(grid("platform-container", platform_cards))
 
 # -----------------------
 # My Watchlist
@@ -1138,29 +1116,4 @@ if page == "Plataformas":
 if page == "Mi Watchlist":
     st.header("Mi Watchlist / Mis ratings")
     show_page_guide("Mi Watchlist")
-    my_ratings = supabase.table("ratings").select("*").eq("user_id", DEFAULT_USER_ID).execute().data or []
-    watchlist = [r for r in my_ratings if r.get("status") == "watchlist"]
-    watched = [r for r in my_ratings if r.get("status") == "watched"]
-
-    st.subheader("Pendientes")
-    for r in watchlist:
-        s = fetch_series_by_id(r.get("id"))
-        st.write(f"- {s.get('name')}")
-
-        if st.button(f"Marcar como vista", key=f"mark_{r.get('id')}"):
-            supabase.table("ratings") \
-                .delete() \
-                .eq("user_id", DEFAULT_USER_ID) \
-                .eq("id", r.get("id")) \
-                .eq("status", "watchlist") \
-                .execute()
-
-            add_rating(DEFAULT_USER_ID, r.get("id"), stars=7, review="", status="watched")
-
-            st.rerun()
-
-
-    st.subheader("Vistas")
-    for r in watched:
-        s = fetch_series_by_id(r.get("id"))
-        st.write(f"- {s.get('name')} — {r.get('stars') or '-'} ★ — {r.get('review') or ''}")
\ No newline at end of file
+    watchlist_panel()
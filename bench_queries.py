@@ -0,0 +1,273 @@
+"""Benchmark de las queries de cada página contra un Postgres local.
+
+Arma las tablas con el esquema de la app, las llena con datos sintéticos
+(reproducibles: `setseed`), corre `EXPLAIN (ANALYZE, BUFFERS)` de cada query
+de las páginas, aplica `migrations/*.sql` y vuelve a medir. Para cada query
+muestra el nodo de acceso principal, los índices usados y el tiempo de
+ejecución (mediana de `--repeat` corridas) antes y después. Las queries
+que usan columnas que agrega una migración (`ratings.rated_at`) sólo se miden
+después.
+
+    createdb screenmates_bench
+    python bench_queries.py --dsn postgresql://localhost/screenmates_bench
+    python bench_queries.py --ratings 5000000 --repeat 7 --json plan.json
+
+Necesita `psycopg` (o `psycopg2`); no es dependencia de la app. Borra y
+recrea las tablas users, series, watchparties y ratings de esa base: no
+apuntarlo a la de producción.
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+
+from schedule import PARTY_DURATION
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+PLATFORMS = ("Netflix", "Amazon Prime", "HBO Max", "Disney+", "Paramount+", "Claro Video", "Apple TV+")
+GENRES = ("Sitcom", "Drama", "Comedia", "Acción", "Ciencia ficción", "Romance", "Thriller")
+
+SCHEMA = """
+drop table if exists ratings, watchparties, series, users cascade;
+create table users (
+    user_id text primary key,
+    name text,
+    platforms text[]
+);
+create table series (
+    id integer primary key,
+    name text,
+    genre text,
+    year integer,
+    rating numeric,
+    episodes integer,
+    runtime integer,
+    platforms text[]
+);
+create table watchparties (
+    watchparty_id text,
+    time text,
+    host text,
+    participants text[],
+    platforms text,
+    series integer
+);
+create table ratings (
+    user_id text,
+    id integer,
+    stars integer,
+    review text,
+    status text
+);
+"""
+
+# Subconjunto al azar de plataformas por fila, con popularidad desigual (la
+# primera en ~50% de las filas, la última en ~7%). La correlación con g evita
+# que Postgres evalúe el subselect una sola vez.
+_RANDOM_PLATFORMS = ("array(select p from unnest(%(platforms)s::text[]) with ordinality t(p, i) "
+                     "where random() < 0.5 / i and g = g)")
+
+SEED = [
+    "select setseed(%(seed)s)",
+    "insert into users select 'U' || g, 'user' || g, " + _RANDOM_PLATFORMS
+    + " from generate_series(1, %(users)s) g",
+    "insert into series select g, 'Serie ' || g, (%(genres)s::text[])[1 + (random() * 6)::int], "
+    "1990 + (random() * 35)::int, round((5 + random() * 5)::numeric, 1), (6 + random() * 200)::int, "
+    "(20 + random() * 40)::int, " + _RANDOM_PLATFORMS + " from generate_series(1, %(series)s) g",
+    # Parties repartidas entre 30 días atrás y 30 adelante, con 1 a 6 invitados
+    "insert into watchparties select 'W' || g, "
+    "to_char(now() + (random() * 60 - 30) * interval '1 day', 'YYYY-MM-DD\"T\"HH24:MI:00'), "
+    "'U' || (1 + (random() * (%(users)s - 1))::int), "
+    "array(select 'U' || (1 + (random() * (%(users)s - 1))::int) from generate_series(1, 1 + (random() * 5)::int) "
+    "where g = g), (%(platforms)s::text[])[1 + (random() * 6)::int], 1 + (random() * (%(series)s - 1))::int "
+    "from generate_series(1, %(parties)s) g",
+    "insert into ratings select 'U' || u, s, case when st = 'watched' then 1 + (random() * 9)::int end, '', st "
+    "from (select distinct 1 + (random() * (%(users)s - 1))::int u, 1 + (random() * (%(series)s - 1))::int s, "
+    "case when random() < 0.6 then 'watched' else 'watchlist' end st "
+    "from generate_series(1, %(ratings)s)) x",
+]
+
+# (nombre, página, sql); los parámetros salen de `sample_params`. Son las
+# queries que arma la app (app1.py, schedule.py, party_index.py, social.py),
+# con el `limit`/`offset` que manda PostgREST para cada `.range()`.
+QUERIES = [
+    ("catálogo paginado", "Series", "select * from series order by id limit 1000 offset %(series_offset)s"),
+    ("reseñas de una serie", "Series", "select * from ratings where id = %(series_id)s"),
+    ("ratings de un usuario (join)", "Mi Watchlist",
+     "select r.user_id, r.id, r.stars, r.review, r.status, s.name, s.genre, s.year "
+     "from ratings r left join series s on s.id = r.id where r.user_id = %(user_id)s"),
+    ("últimos ratings (feed)", "Trending",
+     "select user_id, id, stars from ratings where status = 'watched' order by rated_at desc limit 500"),
+    ("party por id", "Party Lobby", "select * from watchparties where watchparty_id = %(party_id)s limit 1"),
+    ("mis parties", "Watch Parties",
+     "select * from watchparties where watchparty_id = any(%(party_ids)s::text[]) order by time limit 13"),
+    ("próximas parties", "Watch Parties",
+     "select * from watchparties where time >= %(now)s order by time limit 13"),
+    ("parties en curso", "Watch Parties",
+     "select * from watchparties where time > %(since)s and time <= %(now)s order by time limit 13"),
+    ("parties por fecha", "Watch Parties",
+     "select * from watchparties where time >= %(from)s and time < %(to)s order by time limit 13"),
+    # Los scans completos van por páginas con clave: se mide una del medio
+    ("índice de parties (página)", "Watch Parties",
+     "select watchparty_id, host, participants, time, series from watchparties "
+     "where watchparty_id > %(party_id)s order by watchparty_id limit 1000"),
+    ("amistades (página)", "Trending",
+     "select watchparty_id, host, participants from watchparties "
+     "where watchparty_id > %(party_id)s order by watchparty_id limit 1000"),
+]
+
+INDEX_NODES = {"Index Scan", "Index Only Scan", "Bitmap Index Scan"}
+
+
+def connect(dsn):
+    try:
+        import psycopg
+        # Parámetros interpolados del lado del cliente: EXPLAIN no siempre infiere sus tipos
+        return psycopg.connect(dsn, autocommit=True, cursor_factory=psycopg.ClientCursor)
+    except ImportError:
+        pass
+    try:
+        import psycopg2
+    except ImportError:
+        sys.exit("Instala psycopg (pip install psycopg[binary]) para correr el benchmark.")
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    return conn
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from plan_nodes(child)
+
+
+def summarize(explain: list) -> dict:
+    """Nodo de acceso principal, índices usados y tiempo de un EXPLAIN en JSON."""
+    root = explain[0]
+    nodes = list(plan_nodes(root["Plan"]))
+    scans = [n for n in nodes if "Scan" in n["Node Type"]]
+    return {
+        "access": scans[0]["Node Type"] if scans else nodes[0]["Node Type"],
+        "indexes": sorted({n["Index Name"] for n in nodes if n.get("Index Name")}),
+        "uses_index": any(n["Node Type"] in INDEX_NODES for n in nodes),
+        "seq_scans": sorted({n.get("Relation Name") for n in nodes if n["Node Type"] == "Seq Scan"}),
+        "ms": root["Execution Time"],
+    }
+
+
+def explain(cur, sql, params, repeat: int) -> dict:
+    """Resumen del plan; `None` si la query usa algo que agrega una migración (p. ej. `rated_at`)."""
+    try:
+        cur.execute("explain " + sql, params)
+        cur.fetchall()
+    except Exception as e:
+        print(f"  no corre todavía: {str(e).splitlines()[0]}", file=sys.stderr)
+        return None
+    runs = []
+    for _ in range(repeat):
+        cur.execute("explain (analyze, buffers, format json) " + sql, params)
+        result = cur.fetchone()[0]
+        runs.append(summarize(result if isinstance(result, list) else json.loads(result)))
+    summary = runs[-1]
+    summary["ms"] = statistics.median(r["ms"] for r in runs)
+    return summary
+
+
+def sample_params(cur) -> dict:
+    # Valores "calientes" pero reales: el usuario con más ratings, la serie con más reseñas
+    cur.execute("select user_id from ratings group by user_id order by count(*) desc limit 1")
+    user_id = cur.fetchone()[0]
+    cur.execute("select id from ratings group by id order by count(*) desc limit 1")
+    series_id = cur.fetchone()[0]
+    cur.execute("select watchparty_id from watchparties order by random() limit 1")
+    party_id = cur.fetchone()[0]
+    # "Mis parties" pide por id las del usuario que sale del índice en memoria
+    cur.execute("select coalesce(array_agg(watchparty_id), '{}') from watchparties "
+                "where host = %(user_id)s or %(user_id)s = any(participants)", {"user_id": user_id})
+    party_ids = cur.fetchone()[0]
+    cur.execute("select (count(*) / 2000) * 1000 from series")
+    series_offset = cur.fetchone()[0]
+    cur.execute("select to_char(now(), 'YYYY-MM-DD\"T\"HH24:MI:SS'), "
+                "to_char(now() - %(duration)s, 'YYYY-MM-DD\"T\"HH24:MI:SS'), "
+                "to_char(now() + interval '7 day', 'YYYY-MM-DD\"T\"HH24:MI:SS')",
+                {"duration": PARTY_DURATION})
+    now, since, week = cur.fetchone()
+    return {"user_id": user_id, "series_id": series_id, "series_offset": series_offset, "party_id": party_id,
+            "party_ids": party_ids, "now": now, "since": since, "from": now, "to": week}
+
+
+def load(cur, args):
+    params = {"seed": args.seed, "users": args.users, "series": args.series, "parties": args.parties,
+              "ratings": args.ratings, "platforms": list(PLATFORMS), "genres": list(GENRES)}
+    cur.execute(SCHEMA)
+    for sql in SEED:
+        cur.execute(sql, params)
+    cur.execute("analyze")
+
+
+def apply_migrations(cur, out=sys.stderr):
+    for path in sorted(glob.glob(os.path.join(MIGRATIONS, "*.sql"))):
+        print(f"aplicando {os.path.basename(path)}", file=out)
+        with open(path, encoding="utf-8") as f:
+            cur.execute(f.read())
+    cur.execute("analyze")
+
+
+def run_queries(cur, params, repeat: int) -> dict:
+    return {name: explain(cur, sql, params, repeat) for name, _, sql in QUERIES}
+
+
+def _ms(summary) -> str:
+    return f"{summary['ms']:>8.2f}ms" if summary else f"{'—':>10}"
+
+
+def report(before: dict, after: dict, out=sys.stdout):
+    print(f"\n{'query':<30}{'página':<15}{'antes':>10}{'después':>10}  acceso (índices)", file=out)
+    for name, page, _ in QUERIES:
+        b, a = before[name], after[name]
+        if a is None:
+            print(f"{name:<30}{page:<15}{_ms(b)}{_ms(a)}  ⚠️ no corre", file=out)
+            continue
+        used = ", ".join(a["indexes"]) or "—"
+        flag = "" if a["uses_index"] else "   ⚠️ sin índice"
+        print(f"{name:<30}{page:<15}{_ms(b)}{_ms(a)}  {a['access']} ({used}){flag}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EXPLAIN y tiempos de las queries de ScreenMates, antes y "
+                                                 "después de las migraciones.")
+    parser.add_argument("--dsn", default=os.environ.get("BENCH_DATABASE_URL", "postgresql://localhost/screenmates_bench"))
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--series", type=int, default=20_000)
+    parser.add_argument("--parties", type=int, default=200_000)
+    parser.add_argument("--ratings", type=int, default=2_000_000)
+    parser.add_argument("--seed", type=float, default=0.42, help="semilla de setseed (entre -1 y 1)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="guardar también los resultados en este archivo")
+    args = parser.parse_args(argv)
+
+    with connect(args.dsn) as conn:
+        cur = conn.cursor()
+        print(f"cargando datos sintéticos ({args.users} usuarios, {args.series} series, "
+              f"{args.parties} parties, {args.ratings} ratings)...", file=sys.stderr)
+        load(cur, args)
+        params = sample_params(cur)
+        before = run_queries(cur, params, args.repeat)
+        apply_migrations(cur)
+        after = run_queries(cur, params, args.repeat)
+
+    report(before, after)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"params": params, "before": before, "after": after, "sizes": vars(args)}, f,
+                      indent=2, ensure_ascii=False, default=str)
+    missing = [name for name, _, _ in QUERIES if not (after[name] and after[name]["uses_index"])]
+    if missing:
+        sys.exit(f"Queries sin índice después de las migraciones: {', '.join(missing)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""Representación compacta y de sólo lectura del catálogo cacheado.
+
+Las filas de Supabase llegan como dicts; acá se convierten en records con
+`__slots__` (sin `__dict__` por fila) y con los strings repetidos (géneros,
+plataformas, ids de usuario, estados) internados, así miles de filas comparten
+el mismo objeto string. Cada record guarda además `idx`, un código entero
+denso que sirve para indexar arrays paralelos.
+
+Los records imitan la interfaz de lectura de un dict (`r["name"]`,
+`r.get("genre", "—")`) para que las páginas no tengan que cambiar, y no se
+pueden modificar: la misma instancia se comparte entre todas las sesiones.
+"""
+import re
+import sys
+from bisect import bisect_left
+
+
+def intern_str(value):
+    if isinstance(value, str):
+        return sys.intern(value.strip())
+    return value
+
+
+def split_list_field(value) -> tuple:
+    """Normaliza `"Amazon Prime, Netflix "` o `["Netflix"]` a una tupla de strings internados."""
+    if not value:
+        return ()
+    if isinstance(value, str):
+        value = value.split(",")
+    return tuple(intern_str(v) for v in value if v and str(v).strip())
+
+
+class Record:
+    __slots__ = ("idx",)
+    _interned = ()
+    _lists = ()
+
+    def __init__(self, idx: int, row: dict):
+        object.__setattr__(self, "idx", idx)
+        for field in self.__slots__:
+            value = row.get(field)
+            if field in self._lists:
+                value = split_list_field(value)
+            elif field in self._interned:
+                value = intern_str(value)
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} es de sólo lectura")
+
+    def __reduce__(self):
+        # pickle (caché compartida) no puede pasar por __setattr__; al
+        # reconstruir se vuelven a internar los strings en el proceso que lee
+        return type(self), (self.idx, self.to_dict())
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def get(self, key, default=None):
+        if key not in self.__slots__:
+            return default
+        return getattr(self, key)
+
+    def keys(self):
+        return self.__slots__
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class SeriesRecord(Record):
+    __slots__ = ("id", "name", "genre", "year", "rating", "episodes", "runtime", "platforms")
+    _interned = ("genre",)
+    _lists = ("platforms",)
+
+
+class UserRecord(Record):
+    __slots__ = ("user_id", "name", "platforms")
+    _interned = ("user_id",)
+    _lists = ("platforms",)
+
+
+class RatingRecord(Record):
+    __slots__ = ("user_id", "id", "stars", "review", "status")
+    _interned = ("user_id", "status")
+
+
+def build_records(cls, rows) -> tuple:
+    return tuple(cls(i, row) for i, row in enumerate(rows or []))
+
+
+class SeriesCatalogue:
+    """Todas las series, en orden de id, más un índice por id."""
+
+    __slots__ = ("rows", "by_id")
+
+    def __init__(self, rows):
+        self.rows = build_records(SeriesRecord, rows)
+        self.by_id = {s.id: s for s in self.rows}
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class PlatformIndex:
+    """Plataformas como bits: cada serie y cada usuario tiene una máscara.
+
+    "Disponible en mis plataformas" es `serie & usuario != 0` y "plataformas
+    que tienen todos los participantes" es el AND de sus máscaras. Se arma una
+    vez por versión de los datos (ver `platform_index`).
+    """
+
+    __slots__ = ("names", "bits", "series_masks", "user_masks")
+
+    def __init__(self, catalogue: SeriesCatalogue, users):
+        self.names = []
+        self.bits = {}
+        self.series_masks = [self.mask_of(s.platforms, add=True) for s in catalogue.rows]
+        self.user_masks = {u.user_id: self.mask_of(u.platforms, add=True) for u in users}
+        # Orden alfabético para los dropdowns; los bits no cambian
+        self.names.sort()
+
+    def mask_of(self, platforms, add: bool = False) -> int:
+        mask = 0
+        for name in platforms or ():
+            bit = self.bits.get(name)
+            if bit is None:
+                if not add:
+                    continue
+                bit = self.bits[name] = 1 << len(self.bits)
+                self.names.append(name)
+            mask |= bit
+        return mask
+
+    def names_of(self, mask: int) -> list:
+        return [name for name in self.names if self.bits[name] & mask]
+
+    def series_mask(self, series) -> int:
+        return self.series_masks[series.idx]
+
+    def user_mask(self, user_id) -> int:
+        return self.user_masks.get(user_id, 0)
+
+    def shared_mask(self, user_ids) -> int:
+        """Plataformas que tienen todos los usuarios (0 si no hay ninguna en común)."""
+        mask = -1
+        for user_id in user_ids:
+            mask &= self.user_mask(user_id)
+        return mask if mask != -1 else 0
+
+    def available(self, series, mask: int) -> bool:
+        return bool(self.series_masks[series.idx] & mask)
+
+
+_platform_indexes = {}
+
+
+def platform_index(catalogue: SeriesCatalogue, users) -> PlatformIndex:
+    """Índice memoizado por identidad de los snapshots cacheados.
+
+    Mientras la caché devuelva los mismos objetos se reutiliza el índice; un
+    refresco trae objetos nuevos y el índice se reconstruye una sola vez.
+    """
+    key = (id(catalogue), id(users))
+    cached = _platform_indexes.get(key)
+    if cached is None or cached[0] is not catalogue or cached[1] is not users:
+        _platform_indexes.clear()
+        cached = _platform_indexes[key] = (catalogue, users, PlatformIndex(catalogue, users))
+    return cached[2]
+
+
+class UserSearchIndex:
+    """Búsqueda por prefijo de nombre de usuario (typeahead).
+
+    Se indexa el nombre completo y cada palabra (`ana.castillo` también se
+    encuentra por `castillo`) en una lista ordenada; una búsqueda es una
+    búsqueda binaria más los primeros `limit` resultados, sin recorrer todos
+    los usuarios. También guarda `names_by_id` para resolver nombres en O(1).
+    """
+
+    __slots__ = ("keys", "users", "by_id", "names_by_id")
+
+    _TOKEN_SPLIT = re.compile(r"[\s._\-]+")
+
+    def __init__(self, users):
+        self.users = users
+        self.by_id = {u.user_id: u for u in users}
+        self.names_by_id = {u.user_id: (u.name or u.user_id) for u in users}
+        keys = []
+        for u in users:
+            name = (u.name or "").strip().lower()
+            if not name:
+                continue
+            keys.append((name, u.idx))
+            for token in self._TOKEN_SPLIT.split(name)[1:]:
+                if token:
+                    keys.append((token, u.idx))
+        keys.sort()
+        self.keys = keys
+
+    def search(self, query: str, limit: int = 20) -> list:
+        """user_ids cuyo nombre (o alguna palabra) empieza con `query`."""
+        prefix = (query or "").strip().lower()
+        if not prefix:
+            return []
+        found = {}
+        i = bisect_left(self.keys, (prefix,))
+        while i < len(self.keys) and len(found) < limit:
+            key, idx = self.keys[i]
+            if not key.startswith(prefix):
+                break
+            found.setdefault(self.users[idx].user_id, None)
+            i += 1
+        return list(found)
+
+    def name(self, user_id) -> str:
+        return self.names_by_id.get(user_id, user_id)
+
+
+_user_indexes = {}
+
+
+def user_search_index(users) -> UserSearchIndex:
+    cached = _user_indexes.get(id(users))
+    if cached is None or cached[0] is not users:
+        _user_indexes.clear()
+        cached = _user_indexes[id(users)] = (users, UserSearchIndex(users))
+    return cached[1]
+
+
+# Por nombre sin espacios de los bordes: en la tabla vieja varios nombres
+# terminan en espacio y el importador (import_csv.py) los recorta
+SERIES_IMAGES = {
+    "How I Met Your Mother": "https://disney.images.edge.bamgrid.com/ripcut-delivery/v2/variant/disney/559b4b05-9c8e-4e19-89d2-30a74febb0c0/compose?aspectRatio=1.78&format=webp&width=1200",
+    "Suits": "https://image-cdn.netflixjunkie.com/wp-content/uploads/imago0141810645h-scaled-e1693036504112.jpg",
+    "The Big Bang Theory": "https://beam-images.warnermediacdn.com/BEAM_LWM_DELIVERABLES/c8ea8e19-cae7-4683-9b62-cdbbed744784/914da85b-244a-11ef-8e04-12093494333d?host=wbd-images.prod-vod.h264.io&partner=beamcom",
+    "New Girl": "https://adictasromantica.com/wp-content/uploads/2018/01/new-girl.jpg?w=640",
+    "Brooklyn 99": "https://i.blogs.es/397810/brooklyn-99-temporada-8/650_1200.jpeg",
+    "Community": "https://encrypted-tbn1.gstatic.com/images?q=tbn:ANd9GcTPuFUIZ_IOYN8XQzLL0XXcKT7j-JbnqFcOUCUw-h6EyIupeJeIqDCECItir7yldkLCHiBj1w",
+    "The O.C.": "https://beam-images.warnermediacdn.com/BEAM_LWM_DELIVERABLES/893e4fea-3137-44c7-a6ab-9f6ee9914981/4b51289ba9bbdeae7cf80ca1f7bbf3b7eea6a4d3.jpg?host=wbd-images.prod-vod.h264.io&partner=beamcom&w=500",
+    "The Flash": "https://ntvb.tmsimg.com/assets/p10781465_b_h8_ay.jpg?w=960&h=540g",
+    "Supergirl": "https://film-book.com/wp-content/uploads/2021/02/supergirl-season-six-tv-show-poster-01-700x400-1.jpg",
+    "WandaVision": "https://disney.images.edge.bamgrid.com/ripcut-delivery/v2/variant/disney/44f18e37-cce7-4813-b407-fc8d2ebe3f60/compose?aspectRatio=1.78&format=webp&width=1200",
+    "Yellowstone": "https://www.mlive.com/resizer/v2/LOGYPARDQBCKDML2IIH5ESOIGI.jpg?auth=06545d3a992e72cb2da7aa4566c7965ecd5806936e71a13329850544269079b6&width=800&smart=true&quality=90",
+    "The Office (US)": "https://resizing.flixster.com/KHP8WIWqGr-3MmT1Sa9GvDtb3Q8=/fit-in/705x460/v2/https://resizing.flixster.com/-XZAfHZM39UwaGJIFWKAE8fS0ak=/v3/t/assets/p185008_b_h9_ac.jpg",
+    "The Summer I Turned Pretty": "https://m.media-amazon.com/images/S/pv-target-images/4a68ee50fe8a1fb1147ad9fca8d2c48e4c86c8243397c3d687e54a3e1bfcf322.png",
+    "The Bear": "https://s10019.cdn.ncms.io/wp-content/uploads/2024/05/The-Bear.png",
+    "Gilmore Girls": "https://beam-images.warnermediacdn.com/BEAM_LWM_DELIVERABLES/72bd8235-6bf8-41ef-bc78-14e0f7292c73/76f121d1-fb04-11ef-93b6-12953788022d?host=wbd-images.prod-vod.h264.io&partner=beamcom"
+}
+
+PLACEHOLDER_IMAGE = "https://via.placeholder.com/300x450?text=No+Image"
+
+
+def series_image(name) -> str:
+    return SERIES_IMAGES.get((name or "").strip(), PLACEHOLDER_IMAGE)
@@ -0,0 +1,166 @@
+"""Eventos de uso: qué series se abren y a qué parties se entra.
+
+`track()` sólo agrega una tupla a un buffer en memoria (O(1), sin red). Un
+worker en segundo plano vacía el buffer cada `flush_interval` segundos (o
+antes, si se llena) y con cada lote:
+
+- actualiza por serie/party un sketch HyperLogLog de espectadores únicos
+  (acumulado; 1 KiB por serie, error ~3%, sin guardar los user_id) y un
+  contador de vistas en ventana móvil (últimas 24 h, en buckets de una hora);
+- le pasa el lote crudo a `sink` (en la app, un solo insert en
+  `view_events`, ver migrations/004) para análisis posterior.
+
+Los sketches y contadores viven en el proceso, como el resto de los índices.
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import deque
+
+FLUSH_INTERVAL = float(os.environ.get("EVENTS_FLUSH_INTERVAL", "10"))
+MAX_BUFFER = int(os.environ.get("EVENTS_MAX_BUFFER", "5000"))
+WINDOW_SECONDS = 24 * 3600
+BUCKET_SECONDS = 3600
+
+
+class HyperLogLog:
+    """Cardinalidad aproximada con 2**p registros de un byte."""
+
+    __slots__ = ("p", "m", "registers")
+
+    def __init__(self, p: int = 10):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, value):
+        h = int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+        index = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        for i, r in enumerate(other.registers):
+            if r > self.registers[i]:
+                self.registers[i] = r
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            # Pocos elementos: conteo lineal, más preciso en ese rango
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+
+class RollingCounter:
+    """Suma de los últimos `window` segundos, en buckets de `bucket` segundos."""
+
+    __slots__ = ("window", "bucket", "buckets")
+
+    def __init__(self, window: float = WINDOW_SECONDS, bucket: float = BUCKET_SECONDS):
+        self.window = window
+        self.bucket = bucket
+        self.buckets = deque()
+
+    def add(self, n: int, now: float):
+        slot = int(now // self.bucket)
+        if self.buckets and self.buckets[-1][0] == slot:
+            self.buckets[-1][1] += n
+        else:
+            self.buckets.append([slot, n])
+        self._expire(now)
+
+    def _expire(self, now: float):
+        oldest = int((now - self.window) // self.bucket)
+        while self.buckets and self.buckets[0][0] <= oldest:
+            self.buckets.popleft()
+
+    def total(self, now: float) -> int:
+        self._expire(now)
+        return sum(n for _, n in self.buckets)
+
+
+class EventTracker:
+    def __init__(self, sink=None, flush_interval: float = FLUSH_INTERVAL, max_buffer: int = MAX_BUFFER,
+                 clock=time.time):
+        self.sink = sink
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.clock = clock
+        self.dropped = 0
+        self.last_error = None
+        self._buffer = []
+        self._viewers = {}
+        self._views = {}
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def track(self, kind: str, subject_id, user_id=None):
+        with self._lock:
+            self._buffer.append((kind, subject_id, user_id, self.clock()))
+            full = len(self._buffer) >= self.max_buffer
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="events-flush", daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return 0
+        now = self.clock()
+        with self._stats_lock:
+            for kind, subject_id, user_id, at in batch:
+                key = (kind, subject_id)
+                if user_id is not None:
+                    sketch = self._viewers.get(key)
+                    if sketch is None:
+                        sketch = self._viewers[key] = HyperLogLog()
+                    sketch.add(user_id)
+                counter = self._views.get(key)
+                if counter is None:
+                    counter = self._views[key] = RollingCounter()
+                counter.add(1, min(at, now))
+        if self.sink:
+            try:
+                self.sink(batch)
+            except Exception as e:
+                # Las métricas en memoria ya están; sólo se pierde la copia cruda
+                self.dropped += len(batch)
+                self.last_error = e
+        return len(batch)
+
+    def unique_viewers(self, kind: str, subject_id) -> int:
+        with self._stats_lock:
+            sketch = self._viewers.get((kind, subject_id))
+            return sketch.count() if sketch else 0
+
+    def views(self, kind: str, subject_id) -> int:
+        with self._stats_lock:
+            counter = self._views.get((kind, subject_id))
+            return counter.total(self.clock()) if counter else 0
+
+    def top(self, kind: str, limit: int = 10) -> list:
+        """`(subject_id, vistas en la ventana, espectadores únicos)`, de más a menos vistas."""
+        now = self.clock()
+        with self._stats_lock:
+            rows = [(subject_id, counter.total(now)) for (k, subject_id), counter in self._views.items() if k == kind]
+            rows = sorted((r for r in rows if r[1]), key=lambda r: r[1], reverse=True)[:limit]
+            return [(subject_id, views, self._viewers[(kind, subject_id)].count()
+                     if (kind, subject_id) in self._viewers else 0) for subject_id, views in rows]
@@ -0,0 +1,151 @@
+"""Exportación de tablas completas a CSV y Parquet para análisis.
+
+Cada tabla se recorre con paginación por keyset (`where clave > última
+order by clave limit n`) en vez de `offset`: cada página es una búsqueda en
+el índice de la clave primaria, sin importar cuán adentro de la tabla esté,
+y en memoria sólo hay una página a la vez. Las filas se escriben a medida
+que llegan (en Parquet, un row group por página).
+
+Los CSV salen con el mismo formato que los de `import_csv.py` (listas como
+`"Amazon Prime, Netflix"`), así que una exportación se puede reimportar.
+
+    python export_data.py                         # todo, a CSV en ./export
+    python export_data.py ratings --format parquet --out /tmp/dump
+
+Parquet necesita `pyarrow` (opcional: `pip install pyarrow`).
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+from catalogue import split_list_field
+
+PAGE_SIZE = int(os.environ.get("EXPORT_PAGE_SIZE", "1000"))
+
+# tabla: (clave de keyset, (columna, tipo) en orden)
+TABLES = {
+    "users": (("user_id",), (("user_id", "str"), ("name", "str"), ("platforms", "list"))),
+    "series": (("id",), (("id", "int"), ("name", "str"), ("genre", "str"), ("year", "int"), ("rating", "float"),
+                         ("episodes", "int"), ("runtime", "int"), ("platforms", "list"))),
+    "watchparties": (("watchparty_id",), (("watchparty_id", "str"), ("time", "str"), ("host", "str"),
+                                          ("participants", "list"), ("platforms", "str"), ("series", "int"))),
+    "ratings": (("user_id", "id"), (("user_id", "str"), ("id", "int"), ("stars", "int"), ("review", "str"),
+                                    ("status", "str"))),
+}
+
+
+def _literal(value) -> str:
+    if isinstance(value, (int, float)):
+        return str(value)
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def keyset_pages(client, table, key, page_size: int = PAGE_SIZE, columns: str = "*"):
+    """Genera páginas de `table` ordenadas por `key` (una o dos columnas)."""
+    last = None
+    while True:
+        query = client.table(table).select(columns)
+        if last is not None:
+            if len(key) == 1:
+                query = query.gt(key[0], last[0])
+            else:
+                a, b = key
+                query = query.or_(f"{a}.gt.{_literal(last[0])},"
+                                  f"and({a}.eq.{_literal(last[0])},{b}.gt.{_literal(last[1])})")
+        for column in key:
+            query = query.order(column)
+        page = query.limit(page_size).execute().data or []
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        last = tuple(page[-1][column] for column in key)
+
+
+class CsvSink:
+    def __init__(self, path, columns):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.columns = columns
+        self.writer.writerow([name for name, _ in columns])
+
+    def write(self, rows):
+        for row in rows:
+            self.writer.writerow([", ".join(split_list_field(row.get(name))) if kind == "list"
+                                  else ("" if row.get(name) is None else row.get(name))
+                                  for name, kind in self.columns])
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink:
+    def __init__(self, path, columns):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            sys.exit("Para exportar a Parquet instala pyarrow: pip install pyarrow")
+        types = {"str": pa.string(), "int": pa.int64(), "float": pa.float64(), "list": pa.list_(pa.string())}
+        self.pa = pa
+        self.columns = columns
+        self.schema = pa.schema([(name, types[kind]) for name, kind in columns])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        data = {name: [list(split_list_field(r.get(name))) if kind == "list" else r.get(name) for r in rows]
+                for name, kind in self.columns}
+        self.writer.write_table(self.pa.Table.from_pydict(data, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+SINKS = {"csv": CsvSink, "parquet": ParquetSink}
+
+
+def export_table(client, table, out_dir, formats=("csv",), page_size: int = PAGE_SIZE, out=sys.stderr) -> int:
+    key, columns = TABLES[table]
+    sinks = [SINKS[fmt](os.path.join(out_dir, f"{table}.{fmt}"), columns) for fmt in formats]
+    count = 0
+    started = time.monotonic()
+    try:
+        for page in keyset_pages(client, table, key, page_size):
+            for sink in sinks:
+                sink.write(page)
+            count += len(page)
+            rate = count / max(time.monotonic() - started, 1e-6)
+            print(f"{table}: {count} filas ({rate:.0f}/s)", file=out)
+    finally:
+        for sink in sinks:
+            sink.close()
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta tablas de ScreenMates a CSV y/o Parquet.")
+    parser.add_argument("tables", nargs="*", help=f"tablas a exportar: {', '.join(TABLES)} (por defecto todas)")
+    parser.add_argument("--format", choices=("csv", "parquet", "both"), default="csv")
+    parser.add_argument("--out", default="export", help="carpeta de salida")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    args = parser.parse_args(argv)
+    unknown = set(args.tables) - set(TABLES)
+    if unknown:
+        parser.error(f"tablas desconocidas: {', '.join(sorted(unknown))}")
+    formats = ("csv", "parquet") if args.format == "both" else (args.format,)
+
+    from dotenv import load_dotenv
+    from supabase import create_client
+    load_dotenv()
+    client = create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY"))
+
+    os.makedirs(args.out, exist_ok=True)
+    for table in [t for t in TABLES if not args.tables or t in args.tables]:
+        n = export_table(client, table, args.out, formats, args.page_size)
+        print(f"{table}: {n} filas exportadas a {', '.join(formats)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""Capa de acceso a Supabase: timeouts por llamada, circuit breaker y caché
+stale-while-revalidate compartida por todo el proceso.
+
+Vive en un módulo aparte (y no en app1.py) porque Streamlit re-ejecuta el
+script en cada rerun: el estado a nivel de módulo de app1.py se pierde, el de
+un módulo importado se mantiene mientras viva el proceso.
+
+Con `SHARED_CACHE` configurada (ver shared_cache.py), los fetchers con
+`shared=True` tienen además un segundo nivel compartido entre réplicas.
+"""
+import inspect
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import wraps
+
+import shared_cache
+
+DEFAULT_TIMEOUT = float(os.environ.get("SUPABASE_TIMEOUT", "4"))
+DEFAULT_TTL = float(os.environ.get("CACHE_TTL", "60"))
+
+
+class BackendUnavailable(Exception):
+    """Supabase no respondió a tiempo, falló, o el circuit breaker está abierto."""
+
+
+class CircuitBreaker:
+    """Corta las llamadas tras `failure_threshold` fallos seguidos.
+
+    Abierto: falla al instante durante `reset_timeout` segundos. Después deja
+    pasar una sola llamada de prueba (half-open); si sale bien vuelve a cerrarse.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+breaker = CircuitBreaker(
+    failure_threshold=int(os.environ.get("SUPABASE_BREAKER_FAILURES", "5")),
+    reset_timeout=float(os.environ.get("SUPABASE_BREAKER_RESET", "30")),
+)
+
+_WORKER_PREFIX = "supabase"
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix=_WORKER_PREFIX)
+# Los refrescos en segundo plano esperan en su propio pool, así no ocupan los
+# workers que hacen las llamadas
+_refresher = ThreadPoolExecutor(max_workers=4, thread_name_prefix="swr-refresh")
+
+
+def _spawn(fn, args, kwargs) -> Future:
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=f"{_WORKER_PREFIX}-nested", daemon=True).start()
+    return future
+
+
+def call_with_timeout(fn, *args, timeout: float = DEFAULT_TIMEOUT, **kwargs):
+    """Ejecuta `fn` en el pool y espera como mucho `timeout` segundos."""
+    # Un loader que usa otro fetcher cacheado: la llamada de afuera ya pasó
+    # por el breaker (en half-open es la única de prueba) y cuenta el
+    # resultado, así que la de adentro no pide permiso ni suma. Tampoco espera
+    # a otro worker del mismo pool, que lo puede trabar: corre en un hilo propio.
+    nested = threading.current_thread().name.startswith(_WORKER_PREFIX)
+    if not nested and not breaker.allow():
+        raise BackendUnavailable("circuit breaker abierto")
+    future = _spawn(fn, args, kwargs) if nested else _executor.submit(fn, *args, **kwargs)
+    try:
+        result = future.result(timeout=timeout)
+    except FutureTimeout:
+        if not nested:
+            breaker.record_failure()
+        raise BackendUnavailable(f"timeout tras {timeout:g}s")
+    except Exception as e:
+        if not nested:
+            breaker.record_failure()
+        raise BackendUnavailable(str(e)) from e
+    if not nested:
+        breaker.record_success()
+    return result
+
+
+def run_query(query, timeout: float = DEFAULT_TIMEOUT):
+    """`query.execute()` con timeout y circuit breaker."""
+    return call_with_timeout(query.execute, timeout=timeout)
+
+
+def _call(loader, timeout):
+    # timeout=None: el loader hace varias queries, cada una con su propio
+    # timeout (`run_query`), y un solo límite para todas no tiene sentido
+    return loader() if timeout is None else call_with_timeout(loader, timeout=timeout)
+
+
+class _Entry:
+    __slots__ = ("value", "fetched_at", "refresh_started")
+
+    def __init__(self, value, fetched_at):
+        self.value = value
+        self.fetched_at = fetched_at
+        self.refresh_started = None
+
+
+class SWRCache:
+    """Sirve el último valor bueno al instante y lo refresca en segundo plano.
+
+    Sólo bloquea cuando la clave no tiene valor todavía, y entonces una sola
+    carga por clave: las demás sesiones esperan ese mismo resultado. Si el
+    refresco falla se sigue sirviendo el valor viejo hasta que Supabase vuelva.
+    """
+
+    def __init__(self, shared=None):
+        self.shared = shared
+        self._entries = {}
+        self._loading = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, loader, ttl: float = DEFAULT_TTL, timeout: float = DEFAULT_TIMEOUT, shared: bool = False):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stale = now - entry.fetched_at >= ttl
+                # Un refresco colgado no bloquea los siguientes para siempre
+                stuck = entry.refresh_started is not None and now - entry.refresh_started >= max(ttl, (timeout or 0) * 3)
+                if stale and (entry.refresh_started is None or stuck):
+                    entry.refresh_started = now
+                    _refresher.submit(self._refresh, key, loader, ttl, timeout, shared)
+                return entry.value
+            pending = self._loading.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._loading[key] = Future()
+
+        if not owner:
+            try:
+                return pending.result(timeout=timeout)
+            except FutureTimeout:
+                raise BackendUnavailable(f"timeout tras {timeout:g}s") from None
+        try:
+            value = self.load(key, loader, ttl=ttl, timeout=timeout, shared=shared)
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        else:
+            pending.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+
+    def load(self, key, loader, ttl: float = DEFAULT_TTL, timeout: float = DEFAULT_TIMEOUT, shared: bool = False):
+        """Carga ya (del snapshot compartido si hay uno fresco) y pisa la entrada."""
+        generation = self._generation
+        slot = self._slot(key, shared)
+        hit = self.shared.read(slot, ttl) if slot else None
+        if hit is not None:
+            fetched_at, value = hit
+            self.set(key, value, age=time.time() - fetched_at, generation=generation)
+            return value
+        value = _call(loader, timeout)
+        if slot:
+            self.shared.write(slot, value, ttl)
+        self.set(key, value, generation=generation)
+        return value
+
+    def age(self, key):
+        """Segundos desde que se cargó la entrada (inf si se invalidó), o None si no hay."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else time.monotonic() - entry.fetched_at
+
+    def _slot(self, key, shared):
+        return self.shared.slot(key) if shared and self.shared is not None else None
+
+    def set(self, key, value, age: float = 0.0, generation=None):
+        with self._lock:
+            # Un snapshot de otra réplica vence cuando vencería allá
+            entry = _Entry(value, time.monotonic() - max(0.0, age))
+            if generation is not None and generation != self._generation:
+                # Se invalidó mientras cargaba: sirve, pero puede ser de antes de la escritura
+                entry.fetched_at = float("-inf")
+            self._entries[key] = entry
+
+    def setdefault(self, key, value):
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = _Entry(value, time.monotonic())
+
+    def _refresh(self, key, loader, ttl, timeout, shared):
+        generation = self._generation
+        slot = self._slot(key, shared)
+        hit = self.shared.read(slot, ttl) if slot else None
+        if hit is not None:
+            # Otra réplica ya lo refrescó
+            fetched_at, value = hit
+            self.set(key, value, age=time.time() - fetched_at, generation=generation)
+            return
+        try:
+            # Con timeout, como cualquier carga: un refresco colgado libera el hilo
+            value = _call(loader, timeout)
+        except Exception:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.refresh_started = None
+            return
+        if slot:
+            self.shared.write(slot, value, ttl)
+        self.set(key, value, generation=generation)
+
+    def invalidate_key(self, key, shared: bool = False):
+        """Marca vencida una sola entrada y borra su snapshot compartido."""
+        slot = self._slot(key, shared)
+        if slot:
+            self.shared.discard(slot)
+        with self._lock:
+            self._generation += 1
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.fetched_at = float("-inf")
+                entry.refresh_started = None
+
+    def invalidate(self, name=None, shared: bool = False):
+        """Marca vencidas las entradas (todas o las de un fetcher).
+
+        No las borra: se siguen sirviendo mientras se refrescan en segundo
+        plano, así una escritura no deja a todas las sesiones esperando una
+        carga en frío.
+        """
+        if shared and name is not None and self.shared is not None:
+            self.shared.invalidate(name)
+        with self._lock:
+            self._generation += 1
+            for key, entry in self._entries.items():
+                if name is None or key[0] == name:
+                    entry.fetched_at = float("-inf")
+                    entry.refresh_started = None
+
+
+store = SWRCache(shared_cache.from_env())
+
+
+def swr_cached(ttl: float = DEFAULT_TTL, timeout: float = DEFAULT_TIMEOUT, shared: bool = False):
+    """Reemplazo de `st.cache_data` con stale-while-revalidate.
+
+    La clave usa el nombre de la función y no el objeto, así cada rerun de
+    Streamlit (que vuelve a definir la función) comparte las mismas entradas,
+    y los argumentos con los defaults aplicados: `f()`, `f(0)` y `f(offset=0)`
+    son la misma entrada.
+    Igual que `st.cache_data`, expone `.clear()` para invalidar tras escribir;
+    `.invalidate(*args)` invalida sólo la entrada de esos argumentos.
+    Con `timeout=None` el loader corre en el hilo que lo pide y tiene que
+    poner el timeout en cada query (`run_query`): sirve para scans paginados,
+    donde lo que importa es que ninguna página se cuelgue.
+    Con `shared=True` el valor se comparte con las otras réplicas, así que
+    tiene que poder serializarse con pickle (nada de locks ni conexiones).
+    """
+    def decorator(fn):
+        name = fn.__qualname__
+        signature = inspect.signature(fn)
+
+        def key_for(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return name, bound.args, tuple(sorted(bound.kwargs.items()))
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = key_for(args, kwargs)
+            return store.get(key, lambda: fn(*args, **kwargs), ttl=ttl, timeout=timeout, shared=shared)
+
+        def refresh(*args, **kwargs):
+            # Carga en el momento (o toma el snapshot fresco de otra réplica) y pisa la entrada
+            return store.load(key_for(args, kwargs), lambda: fn(*args, **kwargs),
+                              ttl=ttl, timeout=timeout, shared=shared)
+
+        def prime(value, *args, **kwargs):
+            # Siembra la entrada con datos que ya se tienen (sin pisar una existente)
+            store.setdefault(key_for(args, kwargs), value)
+
+        wrapper.clear = lambda: store.invalidate(name, shared=shared)
+        wrapper.invalidate = lambda *args, **kwargs: store.invalidate_key(key_for(args, kwargs), shared=shared)
+        wrapper.age = lambda *args, **kwargs: store.age(key_for(args, kwargs))
+        wrapper.ttl = ttl
+        wrapper.refresh = refresh
+        wrapper.prime = prime
+        return wrapper
+
+    return decorator
+
+
+class CacheWarmer:
+    """Precarga los datasets compartidos y los mantiene calientes.
+
+    `jobs` es una lista de `(fetcher, args, kwargs)` con fetchers decorados por
+    `swr_cached`. `start()` hace una primera pasada bloqueante (para que nadie
+    pague la carga en frío) y después refresca cada `interval` segundos en un
+    hilo daemon. Conviene que `interval` sea menor que el TTL de la caché.
+    En cada pasada sólo recarga lo que vencería antes de la siguiente, así un
+    fetcher con TTL largo se recarga una vez por TTL y no cada `interval`.
+    Con caché compartida, una réplica nueva hace esa primera pasada con los
+    snapshots de las demás.
+    """
+
+    def __init__(self, jobs, interval: float = float(os.environ.get("CACHE_WARM_INTERVAL", "45"))):
+        self.jobs = list(jobs)
+        self.interval = interval
+        self.last_run = None
+        self.failures = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def warm_once(self):
+        for fetcher, args, kwargs in self.jobs:
+            age = fetcher.age(*args, **kwargs)
+            if age is not None and age + self.interval < fetcher.ttl:
+                continue
+            label = fetcher.__qualname__
+            try:
+                fetcher.refresh(*args, **kwargs)
+                self.failures.pop(label, None)
+            except BackendUnavailable as e:
+                # Lo que ya estaba en caché se sigue sirviendo
+                self.failures[label] = str(e)
+        self.last_run = time.time()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.warm_once()
+
+    def start(self):
+        self.warm_once()
+        self._thread = threading.Thread(target=self._loop, name="cache-warmer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,288 @@
+"""Importación masiva de los CSV (`TVBaseDeDatosAnayCande - *.csv`) a Supabase.
+
+Los archivos se leen en streaming, de a `--batch-size` filas, así que el
+tamaño del CSV no importa. Cada lote se normaliza (listas como
+`"U11, U10"` o `"Amazon Prime, Netflix"` pasan a arrays, los horarios
+`28/09/25 19:00` a ISO, los números a int/float), se validan las claves
+foráneas (usuarios y series) y se sube con un solo `upsert`.
+
+Las tablas se importan en orden de dependencias: users, series,
+watchparties, ratings. Las filas inválidas no frenan la importación: se
+escriben en `<archivo>.rejects.csv` con el motivo.
+
+Después de cada lote se guarda un checkpoint (`.import_checkpoint.json`).
+Si el proceso se corta, volver a correr el mismo comando sigue desde el
+último lote confirmado; como todo es upsert, repetir un lote no duplica nada.
+
+    python import_csv.py                       # todas las tablas
+    python import_csv.py ratings --batch-size 5000
+    python import_csv.py --restart             # ignora el checkpoint
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+from catalogue import split_list_field
+from export_data import keyset_pages
+from schedule import normalize_party_time
+
+BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "1000"))
+CHECKPOINT_FILE = ".import_checkpoint.json"
+CSV_PREFIX = "TVBaseDeDatosAnayCande - "
+SCAN_PAGE_SIZE = 1000
+MAX_RETRIES = 3
+
+
+class RowError(ValueError):
+    pass
+
+
+def _text(value):
+    value = (value or "").strip()
+    return value or None
+
+
+def _int(value):
+    value = _text(value)
+    if value is None:
+        return None
+    try:
+        return int(float(value)) if "." in value else int(value)
+    except ValueError:
+        raise RowError(f"no es un número: {value!r}")
+
+
+def _float(value):
+    value = _text(value)
+    if value is None:
+        return None
+    try:
+        return float(value.replace(",", "."))
+    except ValueError:
+        raise RowError(f"no es un número: {value!r}")
+
+
+def _required(row, field):
+    if row.get(field) is None:
+        raise RowError(f"falta {field}")
+    return row
+
+
+def normalize_user(raw):
+    return _required({
+        "user_id": _text(raw.get("user_id")),
+        "name": _text(raw.get("name")),
+        "platforms": list(split_list_field(raw.get("platforms", raw.get("platform")))),
+    }, "user_id")
+
+
+def normalize_series(raw):
+    row = {
+        "id": _int(raw.get("id")),
+        "name": _text(raw.get("name")),
+        "genre": _text(raw.get("genre")),
+        "year": _int(raw.get("year")),
+        "rating": _float(raw.get("rating")),
+        "episodes": _int(raw.get("episodes")),
+        "platforms": list(split_list_field(raw.get("platforms", raw.get("platform")))),
+    }
+    if "runtime" in raw:
+        row["runtime"] = _int(raw.get("runtime"))
+    return _required(row, "id")
+
+
+def normalize_watchparty(raw):
+    time_value = _text(raw.get("time"))
+    iso = normalize_party_time(time_value)
+    if time_value and iso is None:
+        raise RowError(f"horario inválido: {time_value!r}")
+    return _required({
+        "watchparty_id": _text(raw.get("watchparty_id")),
+        "time": iso,
+        "host": _text(raw.get("host")),
+        "participants": list(split_list_field(raw.get("participants"))),
+        "platforms": _text(raw.get("platforms", raw.get("platform"))),
+        "series": _int(raw.get("series")),
+    }, "watchparty_id")
+
+
+def normalize_rating(raw):
+    row = {
+        "user_id": _text(raw.get("user_id")),
+        "id": _int(raw.get("id")),
+        "stars": _int(raw.get("stars")),
+        "review": (raw.get("review") or "").strip(),
+        "status": (_text(raw.get("status")) or "watched").lower(),
+    }
+    return _required(_required(row, "user_id"), "id")
+
+
+# tabla: (archivo, normalizador, clave de conflicto, {campo: tabla referenciada})
+TABLES = {
+    "users": ("Users", normalize_user, ("user_id",), {}),
+    "series": ("Series", normalize_series, ("id",), {}),
+    "watchparties": ("Watchparties", normalize_watchparty, ("watchparty_id",),
+                     {"host": "users", "participants": "users", "series": "series"}),
+    "ratings": ("Ratings", normalize_rating, ("user_id", "id"), {"user_id": "users", "id": "series"}),
+}
+
+
+class ForeignKeys:
+    """Ids existentes por tabla: los de la base más los importados en esta corrida."""
+
+    _KEYS = {"users": "user_id", "series": "id"}
+
+    def __init__(self, client):
+        self.client = client
+        self._known = {}
+
+    def ids(self, table) -> set:
+        known = self._known.get(table)
+        if known is None:
+            known = self._known[table] = self._scan(table)
+        return known
+
+    def _scan(self, table) -> set:
+        # Por clave y no por offset: con millones de ids cada página cuesta lo mismo
+        key = self._KEYS[table]
+        return {r[key] for page in keyset_pages(self.client, table, (key,), SCAN_PAGE_SIZE, columns=key)
+                for r in page}
+
+    def add(self, table, rows):
+        if table in self._KEYS:
+            key = self._KEYS[table]
+            self.ids(table).update(r[key] for r in rows)
+
+    def check(self, row, references):
+        for field, table in references.items():
+            value = row.get(field)
+            values = value if isinstance(value, list) else [value]
+            missing = [v for v in values if v is not None and v not in self.ids(table)]
+            if missing:
+                raise RowError(f"{field} inexistente en {table}: {', '.join(map(str, missing))}")
+
+
+class Checkpoint:
+    def __init__(self, path: str = CHECKPOINT_FILE):
+        self.path = path
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {}
+
+    @staticmethod
+    def _fingerprint(csv_path) -> list:
+        st = os.stat(csv_path)
+        return [os.path.abspath(csv_path), st.st_size, int(st.st_mtime)]
+
+    def done(self, table, csv_path) -> int:
+        """Filas ya importadas de `csv_path` (0 si el archivo cambió desde el checkpoint)."""
+        entry = self.state.get(table)
+        if not entry or entry.get("file") != self._fingerprint(csv_path):
+            return 0
+        return entry.get("rows", 0)
+
+    def save(self, table, csv_path, rows: int):
+        self.state[table] = {"file": self._fingerprint(csv_path), "rows": rows}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+
+def _upsert(client, table, rows, on_conflict):
+    for attempt in range(MAX_RETRIES):
+        try:
+            return client.table(table).upsert(rows, on_conflict=on_conflict).execute()
+        except Exception:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            time.sleep(2 ** attempt)
+
+
+def _dedupe(rows, key):
+    # Postgres rechaza un upsert que toca dos veces la misma fila: gana la última
+    return list({tuple(r[k] for k in key): r for r in rows}.values())
+
+
+def import_table(client, table, csv_path, fks: ForeignKeys, checkpoint: Checkpoint,
+                 batch_size: int = BATCH_SIZE, out=sys.stderr) -> dict:
+    _, normalize, key, references = TABLES[table]
+    skip = checkpoint.done(table, csv_path)
+    stats = {"rows": skip, "imported": 0, "rejected": 0}
+    started = time.monotonic()
+
+    with open(csv_path, newline="", encoding="utf-8-sig") as f, \
+            open(csv_path + ".rejects.csv", "a" if skip else "w", newline="", encoding="utf-8") as rejects_file:
+        reader = csv.DictReader(f)
+        rejects = csv.writer(rejects_file)
+        if not skip:
+            rejects.writerow(list(reader.fieldnames or []) + ["error"])
+        for _ in islice(reader, skip):
+            pass
+        while True:
+            chunk = list(islice(reader, batch_size))
+            if not chunk:
+                break
+            rows = []
+            for raw in chunk:
+                raw = {(k or "").strip(): v for k, v in raw.items()}
+                try:
+                    row = normalize(raw)
+                    fks.check(row, references)
+                except RowError as e:
+                    rejects.writerow(list(raw.values()) + [str(e)])
+                    stats["rejected"] += 1
+                    continue
+                rows.append(row)
+            if rows:
+                rows = _dedupe(rows, key)
+                _upsert(client, table, rows, ",".join(key))
+                fks.add(table, rows)
+                stats["imported"] += len(rows)
+            stats["rows"] += len(chunk)
+            rejects_file.flush()
+            checkpoint.save(table, csv_path, stats["rows"])
+            rate = stats["imported"] / max(time.monotonic() - started, 1e-6)
+            print(f"{table}: {stats['rows']} filas leídas, {stats['imported']} importadas "
+                  f"({rate:.0f}/s), {stats['rejected']} rechazadas", file=out)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa los CSV de ScreenMates a Supabase.")
+    parser.add_argument("tables", nargs="*",
+                        help=f"tablas a importar: {', '.join(TABLES)} (por defecto todas, en orden de dependencias)")
+    parser.add_argument("--dir", default=".", help="carpeta con los CSV")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true", help="ignorar el checkpoint y empezar de cero")
+    args = parser.parse_args(argv)
+    unknown = set(args.tables) - set(TABLES)
+    if unknown:
+        parser.error(f"tablas desconocidas: {', '.join(sorted(unknown))}")
+
+    from dotenv import load_dotenv
+    from supabase import create_client
+    load_dotenv()
+    client = create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY"))
+
+    checkpoint = Checkpoint(os.path.join(args.dir, CHECKPOINT_FILE))
+    if args.restart:
+        checkpoint.state = {}
+    fks = ForeignKeys(client)
+    for table in [t for t in TABLES if not args.tables or t in args.tables]:
+        csv_path = os.path.join(args.dir, f"{CSV_PREFIX}{TABLES[table][0]}.csv")
+        if not os.path.exists(csv_path):
+            print(f"{table}: no se encontró {csv_path}, se omite", file=sys.stderr)
+            continue
+        stats = import_table(client, table, csv_path, fks, checkpoint, args.batch_size)
+        print(f"{table}: listo, {stats['imported']} importadas, {stats['rejected']} rechazadas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""Prueba de carga: muchas sesiones simuladas recorriendo app1.py.
+
+Cada sesión es un `AppTest` (el runner headless de Streamlit) que ejecuta la
+app contra el backend local (`local_backend.py`, SCREENMATES_BACKEND=local).
+Todas corren en este mismo proceso y comparten lo que compartirían en un
+servidor real: la caché de fetch_layer, los `st.cache_resource`, los índices
+y la cola de escritura de ratings.
+
+Cada sesión recorre el escenario: abrir la app, cambiar de usuario, filtrar el
+catálogo, calificar una serie, unirse a una watch party y crear otra.
+
+    python loadtest.py --sessions 200 --concurrency 25 --latency-ms 30
+
+Reporta:
+- latencia de cada rerun (p50/p95/p99), total y por acción;
+- llamadas al backend por rerun (en la pasada concurrente, el promedio
+  global; por acción, medido en la pasada de memoria, que es secuencial);
+- memoria por sesión: lo que crece el heap (tracemalloc) con
+  `--memory-sessions` sesiones vivas, dividido por la cantidad. Se mide en
+  una segunda pasada para que tracemalloc no infle las latencias.
+"""
+import argparse
+import gc
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app1.py")
+
+
+def percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.calls = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.messages = {}
+
+    def all_latencies(self) -> list:
+        return [t for values in self.latencies.values() for t in values]
+
+
+class SimulatedSession:
+    def __init__(self, backend, stats: Stats, rng: random.Random, timeout: float):
+        from streamlit.testing.v1 import AppTest
+        self.at = AppTest.from_file(APP, default_timeout=timeout)
+        self.backend = backend
+        self.stats = stats
+        self.rng = rng
+
+    def _run(self, action, widget=None):
+        before = self.backend.calls
+        started = time.perf_counter()
+        (widget or self.at).run()
+        self.stats.latencies[action].append(time.perf_counter() - started)
+        self.stats.calls[action].append(self.backend.calls - before)
+        if self.at.exception:
+            self.stats.errors[action] += 1
+            self.stats.messages.setdefault(self.at.exception[0].message, action)
+
+    def _by_label(self, kind, label):
+        return next((w for w in getattr(self.at, kind) if w.label == label), None)
+
+    def _go(self, page):
+        radio = self._by_label("radio", "Ir a:")
+        if radio is not None and radio.value != page:
+            self._run("navegar", radio.set_value(page))
+
+    def open_app(self):
+        self._run("abrir")
+
+    def switch_user(self):
+        user = self.rng.choice(self.backend.tables["users"])
+        search = self.at.text_input(key="user_search_sidebar")
+        self._run("buscar usuario", search.input((user.get("name") or user["user_id"])[:3]))
+        switcher = self.at.selectbox(key="user_switcher_sidebar")
+        # `options` trae los nombres formateados; `set_value` recibe el user_id
+        if (user.get("name") or user["user_id"]) in switcher.options:
+            self._run("cambiar usuario", switcher.set_value(user["user_id"]))
+
+    def filter_catalogue(self):
+        self._go("Series")
+        genre = self._by_label("selectbox", "Filtrar por género")
+        if genre is not None and len(genre.options) > 1:
+            self._run("filtrar", genre.set_value(self.rng.choice(genre.options[1:])))
+        mine = self._by_label("checkbox", "Series disponibles en mis plataformas")
+        if mine is not None:
+            self._run("filtrar", mine.check())
+        genre = self._by_label("selectbox", "Filtrar por género")
+        if genre is not None and genre.value != "Todos":
+            self._run("filtrar", genre.set_value("Todos"))
+        mine = self._by_label("checkbox", "Series disponibles en mis plataformas")
+        if mine is not None and mine.value:
+            self._run("filtrar", mine.uncheck())
+
+    def rate(self):
+        self._go("Series")
+        # Las cards son links `?series_id=…`: el click se simula con los query params
+        links = [link for m in self.at.markdown if m.value.startswith("<div class='series-grid")
+                 for link in re.findall(r'series_id=(\d+)', m.value)]
+        if not links:
+            return
+        self.at.query_params["series_id"] = self.rng.choice(links)
+        self._run("ver serie")
+        stars = self._by_label("slider", "Estrellas")
+        submit = self._by_label("button", "Enviar reseña")
+        if stars is None or submit is None:
+            return
+        stars.set_value(self.rng.randint(1, 10))
+        self._run("calificar", submit.click())
+        back = self._by_label("button", "⬅ Volver al catálogo")
+        if back is not None:
+            self._run("navegar", back.click())
+
+    def join(self):
+        self._go("Watch Parties")
+        buttons = [b for b in self.at.button if (b.key or "").startswith("join_")]
+        if buttons:
+            self._run("unirse", self.rng.choice(buttons).click())
+
+    def create_party(self):
+        self._go("Home")
+        create = self._by_label("button", "Crear watchparty")
+        if create is None:
+            return
+        if create.disabled:
+            force = self._by_label("checkbox", "Crear de todos modos")
+            if force is None:
+                return
+            self._run("crear party", force.check())
+            create = self._by_label("button", "Crear watchparty")
+        self._run("crear party", create.click())
+
+    def scenario(self):
+        for step in (self.open_app, self.switch_user, self.filter_catalogue, self.rate, self.join,
+                     self.create_party):
+            try:
+                step()
+            except (KeyError, ValueError, AttributeError) as e:
+                # Un widget que no apareció (la página falló o cambió): se cuenta y se sigue
+                self.stats.errors[step.__name__] += 1
+                self.stats.messages.setdefault(f"{type(e).__name__}: {e}", step.__name__)
+
+
+def prepare_apptest():
+    """Ajustes para correr muchos `AppTest` en paralelo en el mismo proceso.
+
+    - AppTest arma un `ScriptCache` nuevo en cada run, así que recompila el
+      script cada vez (el servidor real lo compila una vez) y varias
+      compilaciones en paralelo pueden romper el parser: todas las sesiones
+      pasan a usar el mismo caché.
+    - Cada run activa y después restaura `global.appTest`; con runs
+      solapados, uno lo apaga en medio de otro. Queda activado para todo el
+      proceso.
+    - Al terminar cada run deja `Runtime._instance` en None, aunque otra
+      sesión siga corriendo: se sigue usando el último runtime creado.
+    """
+    from streamlit import config
+    from streamlit.runtime.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    config.set_option("global.appTest", True)
+
+    last = []
+
+    def instance(cls):
+        if cls._instance is not None:
+            last[:] = [cls._instance]
+            return cls._instance
+        if last:
+            return last[0]
+        raise RuntimeError("Runtime hasn't been created!")
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or bool(last))
+    shared = ScriptCache()
+    get_bytecode = ScriptCache.get_bytecode
+    ScriptCache.get_bytecode = lambda self, script_path: get_bytecode(shared, script_path)
+
+
+def seed_upcoming_parties(backend, count: int, rng: random.Random):
+    """Watch parties futuras para que haya a cuáles unirse."""
+    users = [u["user_id"] for u in backend.tables["users"]]
+    series = backend.tables["series"]
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    rows = []
+    for i in range(count):
+        s = rng.choice(series)
+        rows.append({
+            "watchparty_id": f"W{10000 + i}",
+            "time": (now + timedelta(hours=rng.randint(1, 24 * 7))).isoformat(),
+            "host": rng.choice(users),
+            "participants": rng.sample(users, k=min(3, len(users))),
+            "platforms": (s.get("platforms") or [""])[0],
+            "series": s["id"],
+        })
+    backend.table("watchparties").upsert(rows).execute()
+
+
+def run_sessions(backend, n: int, concurrency: int, seed: int, timeout: float, keep=None) -> Stats:
+    stats = Stats()
+
+    def one(i):
+        session = SimulatedSession(backend, stats, random.Random(seed + i), timeout)
+        session.scenario()
+        if keep is not None:
+            keep.append(session)
+
+    if concurrency <= 1:
+        for i in range(n):
+            one(i)
+    else:
+        with ThreadPoolExecutor(concurrency, thread_name_prefix="loadtest") as pool:
+            for future in [pool.submit(one, i) for i in range(n)]:
+                future.result()
+    return stats
+
+
+def report(stats: Stats, elapsed: float, calls_per_action: dict, memory_per_session: float, out=sys.stdout):
+    latencies = stats.all_latencies()
+    total_calls = sum(sum(c) for c in stats.calls.values())
+    ms = lambda values, p: percentile(values, p) * 1000
+    print(f"\nReruns: {len(latencies)} en {elapsed:.1f}s ({len(latencies) / max(elapsed, 1e-6):.1f}/s), "
+          f"errores: {sum(stats.errors.values())}", file=out)
+    print(f"Latencia por rerun: p50 {ms(latencies, 50):.0f} ms, p95 {ms(latencies, 95):.0f} ms, "
+          f"p99 {ms(latencies, 99):.0f} ms", file=out)
+    print(f"Llamadas al backend por rerun (promedio global): {total_calls / max(len(latencies), 1):.2f}", file=out)
+    print(f"Memoria por sesión: {memory_per_session / 1024:.0f} KiB\n", file=out)
+    print(f"{'acción':<18}{'reruns':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'llamadas':>10}{'errores':>9}", file=out)
+    for action, values in sorted(stats.latencies.items()):
+        calls = calls_per_action.get(action)
+        print(f"{action:<18}{len(values):>8}{ms(values, 50):>9.0f}{ms(values, 95):>9.0f}{ms(values, 99):>9.0f}"
+              f"{'—' if calls is None else f'{calls:.2f}':>10}{stats.errors.get(action, 0):>9}", file=out)
+    if stats.messages:
+        print("\nErrores (primer caso de cada uno):", file=out)
+        for message, where in stats.messages.items():
+            print(f"  [{where}] {message.splitlines()[0][:200]}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga de app1.py con sesiones simuladas.")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=float(os.environ.get("LOCAL_BACKEND_LATENCY_MS", "20")),
+                        help="demora simulada por llamada al backend")
+    parser.add_argument("--parties", type=int, default=200, help="watch parties futuras a sembrar")
+    parser.add_argument("--memory-sessions", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    # Antes de que la app importe local_backend
+    os.environ["SCREENMATES_BACKEND"] = "local"
+    os.environ["LOCAL_BACKEND_LATENCY_MS"] = str(args.latency_ms)
+    import local_backend
+    backend = local_backend.create_client()
+    seed_upcoming_parties(backend, args.parties, random.Random(args.seed))
+    prepare_apptest()
+
+    print(f"{args.sessions} sesiones, {args.concurrency} en paralelo, {args.latency_ms:g} ms por llamada", file=sys.stderr)
+    started = time.perf_counter()
+    stats = run_sessions(backend, args.sessions, args.concurrency, args.seed, args.timeout)
+    elapsed = time.perf_counter() - started
+
+    memory_per_session = 0.0
+    calls_per_action = {}
+    if args.memory_sessions:
+        keep = []
+        gc.collect()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        serial = run_sessions(backend, args.memory_sessions, 1, args.seed + args.sessions, args.timeout, keep)
+        gc.collect()
+        memory_per_session = (tracemalloc.get_traced_memory()[0] - baseline) / len(keep)
+        tracemalloc.stop()
+        calls_per_action = {a: sum(c) / len(c) for a, c in serial.calls.items() if c}
+
+    report(stats, elapsed, calls_per_action, memory_per_session)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""Backend de datos local: un cliente en memoria con la misma interfaz que el
+de Supabase (el subconjunto del query builder que usa la app), sembrado con
+los CSV del repo.
+
+Sirve para correr la app y las pruebas de carga sin red ni base:
+
+    SCREENMATES_BACKEND=local streamlit run app1.py
+
+Es un único cliente por proceso (las sesiones comparten los datos, como con
+la base real), thread-safe, y cuenta las llamadas en `calls`.
+`LOCAL_BACKEND_LATENCY_MS` agrega una demora fija por llamada para simular
+el round-trip a Supabase.
+"""
+import copy
+import csv
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+from postgrest.exceptions import APIError
+
+import import_csv
+
+LATENCY = float(os.environ.get("LOCAL_BACKEND_LATENCY_MS", "0")) / 1000
+
+# Relaciones embebibles en un select (`series(name, year)`): (tabla, embebida) -> (fk, pk)
+RELATIONS = {
+    ("ratings", "series"): ("id", "id"),
+    ("watchparties", "series"): ("series", "id"),
+}
+
+# Columnas que llena la base en cada insert/update (default + trigger)
+TOUCHED_AT = {
+    "ratings": "rated_at",  # migrations/006
+}
+
+# columna -> (tabla, pk); un insert/upsert con una clave que no existe falla entero
+FOREIGN_KEYS = {
+    "ratings": {"id": ("series", "id")},  # migrations/003
+}
+
+PRIMARY_KEYS = {
+    "users": ("user_id",),
+    "series": ("id",),
+    "watchparties": ("watchparty_id",),
+    "ratings": ("user_id", "id"),
+}
+
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+        self.count = len(data) if isinstance(data, list) else None
+
+
+def _literal(text: str):
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] == '"':
+        return text[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return {"null": None, "true": True, "false": False}.get(text, text)
+
+
+def _coerce(value, like):
+    # PostgREST recibe todo como texto; acá se compara con el tipo de la columna
+    if isinstance(like, bool) or like is None or value is None:
+        return value
+    if isinstance(like, (int, float)) and isinstance(value, str):
+        try:
+            return type(like)(float(value)) if isinstance(like, int) and "." in value else type(like)(value)
+        except ValueError:
+            return value
+    if isinstance(like, str) and not isinstance(value, str):
+        return str(value)
+    return value
+
+
+def _compare(op, actual, expected) -> bool:
+    if op == "is":
+        return actual is expected
+    if op == "in":
+        return actual in [_coerce(v, actual) for v in expected]
+    if op == "cs":
+        return set(expected) <= set(actual or ())
+    if op == "ov":
+        return bool(set(expected) & set(actual or ()))
+    if actual is None:
+        return False
+    if op in ("like", "ilike"):
+        pattern = re.escape(str(expected)).replace("%", ".*").replace("_", ".")
+        return re.fullmatch(pattern, str(actual), re.IGNORECASE if op == "ilike" else 0) is not None
+    expected = _coerce(expected, actual)
+    if op == "eq":
+        return actual == expected
+    if op == "neq":
+        return actual != expected
+    if op == "gt":
+        return actual > expected
+    if op == "gte":
+        return actual >= expected
+    if op == "lt":
+        return actual < expected
+    if op == "lte":
+        return actual <= expected
+    raise ValueError(f"operador no soportado: {op}")
+
+
+def _split_top(text: str) -> list:
+    """Separa por comas que no estén dentro de paréntesis ni comillas."""
+    parts, depth, quoted, start = [], 0, False, 0
+    for i, ch in enumerate(text):
+        if ch == '"' and (i == 0 or text[i - 1] != "\\"):
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and ch == ",":
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _parse_logic(text: str):
+    """`a.gt.1,and(b.eq."x",c.lt.2)` (sintaxis de `or_`) a un predicado sobre la fila."""
+    text = text.strip()
+    for group, combine in (("and(", all), ("or(", any)):
+        if text.startswith(group) and text.endswith(")"):
+            preds = [_parse_logic(p) for p in _split_top(text[len(group):-1])]
+            return lambda row, preds=preds, combine=combine: combine(p(row) for p in preds)
+    column, op, value = text.split(".", 2)
+    negate = op == "not"
+    if negate:
+        op, value = value.split(".", 1)
+    if op == "in":
+        value = [_literal(v) for v in _split_top(value.strip("()"))]
+    else:
+        value = _literal(value)
+    return lambda row: _compare(op, row.get(column), value) != negate
+
+
+class LocalQuery:
+    def __init__(self, client, table: str):
+        self.client = client
+        self.table = table
+        self.action = "select"
+        self.columns = None
+        self.embeds = []
+        self.payload = None
+        self.on_conflict = None
+        self.filters = []
+        self.orders = []
+        self.offset = 0
+        self.row_limit = None
+        self.single_row = False
+
+    def select(self, columns: str = "*", **_):
+        plain = []
+        for column in _split_top(columns):
+            if "(" in column:
+                name, inner = column.split("(", 1)
+                self.embeds.append((name.strip(), inner.rstrip(")")))
+            else:
+                plain.append(column)
+        self.columns = None if plain == ["*"] or not plain else plain
+        return self
+
+    def insert(self, payload, **_):
+        self.action, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict: str = "", **_):
+        self.action, self.payload = "upsert", payload
+        self.on_conflict = tuple(c.strip() for c in on_conflict.split(",") if c.strip()) or None
+        return self
+
+    def update(self, payload, **_):
+        self.action, self.payload = "update", payload
+        return self
+
+    def delete(self, **_):
+        self.action = "delete"
+        return self
+
+    def _filter(self, op, column, value):
+        self.filters.append(lambda row: _compare(op, row.get(column), value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter("eq", column, value)
+
+    def neq(self, column, value):
+        return self._filter("neq", column, value)
+
+    def gt(self, column, value):
+        return self._filter("gt", column, value)
+
+    def gte(self, column, value):
+        return self._filter("gte", column, value)
+
+    def lt(self, column, value):
+        return self._filter("lt", column, value)
+
+    def lte(self, column, value):
+        return self._filter("lte", column, value)
+
+    def like(self, column, pattern):
+        return self._filter("like", column, pattern)
+
+    def ilike(self, column, pattern):
+        return self._filter("ilike", column, pattern)
+
+    def in_(self, column, values):
+        return self._filter("in", column, list(values))
+
+    def contains(self, column, values):
+        return self._filter("cs", column, list(values))
+
+    def overlaps(self, column, values):
+        return self._filter("ov", column, list(values))
+
+    def is_(self, column, value):
+        return self._filter("is", column, _literal(str(value)))
+
+    def or_(self, filters: str, **_):
+        self.filters.append(_parse_logic(f"or({filters})"))
+        return self
+
+    def order(self, column, desc: bool = False, **_):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, size: int, **_):
+        self.row_limit = size
+        return self
+
+    def range(self, start: int, end: int, **_):
+        self.offset, self.row_limit = start, end - start + 1
+        return self
+
+    def single(self):
+        self.single_row = True
+        return self
+
+    def execute(self) -> Response:
+        return self.client._execute(self)
+
+
+class LocalClient:
+    def __init__(self, tables=None, latency: float = LATENCY):
+        self.tables = tables or {name: [] for name in PRIMARY_KEYS}
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def table(self, name: str) -> LocalQuery:
+        return LocalQuery(self, name)
+
+    def _execute(self, query: LocalQuery) -> Response:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            rows = self.tables.setdefault(query.table, [])
+            if query.action in ("insert", "upsert"):
+                data = self._write(query, rows)
+            else:
+                matched = [r for r in rows if all(f(r) for f in query.filters)]
+                if query.action == "update":
+                    touched = TOUCHED_AT.get(query.table)
+                    for r in matched:
+                        r.update(copy.deepcopy(query.payload))
+                        if touched:
+                            r[touched] = datetime.now().isoformat()
+                    data = matched
+                elif query.action == "delete":
+                    ids = {id(r) for r in matched}
+                    rows[:] = [r for r in rows if id(r) not in ids]
+                    data = matched
+                else:
+                    data = self._select(query, matched)
+            data = copy.deepcopy(data)
+        if query.single_row:
+            if len(data) != 1:
+                raise APIError({"message": "JSON object requested, multiple (or no) rows returned",
+                                "code": "PGRST116", "details": f"The result contains {len(data)} rows"})
+            data = data[0]
+        return Response(data)
+
+    def _write(self, query, rows) -> list:
+        payload = query.payload if isinstance(query.payload, list) else [query.payload]
+        for column, (target, pk) in FOREIGN_KEYS.get(query.table, {}).items():
+            known = {r.get(pk) for r in self.tables.get(target, ())}
+            missing = [r[column] for r in payload if r.get(column) is not None and r[column] not in known]
+            if missing:
+                raise APIError({"message": f'insert or update on table "{query.table}" violates foreign key constraint',
+                                "code": "23503",
+                                "details": f'Key ({column})=({missing[0]}) is not present in table "{target}".'})
+        key = query.on_conflict or PRIMARY_KEYS.get(query.table, ())
+        index = {tuple(r.get(k) for k in key): r for r in rows} if key else {}
+        written = []
+        touched = TOUCHED_AT.get(query.table)
+        now = datetime.now().isoformat()
+        for new in copy.deepcopy(payload):
+            if touched:
+                new[touched] = now
+            existing = index.get(tuple(new.get(k) for k in key)) if key else None
+            if existing is not None:
+                if query.action == "insert":
+                    raise APIError({"message": f"duplicate key value violates unique constraint on {query.table}",
+                                    "code": "23505", "details": None})
+                existing.update(new)
+                written.append(existing)
+            else:
+                rows.append(new)
+                if key:
+                    index[tuple(new.get(k) for k in key)] = new
+                written.append(new)
+        return written
+
+    def _select(self, query, rows) -> list:
+        for column, desc in reversed(query.orders):
+            # Como Postgres: nulls al final en ascendente, al principio en descendente
+            rows = sorted(rows, key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+        end = None if query.row_limit is None else query.offset + query.row_limit
+        rows = rows[query.offset:end]
+        if query.columns:
+            rows = [{c: r.get(c) for c in query.columns} for r in rows]
+        if query.embeds and not query.columns:
+            rows = [dict(r) for r in rows]
+        for name, columns in query.embeds:
+            fk, pk = RELATIONS[(query.table, name)]
+            related = {r.get(pk): r for r in self.tables.get(name, [])}
+            wanted = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+            for r in rows:
+                target = related.get(r.get(fk))
+                r[name] = None if target is None else {c: target.get(c) for c in (wanted or target)}
+        return rows
+
+    def reset_calls(self) -> int:
+        with self._lock:
+            calls, self.calls = self.calls, 0
+            return calls
+
+
+def load_seed(directory: str = ".") -> dict:
+    """Tablas a partir de los CSV, normalizadas igual que en `import_csv.py`."""
+    tables = {}
+    for table, (name, normalize, _, _) in import_csv.TABLES.items():
+        path = os.path.join(directory, f"{import_csv.CSV_PREFIX}{name}.csv")
+        rows = []
+        if os.path.exists(path):
+            with open(path, newline="", encoding="utf-8-sig") as f:
+                for raw in csv.DictReader(f):
+                    try:
+                        rows.append(normalize({(k or "").strip(): v for k, v in raw.items()}))
+                    except import_csv.RowError:
+                        continue
+        tables[table] = rows
+    return tables
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def create_client(seed_dir: str = None) -> LocalClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LocalClient(load_seed(seed_dir or os.path.dirname(os.path.abspath(__file__))))
+        return _client
@@ -0,0 +1,4 @@
+-- Orden y rangos por horario en Watch Parties (próximas, en curso, por fecha).
+-- `time` guarda ISO 8601 sin zona (ver schedule.py), que ordena bien como texto.
+-- Correr antes `python schedule.py backfill` para normalizar las filas viejas.
+create index if not exists watchparties_time_idx on watchparties (time);
@@ -0,0 +1,8 @@
+-- Un rating por (usuario, serie): la app ya lo trata así (borra y vuelve a
+-- insertar), y `import_csv.py` lo necesita como clave del upsert.
+-- Primero se eliminan los duplicados, quedándose con la última fila física.
+delete from ratings a
+    using ratings b
+    where a.user_id = b.user_id and a.id = b.id and a.ctid < b.ctid;
+
+create unique index if not exists ratings_user_series_key on ratings (user_id, id);
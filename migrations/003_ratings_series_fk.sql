@@ -0,0 +1,31 @@
+-- "Mi Watchlist" trae cada rating con su serie embebida en la misma query
+-- (`select=..., series(name, genre, year)`); PostgREST necesita la FK para
+-- resolver la relación. `import_csv.py` ya valida que la serie exista.
+--
+-- Se agrega `not valid` (sólo controla las escrituras nuevas y no recorre la
+-- tabla), se apartan los ratings de series que ya no existen y recién después
+-- se valida. Sin `on delete cascade`: borrar una serie con ratings falla en
+-- vez de llevarse las reseñas.
+do $$
+begin
+    if not exists (select 1 from pg_constraint where conname = 'ratings_id_fkey') then
+        alter table ratings
+            add constraint ratings_id_fkey foreign key (id) references series (id) not valid;
+    end if;
+end $$;
+
+-- Los huérfanos quedan en ratings_orphaned por si hay que recuperarlos. Con
+-- columnas explícitas: migraciones posteriores (006) agregan columnas a
+-- ratings y esto se tiene que poder volver a correr
+create table if not exists ratings_orphaned as
+    select user_id, id, stars, review, status from ratings with no data;
+
+with orphaned as (
+    delete from ratings r
+        where not exists (select 1 from series s where s.id = r.id)
+        returning r.user_id, r.id, r.stars, r.review, r.status
+)
+insert into ratings_orphaned (user_id, id, stars, review, status)
+    select user_id, id, stars, review, status from orphaned;
+
+alter table ratings validate constraint ratings_id_fkey;
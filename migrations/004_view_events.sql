@@ -0,0 +1,12 @@
+-- Eventos crudos de vistas y clicks (series abiertas, lobbies, uniones).
+-- Los escribe events.EventTracker por lotes; los agregados en vivo (únicos y
+-- vistas de las últimas 24 h) se calculan en memoria, esta tabla es para análisis.
+create table if not exists view_events (
+    event_id bigint generated always as identity primary key,
+    kind text not null,
+    subject_id text not null,
+    user_id text,
+    at timestamp not null default now()
+);
+
+create index if not exists view_events_subject_at_idx on view_events (kind, subject_id, at);
@@ -0,0 +1,27 @@
+-- Índices para las queries de cada página (ver bench_queries.py para los planes).
+-- El orden por horario ya lo cubre 001 (watchparties.time) y los eventos por
+-- tiempo, 004 (view_events (kind, subject_id, at)).
+
+-- Reseñas de una serie (`eq("id", ...)`) y el orden por id; la clave única
+-- de 002 empieza por user_id y no sirve para filtrar sólo por serie.
+create index if not exists ratings_series_idx on ratings (id);
+
+-- Mi Watchlist (`eq("user_id", ...)`) ya lo cubre la clave única de 002
+-- (user_id, id). Las parties de un usuario salen del índice en memoria
+-- (party_index.py) y el catálogo por plataforma se filtra en la app: no
+-- hacen falta índices por host, participants ni platforms.
+
+-- Una party por id, "Mis parties" (`in_("watchparty_id", ...)`) y los scans por
+-- páginas con clave (`watchparty_id > ...`): si watchparty_id no es primary
+-- key, no tiene índice.
+do $$
+begin
+    if not exists (
+        select 1 from pg_index i
+        join pg_attribute a on a.attrelid = i.indrelid and a.attnum = i.indkey[0]
+        where i.indrelid = 'watchparties'::regclass and i.indisunique and i.indnatts = 1
+          and a.attname = 'watchparty_id'
+    ) then
+        create unique index watchparties_id_key on watchparties (watchparty_id);
+    end if;
+end $$;
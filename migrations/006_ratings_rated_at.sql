@@ -0,0 +1,19 @@
+-- Cuándo se escribió cada rating, para sembrar "Favoritas de tus amigos" con
+-- los más recientes. `ratings.id` es la serie, no un orden de llegada.
+-- Las filas existentes quedan con la hora de la migración.
+alter table ratings add column if not exists rated_at timestamptz not null default now();
+
+-- Un upsert que pisa la reseña cuenta como rating nuevo
+create or replace function ratings_touch_rated_at() returns trigger as $$
+begin
+    new.rated_at := now();
+    return new;
+end;
+$$ language plpgsql;
+
+drop trigger if exists ratings_touch_rated_at on ratings;
+create trigger ratings_touch_rated_at before update on ratings
+    for each row execute function ratings_touch_rated_at();
+
+-- `status = 'watched' order by rated_at desc limit N`
+create index if not exists ratings_watched_recent_idx on ratings (rated_at desc) where status = 'watched';
@@ -0,0 +1,156 @@
+"""Índice por usuario de sus watch parties: las que organiza y a las que está invitado.
+
+Se arma una vez con un scan liviano (`watchparty_id, host, participants,
+time, series`), paginado por clave y con timeout por página, y después se mantiene en el lugar desde create/join/leave, así
+"mis parties" es una búsqueda en un dict y no un recorrido de todas las
+parties. El refresco periódico de la caché lo reconstruye para levantar
+cambios de otros procesos.
+
+Además guarda, por usuario, los intervalos [inicio, fin) de sus parties
+ordenados por inicio. Como ninguna party dura más que `max_duration`, las que
+pueden pisar un intervalo nuevo están entre dos búsquedas binarias: detectar
+conflictos cuesta O(log n + k) en vez de recorrer todas las parties.
+"""
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+
+from fetch_layer import run_query
+from schedule import PARTY_DURATION, parse_party_time
+
+SCAN_PAGE_SIZE = 1000
+SLOT_STEP = timedelta(minutes=30)
+# Franja horaria razonable para proponer una watch party
+SLOT_HOURS = (10, 24)
+
+
+class UserPartyIndex:
+    def __init__(self, rows=(), duration_for=None):
+        self.hosted = {}
+        self.invited = {}
+        self.intervals = {}
+        self.busy = {}
+        self.max_duration = PARTY_DURATION
+        self.duration_for = duration_for or (lambda series_id: PARTY_DURATION)
+        self._lock = threading.Lock()
+        for row in rows:
+            self.add_party(row.get("watchparty_id"), row.get("host"), row.get("participants"),
+                           row.get("time"), row.get("series"))
+
+    def add_party(self, party_id, host, participants=(), time=None, series_id=None):
+        start = parse_party_time(time)
+        with self._lock:
+            if start is not None:
+                duration = self.duration_for(series_id)
+                self.max_duration = max(self.max_duration, duration)
+                self.intervals[party_id] = (start, start + duration)
+            if host:
+                self.hosted.setdefault(host, set()).add(party_id)
+                self._mark_busy(host, party_id)
+            for user_id in participants or ():
+                self.invited.setdefault(user_id, set()).add(party_id)
+                self._mark_busy(user_id, party_id)
+
+    def add_participant(self, party_id, user_id):
+        with self._lock:
+            self.invited.setdefault(user_id, set()).add(party_id)
+            self._mark_busy(user_id, party_id)
+
+    def remove_participant(self, party_id, user_id):
+        with self._lock:
+            parties = self.invited.get(user_id)
+            if parties:
+                parties.discard(party_id)
+            if party_id not in self.hosted.get(user_id, ()):
+                self._unmark_busy(user_id, party_id)
+
+    def parties_for(self, user_id):
+        """`(organizadas, invitado)` como frozensets de watchparty_id."""
+        with self._lock:
+            return frozenset(self.hosted.get(user_id, ())), frozenset(self.invited.get(user_id, ()))
+
+    def _mark_busy(self, user_id, party_id):
+        interval = self.intervals.get(party_id)
+        if interval is None:
+            return
+        entries = self.busy.setdefault(user_id, [])
+        entry = (interval[0], interval[1], party_id)
+        i = bisect_left(entries, entry)
+        if i == len(entries) or entries[i] != entry:
+            insort(entries, entry)
+
+    def _unmark_busy(self, user_id, party_id):
+        interval = self.intervals.get(party_id)
+        entries = self.busy.get(user_id)
+        if interval is None or not entries:
+            return
+        entry = (interval[0], interval[1], party_id)
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+
+    def _overlapping(self, user_id, start, end):
+        entries = self.busy.get(user_id, ())
+        lo = bisect_left(entries, (start - self.max_duration,))
+        hi = bisect_left(entries, (end,))
+        return [e for e in entries[lo:hi] if e[1] > start]
+
+    def conflicts(self, user_ids, start: datetime, end: datetime) -> list:
+        """`(user_id, watchparty_id, inicio, fin)` de cada party que se pisa con [start, end)."""
+        with self._lock:
+            return [(user_id, party_id, s, e)
+                    for user_id in dict.fromkeys(user_ids)
+                    for s, e, party_id in self._overlapping(user_id, start, end)]
+
+    def suggest_free_slots(self, user_ids, duration: timedelta, after: datetime,
+                           limit: int = 3, days: int = 7) -> list:
+        """Próximos horarios (alineados a SLOT_STEP) en que todos están libres."""
+        window_end = after + timedelta(days=days)
+        with self._lock:
+            busy = sorted((s, e) for user_id in dict.fromkeys(user_ids)
+                          for s, e, _ in self._overlapping(user_id, after, window_end))
+        step_minutes = int(SLOT_STEP.total_seconds() // 60)
+
+        def align(t):
+            # Redondea hacia arriba al siguiente múltiplo de SLOT_STEP
+            if t.second or t.microsecond:
+                t = t.replace(second=0, microsecond=0) + timedelta(minutes=1)
+            return t + timedelta(minutes=-t.minute % step_minutes)
+
+        candidate = align(after)
+        slots = []
+        i = 0
+        while candidate + duration <= window_end and len(slots) < limit:
+            day_start = candidate.replace(hour=SLOT_HOURS[0], minute=0)
+            day_end = candidate.replace(hour=0, minute=0) + timedelta(hours=SLOT_HOURS[1])
+            if candidate < day_start:
+                candidate = day_start
+                continue
+            if candidate + duration > day_end:
+                candidate = day_start + timedelta(days=1)
+                continue
+            # Los ocupados que ya terminaron no vuelven a importar
+            while i < len(busy) and busy[i][1] <= candidate:
+                i += 1
+            clash = next((e for s, e in busy[i:] if s < candidate + duration and e > candidate), None)
+            if clash is None:
+                slots.append(candidate)
+                candidate = align(candidate + duration)
+            else:
+                candidate = align(clash)
+        return slots
+
+
+def load_user_party_index(client, duration_for=None) -> UserPartyIndex:
+    # Keyset y no offset: cada página cuesta lo mismo sin importar cuántas
+    # parties haya, y cada una tiene su propio timeout
+    rows = []
+    while True:
+        query = client.table("watchparties").select("watchparty_id, host, participants, time, series") \
+            .order("watchparty_id").limit(SCAN_PAGE_SIZE)
+        if rows:
+            query = query.gt("watchparty_id", rows[-1]["watchparty_id"])
+        page = run_query(query).data or []
+        rows.extend(page)
+        if len(page) < SCAN_PAGE_SIZE:
+            return UserPartyIndex(rows, duration_for)
@@ -0,0 +1,215 @@
+"""Presencia en el Party Lobby: quién está "en sala" en cada watch party.
+
+Cada sesión abierta en el lobby manda un heartbeat cada pocos segundos. La
+tabla de presencia vive en memoria, indexada por party, y cada heartbeat es
+O(1). Sólo los cambios (alguien entra o se va) se publican en un canal por
+party; cada lobby abierto está suscrito y aplica esos deltas a su lista
+local, sin volver a consultar la base.
+
+`LocalPubSub` es el pub/sub en proceso (y el stand-in para tests). Cualquier
+backend con la misma interfaz (`publish(channel, message)` y
+`subscribe(channel)` devolviendo algo con `drain()` y `close()`) lo puede
+reemplazar para compartir presencia entre procesos.
+
+Nada depende de que una pestaña avise que se cerró: las suscripciones que
+nadie lee en `SUBSCRIPTION_TTL` segundos se dan de baja solas, y las parties
+sin nadie en sala se borran en la barrida periódica.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+HEARTBEAT_SECONDS = float(os.environ.get("PRESENCE_HEARTBEAT", "5"))
+PRESENCE_TTL = float(os.environ.get("PRESENCE_TTL", str(HEARTBEAT_SECONDS * 3)))
+SUBSCRIPTION_TTL = float(os.environ.get("PRESENCE_SUBSCRIPTION_TTL", str(HEARTBEAT_SECONDS * 12)))
+
+
+class Subscription:
+    """Cola acotada de mensajes de un canal.
+
+    Si un lobby deja de leer (pestaña cerrada) la cola no crece sin límite:
+    se descartan los más viejos y `overflowed` avisa que hay que resincronizar.
+    Si nadie la lee por un rato, el pub/sub la da de baja y queda `closed`.
+    """
+
+    def __init__(self, pubsub, channel: str, maxlen: int = 256, now: float = 0.0):
+        self.pubsub = pubsub
+        self.channel = channel
+        self.overflowed = False
+        self.closed = False
+        self.last_read = now
+        self._queue = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def _put(self, message):
+        with self._lock:
+            if len(self._queue) == self._queue.maxlen:
+                self.overflowed = True
+            self._queue.append(message)
+
+    def drain(self) -> list:
+        self.last_read = self.pubsub.clock()
+        # Los lobbies leen seguido: es buen momento para dar de baja a los abandonados
+        self.pubsub.sweep(self.last_read)
+        with self._lock:
+            messages = list(self._queue)
+            self._queue.clear()
+            return messages
+
+    def close(self):
+        self.pubsub.unsubscribe(self)
+
+
+class LocalPubSub:
+    def __init__(self, idle_ttl: float = SUBSCRIPTION_TTL, clock=time.monotonic):
+        self.idle_ttl = idle_ttl
+        self.clock = clock
+        self._channels = {}
+        self._last_sweep = clock()
+        self._lock = threading.Lock()
+
+    def sweep(self, now: float):
+        with self._lock:
+            self._sweep(now)
+
+    def _sweep(self, now):
+        # Como mucho una barrida cada idle_ttl/2: costo amortizado constante
+        if now - self._last_sweep < self.idle_ttl / 2:
+            return
+        self._last_sweep = now
+        for channel in list(self._channels):
+            subscribers = self._channels[channel]
+            for sub in [s for s in subscribers if now - s.last_read > self.idle_ttl]:
+                sub.closed = True
+                subscribers.discard(sub)
+            if not subscribers:
+                del self._channels[channel]
+
+    def publish(self, channel: str, message) -> int:
+        with self._lock:
+            self._sweep(self.clock())
+            subscribers = list(self._channels.get(channel, ()))
+        for sub in subscribers:
+            sub._put(message)
+        return len(subscribers)
+
+    def subscribe(self, channel: str) -> Subscription:
+        now = self.clock()
+        sub = Subscription(self, channel, now=now)
+        with self._lock:
+            self._sweep(now)
+            self._channels.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        sub.closed = True
+        with self._lock:
+            subscribers = self._channels.get(sub.channel)
+            if subscribers:
+                subscribers.discard(sub)
+                if not subscribers:
+                    del self._channels[sub.channel]
+
+
+class PresenceService:
+    def __init__(self, pubsub=None, ttl: float = PRESENCE_TTL, clock=time.monotonic):
+        self.pubsub = pubsub or LocalPubSub()
+        self.ttl = ttl
+        self.clock = clock
+        self._parties = {}
+        self._last_sweep = clock()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def channel(party_id) -> str:
+        return f"party:{party_id}"
+
+    def heartbeat(self, party_id, user_id):
+        now = self.clock()
+        with self._lock:
+            members = self._parties.setdefault(party_id, {})
+            joined = user_id not in members
+            members[user_id] = now
+            left = self._sweep(now)
+        if joined:
+            self.pubsub.publish(self.channel(party_id), ("join", user_id))
+        for gone_party, gone in left:
+            self.pubsub.publish(self.channel(gone_party), ("leave", gone))
+
+    def leave(self, party_id, user_id):
+        with self._lock:
+            members = self._parties.get(party_id) or {}
+            was_here = members.pop(user_id, None) is not None
+            if party_id in self._parties and not members:
+                del self._parties[party_id]
+        if was_here:
+            self.pubsub.publish(self.channel(party_id), ("leave", user_id))
+
+    def _sweep(self, now) -> list:
+        """`(party_id, user_id)` vencidos en todas las parties; borra las que quedan vacías.
+
+        Como mucho una barrida cada ttl/2 (costo amortizado constante), así
+        también se limpian las parties donde ya nadie manda heartbeats.
+        """
+        if now - self._last_sweep < self.ttl / 2:
+            return []
+        self._last_sweep = now
+        expired = []
+        for party_id in list(self._parties):
+            members = self._parties[party_id]
+            for uid in [uid for uid, seen in members.items() if now - seen > self.ttl]:
+                del members[uid]
+                expired.append((party_id, uid))
+            if not members:
+                del self._parties[party_id]
+        return expired
+
+    def members(self, party_id) -> set:
+        now = self.clock()
+        with self._lock:
+            members = self._parties.get(party_id, {})
+            return {uid for uid, seen in members.items() if now - seen <= self.ttl}
+
+    def subscribe(self, party_id) -> Subscription:
+        return self.pubsub.subscribe(self.channel(party_id))
+
+
+class LobbyView:
+    """Lista "en sala" de una sesión, mantenida con los deltas del canal."""
+
+    def __init__(self, service: PresenceService, party_id, user_id):
+        self.service = service
+        self.party_id = party_id
+        self.user_id = user_id
+        self.subscription = service.subscribe(party_id)
+        self.members = service.members(party_id)
+
+    def heartbeat(self) -> set:
+        self.service.heartbeat(self.party_id, self.user_id)
+        return self.refresh()
+
+    def refresh(self) -> set:
+        if self.subscription.closed:
+            # La pestaña estuvo sin leer y la suscripción venció: se rearma
+            self.subscription = self.service.subscribe(self.party_id)
+            self.members = self.service.members(self.party_id)
+            return self.members
+        messages = self.subscription.drain()
+        if self.subscription.overflowed:
+            self.subscription.overflowed = False
+            self.members = self.service.members(self.party_id)
+            return self.members
+        for kind, user_id in messages:
+            if kind == "join":
+                self.members.add(user_id)
+            else:
+                self.members.discard(user_id)
+        return self.members
+
+    def close(self):
+        self.service.leave(self.party_id, self.user_id)
+        self.subscription.close()
+
+
+presence = PresenceService()
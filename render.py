@@ -0,0 +1,428 @@
+"""Render de grillas HTML a partir de templates cacheados.
+
+Cada grilla se arma como un único payload HTML (un solo elemento de
+Streamlit en vez de uno por card) y el HTML de cada card se memoiza por el
+contenido de sus campos: mientras la entidad no cambie, la card no se vuelve a
+formatear. Todo el CSS de la app vive en `STYLESHEET` y se inyecta una sola
+vez por ejecución del script, arriba de todo; los reruns de fragmentos no lo
+reenvían. (Streamlit borra los elementos que un rerun completo no vuelve a
+emitir, así que no se puede mandar una única vez por sesión.)
+"""
+from functools import lru_cache
+from html import escape
+
+import streamlit as st
+
+STYLESHEET = """
+<style>
+/* ===== Base ===== */
+/* Fondo general */
+body, .stApp {
+    background-color: #0e1117;
+    color: #f5f5f5;
+    font-family: 'Inter', sans-serif;
+}
+
+/* Títulos */
+h1, h2, h3, h4 {
+    color: #ff6b6b;
+}
+
+/* Botones */
+.stButton>button {
+    background-color: #c91a4f;
+    color: white;
+    border-radius: 8px;
+    padding: 0.5rem 1rem;
+    border: none;
+    transition: 0.2s;
+}
+.stButton>button:hover {
+    background-color: #63b3ed;
+}
+
+/* Inputs */
+.stTextInput>div>div>input, .stTextArea>div>textarea {
+    border-radius: 6px;
+    border: 1px solid #444;
+    background-color: #1a1c22;
+    color: #fff;
+}
+
+/* Sidebar */
+section[data-testid="stSidebar"] {
+    background-color: #161a20;
+    padding-top: 1rem;
+}
+
+/* ===== Home: en tendencia ===== */
+.home-grid {
+  display: grid;
+  grid-template-columns: repeat(auto-fill, minmax(400px, 1fr));
+  gap: 20px;
+  margin-top: 1rem;
+}
+.home-item {
+  background-color: #1a1c22;
+  border-radius: 12px;
+        aspect-ratio: 7 / 3;
+            width:500px;
+  text-align: center;
+
+  padding: 12px;
+  box-shadow: 0 0 8px rgba(0,0,0,0.4);
+  transition: transform 0.25s ease;
+    width: 380px;
+}
+.home-item:hover {
+  transform: translateY(-5px);
+}
+.home-item img {
+  width: 100%;
+  border-radius: 12px;
+  height: 290px;
+  object-fit: cover;
+            display: block;
+            align-items: center;
+}
+.home-item h4 {
+  color: #ff6b6b;
+  margin: 0.4rem 0 0.2rem;
+  font-size: 1rem;
+}
+.home-item p {
+  color: #bbb;
+  margin: 0;
+  font-size: 0.85rem;
+}
+
+/* ===== Series: catálogo ===== */
+/* Cards que abren la serie: el link no cambia cómo se ven */
+a.card-link, a.card-link:hover {
+  color: inherit;
+  text-decoration: none;
+  display: block;
+}
+
+/* ======= GRID ======= */
+.series-grid {
+  display: grid;
+  grid-template-columns: repeat(auto-fill, minmax(300px, 1fr));
+  justify-content: center; /* centra el grid horizontalmente */
+  gap: 28px;
+  margin-top: 2rem;
+}
+
+/* ======= CARD ======= */
+.series-card {
+  position: relative;
+  width: 100%;
+  height: 430px;      /* alto fijo */
+  border-radius: 12px;
+  overflow: hidden;
+  background-color: #1a1c22;
+  box-shadow: 0 4px 10px rgba(0,0,0,0.3);
+  transition: transform 0.25s ease, box-shadow 0.25s ease;
+  flex-shrink: 0;
+}
+
+.series-card:hover {
+  transform: scale(1.05);
+  box-shadow: 0 8px 20px rgba(0,0,0,0.6);
+}
+
+/* ======= IMAGEN ======= */
+.series-card img {
+  width: 100%;
+  height: 100%;
+  object-fit: cover; /* mantiene proporción */
+  border-radius: 12px;
+  transition: opacity 0.25s ease, transform 0.25s ease;
+}
+
+/* ======= OVERLAY ======= */
+.series-overlay {
+  position: absolute;
+  top: 0;
+  left: 0;
+  width: 100%;
+  height: 100%;
+  background: rgba(0, 0, 0, 0.75);
+  opacity: 0;
+  transition: opacity 0.3s ease;
+  display: flex;
+  flex-direction: column;
+  justify-content: center;
+  align-items: center;
+  padding: 10px;
+  text-align: center;
+}
+
+.series-card:hover .series-overlay {
+  opacity: 1;
+}
+
+.series-overlay h4 {
+  color: #fff;
+  font-size: 1rem;
+  margin-bottom: 6px;
+}
+
+.series-overlay p {
+  color: #bbb;
+  font-size: 0.85rem;
+  margin: 0;
+}
+
+/* ======= BOTÓN ======= */
+.details-btn {
+  background-color: #ff2e63;
+  color: white;
+  border: none;
+  border-radius: 8px;
+  padding: 0.5rem 1rem;
+  margin-top: 10px;
+  cursor: pointer;
+  transition: background 0.25s ease;
+}
+
+.details-btn:hover {
+  background-color: #63b3ed;
+}
+
+/* ===== Watch Parties ===== */
+.wp-grid {
+  display: grid;
+  grid-template-columns: repeat(auto-fill, minmax(400px, 1fr));
+  gap: 20px;
+  margin-top: 1.5rem;
+}
+.wp-card {
+  background-color: #1a1c22;
+  border-radius: 10px;
+  padding: 16px;
+  box-shadow: 0 2px 8px rgba(0,0,0,0.4);
+  transition: transform 0.25s ease;
+}
+.wp-card:hover {
+  transform: translateY(-4px);
+}
+.wp-title {
+  color: #ff6b6b;
+  font-weight: 600;
+  margin-bottom: 4px;
+}
+.wp-details {
+  color: #ddd;
+  font-size: 0.9rem;
+}
+.wp-participants {
+  color: #bbb;
+  font-size: 0.85rem;
+  margin-top: 8px;
+}
+
+/* ===== Trending ===== */
+.trend-container {
+    display: grid;
+    grid-template-columns: 1.5fr 1fr;
+    gap: 30px;
+    margin-top: 1.5rem;
+}
+.trend-card, .friends-card {
+    background-color: #1a1c22;
+    border-radius: 12px;
+    padding: 20px;
+    box-shadow: 0 2px 8px rgba(0,0,0,0.4);
+}
+.trend-title {
+    color: #ff6b6b;
+    font-weight: 700;
+    font-size: 1.4rem;
+    margin-bottom: 1rem;
+}
+.trend-item + .trend-title, .trend-card p + .trend-title {
+    margin-top: 1.5rem;
+}
+.trend-item {
+    display: flex;
+    justify-content: space-between;
+    align-items: center;
+    padding: 8px 0;
+    border-bottom: 1px solid #2a2d33;
+    transition: background 0.2s ease;
+}
+.trend-item:hover {
+    background: rgba(255,255,255,0.03);
+}
+.trend-name {
+    color: #f1f1f1;
+    font-weight: 600;
+}
+.trend-meta {
+    color: #aaa;
+    font-size: 0.85rem;
+}
+.trend-rating {
+    color: #ffd43b;
+    font-weight: 600;
+}
+.friend-item {
+    border-bottom: 1px solid #2a2d33;
+    padding: 6px 0;
+    font-size: 0.9rem;
+}
+.friend-name {
+    color: #63b3ed;
+    font-weight: 500;
+}
+.friend-series {
+    color: #f5f5f5;
+    font-weight: 500;
+}
+.friend-stars {
+    color: #ffd43b;
+    margin-left: 4px;
+}
+
+/* ===== Plataformas ===== */
+.platform-container {
+  display: grid;
+  grid-template-columns: repeat(auto-fill, minmax(320px, 1fr));
+  gap: 40px;
+  margin-top: 2rem;
+}
+
+.platform-card {
+  background-color: #1a1c22;
+  border-radius: 14px;
+  padding: 1.2rem 1.5rem;
+  box-shadow: 0 4px 12px rgba(0,0,0,0.35);
+  transition: transform 0.25s ease, box-shadow 0.25s ease;
+            gap: 40px;
+}
+
+.platform-card:hover {
+  transform: translateY(-5px);
+  box-shadow: 0 8px 20px rgba(0,0,0,0.55);
+}
+
+.platform-title {
+  font-size: 1.3rem;
+  font-weight: 600;
+  margin-bottom: 0.8rem;
+  color: #ff6b6b;
+}
+
+.platform-list {
+  list-style: none;
+  padding-left: 0;
+  margin: 0;
+}
+
+.platform-list li {
+  color: #ddd;
+  font-size: 0.95rem;
+  margin: 0.3rem 0;
+}
+
+.platform-list li::before {
+  content: "🎬 ";
+  opacity: 0.8;
+}
+
+/* Colores temáticos por plataforma */
+.PrimeVideo .platform-title { color: #00a8e1; }
+.DisneyPlus .platform-title { color: #006ce0; }
+.Netflix .platform-title { color: #e50914; }
+.HBO .platform-title { color: #6f42c1; }
+.MercadoPlay .platform-title { color: #ffb300; }
+</style>
+"""
+
+TEMPLATES = {
+    "home_card": (
+        "<a class='card-link' href=\"{href}\" target=\"_self\">"
+        "<div class='home-item'>"
+        "<img src=\"{img}\" alt=\"{name}\">"
+        "<h4>{name}</h4>"
+        "<p>{genre} • {year}</p>"
+        "<p>⭐ {rating}</p>"
+        "</div>"
+        "</a>"
+    ),
+    "series_card": (
+        "<a class='card-link' href=\"{href}\" target=\"_self\">"
+        "<div class=\"series-card\">"
+        "<img src=\"{img}\" alt=\"{name}\">"
+        "<div class=\"series-overlay\">"
+        "<h4>{name}</h4>"
+        "<p>{genre} • {year}</p>"
+        "<p>⭐ {rating} — {episodes} episodios</p>"
+        "</div>"
+        "</div>"
+        "</a>"
+    ),
+    "wp_card": (
+        "<div class='wp-card'>"
+        "<div class='wp-title'>{title}</div>"
+        "<div class='wp-details'>Anfitrión: <b>{host}</b></div>"
+        "<div class='wp-details'>🕒 {time}</div>"
+        "<div class='wp-participants'>👥 Participantes: {participants}</div>"
+        "</div>"
+    ),
+    "trend_item": (
+        "<div class='trend-item'>"
+        "<div>"
+        "<div class='trend-name'>{name}</div>"
+        "<div class='trend-meta'>{genre} • {year}</div>"
+        "</div>"
+        "<div class='trend-rating'>⭐ {rating}</div>"
+        "</div>"
+    ),
+    "views_item": (
+        "<div class='trend-item'>"
+        "<div class='trend-name'>{name}</div>"
+        "<div class='trend-meta'>👀 {views} vistas • {viewers} personas</div>"
+        "</div>"
+    ),
+    "friend_item": (
+        "<div class='friend-item'>"
+        "<span class='friend-name'>{user}</span> rated "
+        "<span class='friend-series'>{series}</span>"
+        "<span class='friend-stars'>{stars}</span>"
+        "</div>"
+    ),
+    "platform_card": (
+        "<div class='platform-card'>"
+        "<div class='platform-title'>{name}</div>"
+        "<ul class='platform-list'>{items}</ul>"
+        "</div>"
+    ),
+    "platform_item": "<li>{name} ({year})</li>",
+}
+
+# Campos que ya vienen como HTML armado por este módulo
+_RAW_FIELDS = {"items"}
+
+
+def inject_styles():
+    st.markdown(STYLESHEET, unsafe_allow_html=True)
+
+
+@lru_cache(maxsize=4096)
+def _render(template: str, fields: tuple) -> str:
+    values = {k: v if k in _RAW_FIELDS else escape(str(v)) for k, v in fields}
+    return TEMPLATES[template].format(**values)
+
+
+def card(template: str, **fields) -> str:
+    return _render(template, tuple(sorted(fields.items())))
+
+
+def grid(css_class: str, cards) -> str:
+    return f"<div class='{css_class}'>{''.join(cards)}</div>"
+
+
+def render_html(payload: str):
+    st.markdown(payload, unsafe_allow_html=True)
@@ -0,0 +1,98 @@
+"""Horarios de watch parties: normalización y consultas por rango de tiempo.
+
+En la base conviven dos formatos en la columna `time`: el de los CSV
+(`28/09/25 19:00`) y el ISO que escribe `create_watchparty`. Todo lo que se
+escribe pasa por `normalize_party_time`, que deja ISO 8601 sin zona
+(`2025-09-28T19:00:00`). Ese formato ordena igual como texto que como fecha,
+así que el orden, los rangos y la paginación los resuelve Postgres con un
+índice sobre `time`.
+
+Para las filas viejas: `python schedule.py backfill` las reescribe a ISO.
+"""
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+PARTY_DURATION = timedelta(minutes=int(os.environ.get("PARTY_DURATION_MINUTES", "120")))
+
+_FORMATS = ("%d/%m/%y %H:%M", "%d/%m/%Y %H:%M", "%d/%m/%y", "%d/%m/%Y")
+
+
+def parse_party_time(value):
+    """`datetime` (sin zona) a partir de cualquiera de los formatos guardados, o None."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None, microsecond=0)
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    text = str(value).strip()
+    try:
+        dt = datetime.fromisoformat(text.replace("Z", "+00:00"))
+        return dt.replace(tzinfo=None, microsecond=0)
+    except ValueError:
+        pass
+    for fmt in _FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def normalize_party_time(value):
+    dt = parse_party_time(value)
+    return dt.isoformat() if dt else None
+
+
+def format_party_time(value) -> str:
+    dt = parse_party_time(value)
+    return dt.strftime("%d/%m/%Y %H:%M") if dt else (value or "—")
+
+
+def upcoming_query(table, now: datetime, offset: int = 0, limit: int = 12):
+    return table.select("*").gte("time", now.isoformat(timespec="seconds")) \
+        .order("time").range(offset, offset + limit - 1)
+
+
+def happening_now_query(table, now: datetime, offset: int = 0, limit: int = 12):
+    since = now - PARTY_DURATION
+    return table.select("*").gt("time", since.isoformat(timespec="seconds")) \
+        .lte("time", now.isoformat(timespec="seconds")) \
+        .order("time").range(offset, offset + limit - 1)
+
+
+def between_query(table, start: date, end: date, offset: int = 0, limit: int = 12):
+    """Parties entre `start` y `end` inclusive (días completos)."""
+    end_exclusive = datetime.combine(end, datetime.min.time()) + timedelta(days=1)
+    return table.select("*").gte("time", datetime.combine(start, datetime.min.time()).isoformat()) \
+        .lt("time", end_exclusive.isoformat()) \
+        .order("time").range(offset, offset + limit - 1)
+
+
+def backfill(client, batch_size: int = 500) -> int:
+    """Reescribe a ISO los `time` que todavía están en otro formato."""
+    changed = 0
+    offset = 0
+    while True:
+        rows = client.table("watchparties").select("watchparty_id, time") \
+            .order("watchparty_id").range(offset, offset + batch_size - 1).execute().data or []
+        for row in rows:
+            iso = normalize_party_time(row.get("time"))
+            if iso and iso != row.get("time"):
+                client.table("watchparties").update({"time": iso}) \
+                    .eq("watchparty_id", row["watchparty_id"]).execute()
+                changed += 1
+        if len(rows) < batch_size:
+            return changed
+        offset += batch_size
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["backfill"]:
+        sys.exit("uso: python schedule.py backfill")
+    from dotenv import load_dotenv
+    from supabase import create_client
+    load_dotenv()
+    n = backfill(create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY")))
+    print(f"{n} watch parties normalizadas")
@@ -0,0 +1,356 @@
+"""Caché compartida entre réplicas: el segundo nivel de `fetch_layer`.
+
+Con varios procesos de Streamlit detrás de un balanceador, cada uno tiene su
+propia `SWRCache` y cada uno iría a Supabase por el mismo catálogo. Con
+`SHARED_CACHE` configurada, los fetchers marcados con `shared=True` publican
+cada carga como un snapshot serializado (pickle) y, antes de ir a Supabase,
+miran si otra réplica ya cargó lo mismo hace menos de `ttl` segundos. Una
+réplica nueva arranca leyendo los snapshots en vez de la base.
+
+    SHARED_CACHE=redis://localhost:6379/0      # Redis (o Valkey/KeyDB), necesita `redis`
+    SHARED_CACHE=file:///var/cache/screenmates  # archivos en disco leídos con mmap
+    SHARED_CACHE=local                          # en memoria, sólo este proceso
+
+Cada fetcher tiene una versión (`<ns>:v:<fetcher>`) que es parte de la clave
+de sus entradas; `.clear()` la cambia y así invalida las entradas de todas las
+réplicas de una vez. Las réplicas que ya tenían el valor en su caché local lo
+siguen sirviendo como mucho `ttl` segundos más, igual que antes.
+
+Para probar varias réplicas sin Redis hay un servidor de reemplazo que habla
+el subconjunto del protocolo que se usa (GET, SET con EX/PX, DEL, PING):
+
+    python shared_cache.py --port 6379
+
+Los snapshots son pickles: la caché tiene que ser tan confiable como la base.
+Si cambian las clases cacheadas (p. ej. los records de catalogue.py), hay que
+cambiar `SHARED_CACHE_NAMESPACE` en el deploy para no leer los viejos.
+"""
+import argparse
+import hashlib
+import mmap
+import os
+import pickle
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+
+NAMESPACE = os.environ.get("SHARED_CACHE_NAMESPACE", "screenmates")
+TIMEOUT = float(os.environ.get("SHARED_CACHE_TIMEOUT", "0.5"))
+RETRY_AFTER = float(os.environ.get("SHARED_CACHE_RETRY", "15"))
+SWEEP_INTERVAL = 300
+
+
+class LocalStore:
+    """Diccionario con vencimiento. También es el almacén del servidor de reemplazo."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+        self._swept = time.monotonic()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires and expires <= now:
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value: bytes, ttl: float = None):
+        now = time.monotonic()
+        with self._lock:
+            self._data[key] = (value, now + ttl if ttl else 0)
+            if now - self._swept >= SWEEP_INTERVAL:
+                # Las entradas de versiones viejas nadie las vuelve a pedir
+                self._swept = now
+                for k in [k for k, (_, expires) in self._data.items() if expires and expires <= now]:
+                    del self._data[k]
+
+    def delete(self, key) -> bool:
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+
+_HEADER = struct.Struct("<d")  # vencimiento (epoch); 0 = no vence
+
+
+class MmapStore:
+    """Un archivo por clave en un directorio compartido por las réplicas de la máquina.
+
+    Se escribe en un temporal y se reemplaza con `os.replace` (atómico): un
+    lector ve el snapshot viejo o el nuevo, nunca uno a medias. Se lee con
+    mmap, así las réplicas comparten las páginas del page cache del sistema.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._swept = time.monotonic()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, hashlib.sha1(key.encode()).hexdigest() + ".snap")
+
+    def get(self, key):
+        try:
+            f = open(self._file(key), "rb")
+        except FileNotFoundError:
+            return None
+        with f:
+            if os.fstat(f.fileno()).st_size < _HEADER.size:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                (expires,) = _HEADER.unpack_from(mm)
+                if expires and expires <= time.time():
+                    return None
+                return mm[_HEADER.size:]
+
+    def set(self, key, value: bytes, ttl: float = None):
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_HEADER.pack(time.time() + ttl if ttl else 0))
+                f.write(value)
+            os.replace(tmp, self._file(key))
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        if time.monotonic() - self._swept >= SWEEP_INTERVAL:
+            self._swept = time.monotonic()
+            self.sweep()
+
+    def delete(self, key) -> bool:
+        try:
+            os.unlink(self._file(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def sweep(self):
+        """Borra los snapshots vencidos y los temporales huérfanos."""
+        now = time.time()
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            try:
+                if name.endswith(".snap"):
+                    with open(path, "rb") as f:
+                        header = f.read(_HEADER.size)
+                    if len(header) == _HEADER.size and 0 < _HEADER.unpack(header)[0] <= now:
+                        os.unlink(path)
+                elif name.endswith(".tmp") and now - os.path.getmtime(path) > SWEEP_INTERVAL:
+                    os.unlink(path)
+            except OSError:
+                # Otra réplica lo borró o lo reemplazó mientras tanto
+                pass
+
+
+class RedisStore:
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("SHARED_CACHE con redis:// necesita redis-py: pip install redis") from None
+        self._client = redis.Redis.from_url(url, socket_timeout=TIMEOUT, socket_connect_timeout=TIMEOUT)
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, value: bytes, ttl: float = None):
+        self._client.set(key, value, px=max(1, int(ttl * 1000)) if ttl else None)
+
+    def delete(self, key) -> bool:
+        return bool(self._client.delete(key))
+
+
+def open_store(url: str):
+    """El almacén que indica `SHARED_CACHE` (None si no hay caché compartida)."""
+    if not url:
+        return None
+    if url == "local":
+        return LocalStore()
+    scheme = urlparse(url).scheme
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisStore(url)
+    if scheme == "file":
+        return MmapStore(urlparse(url).path)
+    raise ValueError(f"SHARED_CACHE no soportada: {url}")
+
+
+class SnapshotCache:
+    """Snapshots versionados por fetcher sobre un almacén clave -> bytes.
+
+    Un error del almacén no rompe la página: se cuenta, se trata como miss y
+    se deja de usar la caché compartida durante `retry_after` segundos.
+    """
+
+    def __init__(self, store, namespace: str = NAMESPACE, retry_after: float = RETRY_AFTER):
+        self.store = store
+        self.namespace = namespace
+        self.retry_after = retry_after
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.last_error = None
+        self._retry_at = 0.0
+
+    def _call(self, fn, *args):
+        if time.monotonic() < self._retry_at:
+            return None
+        try:
+            return fn(*args)
+        except Exception as e:
+            self.errors += 1
+            self.last_error = e
+            self._retry_at = time.monotonic() + self.retry_after
+            return None
+
+    def _version_key(self, name: str) -> str:
+        return f"{self.namespace}:v:{name}"
+
+    def slot(self, key: tuple):
+        """Clave de almacén para `(fetcher, args, kwargs)` en la versión actual del fetcher.
+
+        Se pide antes de cargar y se usa también para publicar: si alguien
+        invalida durante la carga, el valor queda bajo la versión vieja.
+        """
+        name = key[0]
+        version = self._call(self.store.get, self._version_key(name))
+        if version is None and time.monotonic() < self._retry_at:
+            return None
+        version = version.decode() if version else "0"
+        digest = hashlib.sha1(repr(key[1:]).encode()).hexdigest()
+        return f"{self.namespace}:{name}@{version}:{digest}"
+
+    def read(self, slot: str, max_age: float):
+        """`(fetched_at, valor)` si hay un snapshot de menos de `max_age` segundos."""
+        raw = self._call(self.store.get, slot)
+        if raw is None:
+            self.misses += 1
+            return None
+        try:
+            fetched_at, value = pickle.loads(raw)
+        except Exception as e:
+            # Un snapshot de otra versión del código
+            self.errors += 1
+            self.last_error = e
+            return None
+        if time.time() - fetched_at >= max_age:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return fetched_at, value
+
+    def write(self, slot: str, value, ttl: float):
+        try:
+            blob = pickle.dumps((time.time(), value), protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            self.errors += 1
+            self.last_error = e
+            return
+        self._call(self.store.set, slot, blob, ttl)
+
+    def discard(self, slot: str):
+        self._call(self.store.delete, slot)
+
+    def invalidate(self, name: str):
+        self._call(self.store.set, self._version_key(name), uuid.uuid4().hex.encode())
+
+
+def from_env():
+    store = open_store(os.environ.get("SHARED_CACHE", "").strip())
+    return SnapshotCache(store) if store is not None else None
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()
+        parts = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            parts.append(self.rfile.read(size + 2)[:-2])
+        return parts
+
+    def handle(self):
+        self.protocol = 2
+        while True:
+            try:
+                parts = self._read_command()
+            except (ConnectionError, ValueError):
+                return
+            if parts is None:
+                return
+            if not parts:
+                continue
+            if parts[0].upper() == b"HELLO":
+                # redis-py >= 5 negocia RESP3 al conectarse
+                self.protocol = int(parts[1]) if len(parts) > 1 else self.protocol
+                fields = (b"server", b"redis", b"version", b"7.0.0")
+                self.wfile.write((b"%3\r\n" if self.protocol == 3 else b"*6\r\n")
+                                 + b"".join(b"$%d\r\n%s\r\n" % (len(f), f) for f in fields)
+                                 + b"$5\r\nproto\r\n:%d\r\n" % self.protocol)
+                continue
+            self.wfile.write(self.server.execute(parts, self.protocol))
+
+
+class StandInServer(socketserver.ThreadingTCPServer):
+    """Reemplazo local de Redis para desarrollo y pruebas con varias réplicas."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, _RespHandler)
+        self.store = LocalStore()
+
+    def execute(self, parts, protocol: int = 2) -> bytes:
+        command = parts[0].upper()
+        if command == b"PING":
+            return b"+PONG\r\n"
+        if command == b"GET" and len(parts) == 2:
+            value = self.store.get(parts[1])
+            if value is None:
+                return b"_\r\n" if protocol == 3 else b"$-1\r\n"
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        if command == b"SET" and len(parts) >= 3:
+            ttl = None
+            options = [p.upper() for p in parts[3:]]
+            if b"EX" in options:
+                ttl = float(parts[3 + options.index(b"EX") + 1])
+            elif b"PX" in options:
+                ttl = float(parts[3 + options.index(b"PX") + 1]) / 1000
+            self.store.set(parts[1], parts[2], ttl)
+            return b"+OK\r\n"
+        if command == b"DEL":
+            return b":%d\r\n" % sum(self.store.delete(key) for key in parts[1:])
+        if command in (b"CLIENT", b"SELECT"):
+            # Lo que manda redis-py al conectarse
+            return b"+OK\r\n"
+        return b"-ERR unknown command '%s'\r\n" % command
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local compatible con Redis para SHARED_CACHE.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args(argv)
+    with StandInServer((args.host, args.port)) as server:
+        print(f"SHARED_CACHE=redis://{args.host}:{args.port}/0")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
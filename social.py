@@ -0,0 +1,131 @@
+"""Grafo de amigos y feed de actividad precalculado.
+
+Dos usuarios son amigos si compartieron alguna watch party (como host o
+participantes). El grafo se guarda como listas de adyacencia. Cada usuario
+tiene un feed acotado; cuando alguien califica una serie (`add_rating`), el
+item se copia al feed de cada uno de sus amigos (fan-out on write). Leer
+"Favoritas de tus amigos" es entonces una sola lectura de a lo sumo
+`FEED_SIZE` items, sin importar cuántos ratings haya en total.
+
+El grafo vive todo el proceso. El fan-out en vivo sólo ve los ratings que se
+escriben en este proceso; los de otras réplicas llegan con `reseed`, que
+rearma los feeds con los ratings más recientes de la base (`rated_at`, ver
+migrations/006) cada vez que se recarga esa lista, sin perder lo publicado
+acá mientras tanto. Las amistades que agregan otros procesos llegan con
+`merge_friends`, que no toca los feeds.
+"""
+import os
+import threading
+import time
+from collections import deque
+from itertools import combinations
+
+from fetch_layer import run_query
+
+FEED_SIZE = int(os.environ.get("FRIENDS_FEED_SIZE", "10"))
+FEED_SEED = int(os.environ.get("FRIENDS_FEED_SEED", "500"))
+SCAN_PAGE_SIZE = 1000
+
+
+class SocialGraph:
+    def __init__(self, parties=(), feed_size: int = FEED_SIZE):
+        self.friends = {}
+        self.feeds = {}
+        self.feed_size = feed_size
+        self._merged = None
+        self._seeded = None
+        # (cuándo, autor, item) de lo publicado en vivo, para no perderlo en un reseed
+        self._live = deque(maxlen=FEED_SEED)
+        self._lock = threading.Lock()
+        for party in parties:
+            self.connect([party.get("host")] + list(party.get("participants") or []))
+
+    def connect(self, user_ids):
+        """Hace amigos a todos los miembros de una party entre sí."""
+        members = {uid for uid in user_ids if uid}
+        with self._lock:
+            for a, b in combinations(sorted(members), 2):
+                self.friends.setdefault(a, set()).add(b)
+                self.friends.setdefault(b, set()).add(a)
+
+    def merge_friends(self, friendships: dict):
+        """Suma las amistades cargadas de la base (`load_friendships`); los feeds quedan igual."""
+        with self._lock:
+            if friendships is self._merged:
+                return
+            self._merged = friendships
+            for user_id, others in friendships.items():
+                self.friends.setdefault(user_id, set()).update(others)
+
+    def friends_of(self, user_id) -> frozenset:
+        with self._lock:
+            return frozenset(self.friends.get(user_id, ()))
+
+    def _fan_out(self, feeds, user_id, item):
+        for friend in self.friends.get(user_id, ()):
+            feed = feeds.get(friend)
+            if feed is None:
+                feed = feeds[friend] = deque(maxlen=self.feed_size)
+            feed.appendleft(item)
+
+    def publish(self, user_id, item):
+        """Fan-out: agrega `item` al principio del feed de cada amigo de `user_id`."""
+        with self._lock:
+            self._live.append((time.monotonic(), user_id, item))
+            self._fan_out(self.feeds, user_id, item)
+
+    def reseed(self, ratings, age: float = 0.0):
+        """Rearma los feeds con `ratings` (de `load_recent_ratings`, leídos hace
+        `age` segundos) más lo publicado acá después de esa lectura."""
+        loaded_at = time.monotonic() - age
+        with self._lock:
+            if ratings is self._seeded:
+                return
+            self._seeded = ratings
+            feeds = {}
+            seeded = set()
+            # Del más viejo al más nuevo, igual que si se hubieran publicado en vivo
+            for r in reversed(ratings):
+                if r.get("stars") is not None:
+                    item = (r.get("user_id"), r.get("id"), r.get("stars"))
+                    seeded.add(item)
+                    self._fan_out(feeds, item[0], item)
+            while self._live and self._live[0][0] < loaded_at:
+                self._live.popleft()
+            for _, user_id, item in self._live:
+                if item not in seeded:
+                    self._fan_out(feeds, user_id, item)
+            self.feeds = feeds
+
+    def publish_rating(self, user_id, series_id, stars):
+        self.publish(user_id, (user_id, series_id, stars))
+
+    def feed(self, user_id) -> list:
+        with self._lock:
+            return list(self.feeds.get(user_id, ()))
+
+
+def load_friendships(client) -> dict:
+    """`user_id -> frozenset(amigos)` a partir de todas las parties.
+
+    Paginado por clave, con timeout por página (`run_query`).
+    """
+    graph = SocialGraph()
+    last = None
+    while True:
+        query = client.table("watchparties").select("watchparty_id, host, participants") \
+            .order("watchparty_id").limit(SCAN_PAGE_SIZE)
+        if last is not None:
+            query = query.gt("watchparty_id", last)
+        page = run_query(query).data or []
+        for party in page:
+            graph.connect([party.get("host")] + list(party.get("participants") or []))
+        if len(page) < SCAN_PAGE_SIZE:
+            return {user_id: frozenset(others) for user_id, others in graph.friends.items()}
+        last = page[-1]["watchparty_id"]
+
+
+def load_recent_ratings(client) -> list:
+    """Los últimos `FEED_SEED` ratings con estrellas, del más nuevo al más viejo."""
+    return run_query(client.table("ratings").select("user_id, id, stars").eq("status", "watched")
+                     .order("rated_at", desc=True).limit(FEED_SEED)).data or []
@@ -0,0 +1,11 @@
+class FakeClock:
+    """Reloj manual para los módulos que reciben `clock=`."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
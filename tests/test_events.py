@@ -0,0 +1,60 @@
+import pytest
+
+from clock import FakeClock
+from events import BUCKET_SECONDS, WINDOW_SECONDS, EventTracker, HyperLogLog, RollingCounter
+
+
+@pytest.mark.parametrize("n", [10, 1000, 50000])
+def test_hyperloglog_estimate(n):
+    sketch = HyperLogLog()
+    for i in range(n):
+        sketch.add(f"U{i}")
+    assert abs(sketch.count() - n) <= max(1, n * 0.1)
+
+
+def test_hyperloglog_ignores_duplicates_and_merges():
+    a, b = HyperLogLog(), HyperLogLog()
+    for i in range(2000):
+        a.add(i % 500)
+        b.add(i)
+    assert abs(a.count() - 500) <= 50
+    a.merge(b)
+    assert abs(a.count() - 2000) <= 200
+
+
+def test_rolling_counter_drops_old_buckets():
+    counter = RollingCounter()
+    start = 100 * BUCKET_SECONDS
+    counter.add(3, start)
+    counter.add(2, start + 10)
+    assert list(counter.buckets) == [[100, 5]]
+    counter.add(1, start + BUCKET_SECONDS)
+    assert counter.total(start + BUCKET_SECONDS) == 6
+    assert counter.total(start + WINDOW_SECONDS) == 1
+    assert counter.total(start + WINDOW_SECONDS + BUCKET_SECONDS) == 0
+
+
+def test_tracker_aggregates_on_flush_and_ranks():
+    batches = []
+    tracker = EventTracker(sink=batches.append, clock=FakeClock(5 * BUCKET_SECONDS))
+    for user in ("U1", "U2", "U1"):
+        tracker.track("series_view", 7, user)
+    tracker.track("series_view", 9, "U1")
+    assert tracker.views("series_view", 7) == 0
+    assert tracker.flush() == 4
+    assert len(batches) == 1 and len(batches[0]) == 4
+    assert tracker.views("series_view", 7) == 3
+    assert tracker.unique_viewers("series_view", 7) == 2
+    assert tracker.top("series_view") == [(7, 3, 2), (9, 1, 1)]
+    assert tracker.top("party_view") == []
+
+
+def test_tracker_keeps_metrics_when_sink_fails():
+    def broken(batch):
+        raise RuntimeError("sin base")
+
+    tracker = EventTracker(sink=broken, clock=FakeClock())
+    tracker.track("party_view", "W1", "U1")
+    assert tracker.flush() == 1
+    assert tracker.dropped == 1
+    assert tracker.views("party_view", "W1") == 1
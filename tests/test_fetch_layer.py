@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+import fetch_layer
+from fetch_layer import BackendUnavailable, CircuitBreaker, SWRCache, swr_cached
+from shared_cache import LocalStore, SnapshotCache
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(fetch_layer, "breaker", CircuitBreaker(failure_threshold=2, reset_timeout=0.05))
+    monkeypatch.setattr(fetch_layer, "store", SWRCache())
+
+
+def test_nested_load_in_half_open_uses_the_single_probe():
+    @swr_cached()
+    def inner():
+        return 1
+
+    @swr_cached()
+    def outer():
+        return inner() + 1
+
+    fetch_layer.breaker.record_failure()
+    fetch_layer.breaker.record_failure()
+    time.sleep(0.06)
+    assert fetch_layer.breaker.state == "half-open"
+    assert outer() == 2
+    assert fetch_layer.breaker.state == "closed"
+
+
+def test_nested_load_keeps_its_timeout():
+    @swr_cached(timeout=0.1)
+    def slow():
+        time.sleep(1)
+
+    @swr_cached(timeout=2)
+    def outer():
+        with pytest.raises(BackendUnavailable):
+            slow()
+        return "ok"
+
+    started = time.perf_counter()
+    assert outer() == "ok"
+    assert time.perf_counter() - started < 0.5
+
+
+def test_cold_loads_are_coalesced():
+    calls = []
+
+    @swr_cached()
+    def load():
+        calls.append(1)
+        time.sleep(0.1)
+        return len(calls)
+
+    threads = [threading.Thread(target=load) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == [1]
+
+
+def test_clear_serves_stale_value_while_refreshing():
+    calls = []
+
+    @swr_cached()
+    def load():
+        calls.append(1)
+        return len(calls)
+
+    assert load() == 1
+    load.clear()
+    assert load() == 1
+    deadline = time.monotonic() + 2
+    while load() != 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert load() == 2
+
+
+def test_default_arguments_share_the_entry():
+    calls = []
+
+    @swr_cached()
+    def page(offset=0):
+        calls.append(offset)
+        return offset
+
+    page.refresh()
+    page(0)
+    page(offset=0)
+    assert calls == [0]
+
+
+def test_invalidate_touches_only_that_entry(monkeypatch):
+    monkeypatch.setattr(fetch_layer, "store", SWRCache(SnapshotCache(LocalStore())))
+    rows = {"W1": "vieja", "W2": "vieja"}
+
+    @swr_cached(shared=True)
+    def party(party_id):
+        return rows[party_id]
+
+    party("W1")
+    party("W2")
+    rows.update(W1="nueva", W2="nueva")
+    party.invalidate("W1")
+    # Sin el snapshot compartido viejo, el refresco relee la base
+    assert party.refresh("W1") == "nueva"
+    assert party.age("W2") < fetch_layer.DEFAULT_TTL
+    assert party("W2") == "vieja"
@@ -0,0 +1,51 @@
+import io
+import os
+import shutil
+
+from catalogue import PLACEHOLDER_IMAGE, series_image
+import import_csv
+from import_csv import CSV_PREFIX, Checkpoint, ForeignKeys, import_table
+from local_backend import LocalClient
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_seed(tmp_path, table, name, client):
+    # Copia el CSV: el importador escribe los rechazos al lado
+    csv_path = tmp_path / f"{CSV_PREFIX}{name}.csv"
+    shutil.copy(os.path.join(REPO, f"{CSV_PREFIX}{name}.csv"), csv_path)
+    checkpoint = Checkpoint(str(tmp_path / ".import_checkpoint.json"))
+    return import_table(client, table, str(csv_path), ForeignKeys(client), checkpoint, out=io.StringIO())
+
+
+def test_imported_series_keep_their_images(tmp_path):
+    client = LocalClient(latency=0)
+    stats = import_seed(tmp_path, "series", "Series", client)
+    names = [s["name"] for s in client.tables["series"]]
+    assert stats["imported"] == len(names) > 0
+    assert all(name == name.strip() for name in names)
+    assert [name for name in names if series_image(name) == PLACEHOLDER_IMAGE] == []
+
+
+def test_series_image_ignores_surrounding_spaces():
+    assert series_image("Suits ") == series_image("Suits") != PLACEHOLDER_IMAGE
+    assert series_image(None) == PLACEHOLDER_IMAGE
+
+
+class RecordingClient(LocalClient):
+    def __init__(self, tables):
+        super().__init__(tables, latency=0)
+        self.queries = []
+
+    def table(self, name):
+        query = super().table(name)
+        self.queries.append(query)
+        return query
+
+
+def test_foreign_keys_scan_by_key(monkeypatch):
+    monkeypatch.setattr(import_csv, "SCAN_PAGE_SIZE", 2)
+    client = RecordingClient({"users": [{"user_id": f"U{i}"} for i in (5, 1, 4, 2, 3)]})
+    assert ForeignKeys(client).ids("users") == {"U1", "U2", "U3", "U4", "U5"}
+    assert len(client.queries) == 3
+    assert [query.offset for query in client.queries] == [0, 0, 0]
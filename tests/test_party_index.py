@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+from party_index import SLOT_STEP, UserPartyIndex
+
+T = datetime(2025, 10, 3, 20, 0)
+
+
+def index_with(*parties, durations=None):
+    durations = durations or {}
+    return UserPartyIndex(
+        [{"watchparty_id": pid, "host": host, "participants": guests, "time": start.isoformat(), "series": pid}
+         for pid, host, guests, start in parties],
+        duration_for=lambda series_id: durations.get(series_id, timedelta(hours=2)))
+
+
+def test_parties_for_splits_hosted_and_invited():
+    index = index_with(("W1", "U1", ["U2"], T), ("W2", "U2", ["U1"], T + timedelta(days=1)))
+    assert index.parties_for("U1") == (frozenset({"W1"}), frozenset({"W2"}))
+
+
+def test_conflicts_use_half_open_intervals():
+    index = index_with(("W1", "U1", [], T))
+    assert index.conflicts(["U1"], T + timedelta(hours=1), T + timedelta(hours=3)) == \
+        [("U1", "W1", T, T + timedelta(hours=2))]
+    # Empieza justo cuando termina la otra: no se pisan
+    assert index.conflicts(["U1"], T + timedelta(hours=2), T + timedelta(hours=4)) == []
+    assert index.conflicts(["U1"], T - timedelta(hours=1), T) == []
+
+
+def test_long_party_started_earlier_is_found():
+    index = index_with(("W1", "U1", [], T), ("W2", "U1", [], T + timedelta(days=1)),
+                       durations={"W1": timedelta(hours=10)})
+    assert [c[1] for c in index.conflicts(["U1"], T + timedelta(hours=9), T + timedelta(hours=11))] == ["W1"]
+
+
+def test_removed_guest_is_free_but_host_stays_busy():
+    index = index_with(("W1", "U1", ["U2"], T))
+    index.remove_participant("W1", "U2")
+    index.remove_participant("W1", "U1")
+    assert index.conflicts(["U2"], T, T + timedelta(hours=1)) == []
+    assert [c[0] for c in index.conflicts(["U1", "U2"], T, T + timedelta(hours=1))] == ["U1"]
+
+
+def test_add_participant_marks_busy_once():
+    index = index_with(("W1", "U1", [], T))
+    index.add_participant("W1", "U3")
+    index.add_participant("W1", "U3")
+    assert len(index.busy["U3"]) == 1
+
+
+def test_suggest_free_slots_skips_busy_and_aligns():
+    index = index_with(("W1", "U1", [], T), ("W2", "U2", [], T + timedelta(hours=2)))
+    after = T - timedelta(hours=1, minutes=10)
+    slots = index.suggest_free_slots(["U1", "U2"], timedelta(hours=1), after, limit=2)
+    # W2 termina a medianoche: el siguiente hueco es al otro día a las 10
+    assert slots == [T - timedelta(hours=1), datetime(2025, 10, 4, 10, 0)]
+    for slot in slots:
+        assert slot.minute % (SLOT_STEP.seconds // 60) == 0
+        assert index.conflicts(["U1", "U2"], slot, slot + timedelta(hours=1)) == []
+
+
+def test_suggest_free_slots_stays_within_the_day():
+    index = UserPartyIndex()
+    slots = index.suggest_free_slots(["U1"], timedelta(hours=2), datetime(2025, 10, 3, 23, 0), limit=1)
+    assert slots == [datetime(2025, 10, 4, 10, 0)]
+
+
+def test_consecutive_free_slots_stay_aligned():
+    index = UserPartyIndex()
+    slots = index.suggest_free_slots(["U1"], timedelta(minutes=45), datetime(2025, 10, 3, 19, 0), limit=3)
+    assert [slot.strftime("%H:%M") for slot in slots] == ["19:00", "20:00", "21:00"]
@@ -0,0 +1,81 @@
+from clock import FakeClock
+from presence import LobbyView, LocalPubSub, PresenceService
+
+
+def make_service(ttl=15, idle_ttl=60):
+    clock = FakeClock()
+    return PresenceService(LocalPubSub(idle_ttl=idle_ttl, clock=clock), ttl=ttl, clock=clock), clock
+
+
+def test_lobby_applies_join_and_leave_deltas():
+    service, _ = make_service()
+    ana = LobbyView(service, "W1", "U1")
+    assert ana.heartbeat() == {"U1"}
+    cande = LobbyView(service, "W1", "U2")
+    assert cande.heartbeat() == {"U1", "U2"}
+    assert ana.refresh() == {"U1", "U2"}
+    cande.close()
+    assert ana.refresh() == {"U1"}
+
+
+def test_channels_are_per_party():
+    service, _ = make_service()
+    view = LobbyView(service, "W1", "U1")
+    view.heartbeat()
+    service.heartbeat("W2", "U2")
+    assert view.refresh() == {"U1"}
+
+
+def test_stale_member_expires_from_any_party_heartbeat():
+    service, clock = make_service(ttl=15)
+    view = LobbyView(service, "W1", "U1")
+    view.heartbeat()
+    service.heartbeat("W1", "U2")
+    assert view.refresh() == {"U1", "U2"}
+    clock.advance(20)
+    # U2 cerró la pestaña; el único heartbeat es de otra party
+    service.heartbeat("W2", "U3")
+    assert "W1" not in service._parties
+    assert view.refresh() == set()
+
+
+def test_leave_drops_empty_party():
+    service, _ = make_service()
+    service.heartbeat("W1", "U1")
+    service.leave("W1", "U1")
+    assert service._parties == {}
+    assert service.members("W1") == set()
+
+
+def test_idle_subscription_is_dropped_and_view_resubscribes():
+    service, clock = make_service(idle_ttl=60)
+    abandoned = LobbyView(service, "W1", "U1")
+    active = LobbyView(service, "W1", "U2")
+    for _ in range(20):
+        clock.advance(5)
+        active.heartbeat()
+    channel = service.channel("W1")
+    assert abandoned.subscription.closed
+    assert abandoned.subscription not in service.pubsub._channels[channel]
+    old = abandoned.subscription
+    assert abandoned.refresh() == {"U2"}
+    assert abandoned.subscription is not old
+    assert abandoned.subscription in service.pubsub._channels[channel]
+
+
+def test_channel_without_subscribers_is_removed():
+    pubsub = LocalPubSub(idle_ttl=10, clock=FakeClock())
+    sub = pubsub.subscribe("party:W1")
+    sub.close()
+    assert pubsub._channels == {}
+    assert pubsub.publish("party:W1", ("join", "U1")) == 0
+
+
+def test_overflow_resyncs_from_service():
+    service, _ = make_service()
+    view = LobbyView(service, "W1", "U1")
+    view.heartbeat()
+    for i in range(300):
+        service.heartbeat("W1", f"U{i + 2}")
+    assert view.refresh() == service.members("W1")
+    assert not view.subscription.overflowed
@@ -0,0 +1,66 @@
+from local_backend import LocalClient
+from social import SCAN_PAGE_SIZE, SocialGraph, load_friendships, load_recent_ratings
+
+
+def test_publish_fans_out_to_friends_only():
+    graph = SocialGraph([{"host": "U1", "participants": ["U2", "U3"]}, {"host": "U4", "participants": []}])
+    graph.publish_rating("U1", 10, 8)
+    assert graph.feed("U2") == graph.feed("U3") == [("U1", 10, 8)]
+    assert graph.feed("U1") == graph.feed("U4") == []
+
+
+def test_feed_is_bounded_and_newest_first():
+    graph = SocialGraph([{"host": "U1", "participants": ["U2"]}], feed_size=3)
+    for series_id in range(5):
+        graph.publish_rating("U1", series_id, 5)
+    assert [item[1] for item in graph.feed("U2")] == [4, 3, 2]
+
+
+def test_merge_friends_keeps_feeds():
+    graph = SocialGraph([{"host": "U1", "participants": ["U2"]}])
+    graph.publish_rating("U1", 10, 8)
+    graph.merge_friends({"U2": frozenset({"U1", "U3"}), "U3": frozenset({"U2"})})
+    assert graph.feed("U2") == [("U1", 10, 8)]
+    assert graph.friends_of("U2") == {"U1", "U3"}
+
+
+def test_load_friendships_pages_by_key():
+    parties = [{"watchparty_id": f"W{i:05d}", "host": f"U{i}", "participants": [f"U{i + 1}"]}
+               for i in range(SCAN_PAGE_SIZE + 5)]
+    client = LocalClient({"watchparties": parties}, latency=0)
+    friendships = load_friendships(client)
+    assert client.calls == 2
+    assert friendships["U1"] == {"U0", "U2"}
+    assert friendships[f"U{SCAN_PAGE_SIZE + 5}"] == {f"U{SCAN_PAGE_SIZE + 4}"}
+
+
+def test_reseed_uses_most_recent_watched_ratings():
+    client = LocalClient({"ratings": [
+        {"user_id": "U1", "id": 1, "stars": 6, "status": "watched", "rated_at": "2025-10-01T10:00:00"},
+        {"user_id": "U1", "id": 99, "stars": 9, "status": "watched", "rated_at": "2025-09-01T10:00:00"},
+        {"user_id": "U1", "id": 2, "stars": None, "status": "watchlist", "rated_at": "2025-10-02T10:00:00"},
+        {"user_id": "U1", "id": 3, "stars": 7, "status": "watched", "rated_at": "2025-10-03T10:00:00"},
+    ]}, latency=0)
+    graph = SocialGraph([{"host": "U1", "participants": ["U2"]}])
+    graph.reseed(load_recent_ratings(client))
+    assert graph.feed("U2") == [("U1", 3, 7), ("U1", 1, 6), ("U1", 99, 9)]
+
+
+def test_reseed_brings_other_replicas_ratings_and_keeps_live_ones():
+    graph = SocialGraph([{"host": "U1", "participants": ["U2", "U3"]}])
+    graph.reseed([{"user_id": "U1", "id": 1, "stars": 5}])
+    graph.publish_rating("U1", 2, 6)
+    # Otra réplica escribió la serie 3; la 2 se publicó acá después de esa lectura
+    graph.reseed([{"user_id": "U3", "id": 3, "stars": 7}, {"user_id": "U1", "id": 1, "stars": 5}], age=60)
+    assert graph.feed("U2") == [("U1", 2, 6), ("U3", 3, 7), ("U1", 1, 5)]
+    # Si la base ya la trae no se duplica
+    recent = [{"user_id": "U1", "id": 2, "stars": 6}, {"user_id": "U3", "id": 3, "stars": 7}]
+    graph.reseed(recent, age=60)
+    assert graph.feed("U2") == [("U1", 2, 6), ("U3", 3, 7)]
+    # La misma lista otra vez no toca los feeds
+    graph.publish_rating("U1", 4, 9)
+    graph.reseed(recent)
+    assert graph.feed("U2")[0] == ("U1", 4, 9)
+    # Lo publicado antes de una lectura ya está (o no) en lo leído
+    graph.reseed([{"user_id": "U3", "id": 3, "stars": 7}], age=0)
+    assert graph.feed("U2") == [("U3", 3, 7)]
@@ -0,0 +1,122 @@
+import pytest
+
+from write_queue import RatingWriteQueue
+
+
+class Rejected(Exception):
+    pass
+
+
+class FakeTable:
+    def __init__(self):
+        self.writes = []
+        self.deletes = []
+        self.fail = False
+        self.missing_series = set()
+
+    def write(self, rows):
+        if self.fail:
+            raise RuntimeError("timeout")
+        if any(r["id"] in self.missing_series for r in rows):
+            raise Rejected("violates foreign key constraint")
+        self.writes.append(rows)
+
+    def delete(self, user_id, series_ids):
+        self.deletes.append((user_id, sorted(series_ids)))
+
+
+@pytest.fixture
+def table():
+    return FakeTable()
+
+
+@pytest.fixture
+def queue(table):
+    # Ventana larga: los tests vacían la cola a mano con flush()
+    return RatingWriteQueue(table.write, table.delete, window=3600,
+                            permanent=lambda e: isinstance(e, Rejected))
+
+
+def test_burst_is_one_write_and_last_one_wins(queue, table):
+    queue.submit("U1", 1, stars=5, review="ok")
+    queue.submit("U1", 1, stars=8, review="mejor")
+    queue.submit("U1", 2, status="watchlist")
+    assert queue.flush() == 2
+    assert len(table.writes) == 1
+    assert sorted((r["id"], r["stars"]) for r in table.writes[0]) == [(1, 8), (2, None)]
+    assert queue.flush() == 0
+
+
+def test_removals_are_one_delete_per_user(queue, table):
+    queue.remove("U1", [1, 2])
+    queue.remove("U2", [3])
+    queue.flush()
+    assert table.writes == []
+    assert sorted(table.deletes) == [("U1", [1, 2]), ("U2", [3])]
+
+
+def test_overlay_merges_pending_and_hides_removed(queue):
+    rows = [{"user_id": "U1", "id": 1, "stars": 3, "status": "watched"},
+            {"user_id": "U1", "id": 2, "stars": None, "status": "watchlist"}]
+    queue.submit("U1", 1, stars=9)
+    queue.remove("U1", [2])
+    queue.submit("U1", 3, status="watchlist")
+    merged = queue.overlay(rows, user_id="U1")
+    assert [(r["id"], r["stars"]) for r in merged] == [(1, 9), (3, None)]
+    assert queue.overlay(rows, user_id="U2") == rows
+
+
+def test_failed_flush_requeues_without_overwriting_newer_rows(queue, table):
+    flushed = []
+    queue.on_flush = flushed.append
+    queue.submit("U1", 1, stars=4)
+    table.fail = True
+    assert queue.flush() == 0
+    assert queue.failures == 1
+    assert [r["stars"] for r in queue.pending("U1")] == [4]
+    queue.submit("U1", 1, stars=6)
+    table.fail = False
+    assert queue.flush() == 1
+    assert [r["stars"] for r in table.writes[0]] == [6]
+    assert queue.failures == 0
+    assert flushed == [{("U1", 1): table.writes[0][0]}]
+
+
+def test_rejected_row_does_not_block_the_rest(queue, table):
+    table.missing_series = {3}
+    for series_id in range(1, 6):
+        queue.submit("U1", series_id, stars=series_id)
+    queue.submit("U2", 1, stars=7)
+    assert queue.flush() == 5
+    assert sorted((r["user_id"], r["id"]) for rows in table.writes for r in rows) == \
+        [("U1", 1), ("U1", 2), ("U1", 4), ("U1", 5), ("U2", 1)]
+    assert queue.failures == 0
+    assert queue.pending() == []
+    [(series_id, row, error)] = queue.rejections("U1")
+    assert series_id == row["id"] == 3 and isinstance(error, Rejected)
+    assert queue.rejections("U2") == []
+    # Reenviarla la saca de los rechazos; descartarlos también
+    queue.submit("U1", 3, stars=1)
+    assert queue.rejections("U1") == []
+    queue.flush()
+    queue.dismiss("U1")
+    assert queue.rejections("U1") == []
+
+
+def test_overlay_holds_until_on_flush_finishes(queue):
+    seen = []
+    queue.on_flush = lambda written: seen.append(queue.pending("U1"))
+    queue.submit("U1", 1, stars=9, review="buenísima")
+    queue.flush()
+    assert [r["review"] for r in seen[0]] == ["buenísima"]
+    assert queue.pending("U1") == []
+
+
+def test_on_flush_error_does_not_escape(queue):
+    def boom(written):
+        raise RuntimeError("seed_feeds")
+    queue.on_flush = boom
+    queue.submit("U1", 1, stars=9)
+    assert queue.flush() == 1
+    assert queue.flush_errors == 1
+    assert queue.pending() == []
@@ -0,0 +1,178 @@
+"""Cola write-behind para los ratings (reseñas, "Marcar como vista", watchlist).
+
+Cada acción deja la fila en un dict por `(user_id, id)` y vuelve al instante:
+si el mismo usuario reenvía la reseña o toca varios botones seguidos, la
+última escritura pisa a las anteriores. Un borrado es una entrada más (None)
+en el mismo dict. Un worker en segundo plano espera `window` segundos desde
+la primera escritura de la ráfaga y manda todo lo acumulado: un solo upsert
+por `(user_id, id)` (ver migrations/002) y un delete por usuario.
+
+Mientras una fila no llegó a la base, `overlay` la superpone a lo leído para
+que la UI muestre lo que el usuario acaba de hacer; sigue superpuesta hasta
+que termina `on_flush`, que es donde se recargan las cachés. Si la escritura
+falla por un error pasajero, las filas vuelven a la cola (salvo que ya haya
+una más nueva) y se reintenta con backoff. Si falla por un error que no se va
+a arreglar solo (`permanent(e)`, p. ej. la FK de una serie borrada), el lote
+se parte en mitades hasta aislar las filas culpables, que quedan en
+`rejections` para mostrárselas al usuario; el resto se escribe igual.
+"""
+import atexit
+import os
+import threading
+import time
+
+WRITE_WINDOW = float(os.environ.get("RATINGS_WRITE_WINDOW", "1.5"))
+MAX_BACKOFF = 30.0
+
+
+class RatingWriteQueue:
+    def __init__(self, write, delete, on_flush=None, window: float = WRITE_WINDOW, permanent=None):
+        self.write = write
+        self.delete = delete
+        self.on_flush = on_flush
+        self.window = window
+        self.permanent = permanent or (lambda e: False)
+        self.failures = 0
+        self.last_error = None
+        self.flush_errors = 0
+        self._pending = {}
+        self._inflight = {}
+        self._rejected = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        atexit.register(self.flush)
+
+    def submit(self, user_id, series_id, stars=None, review="", status="watched") -> dict:
+        row = {"user_id": user_id, "id": series_id, "stars": stars, "review": review, "status": status}
+        self._enqueue({(user_id, series_id): row})
+        return row
+
+    def submit_many(self, rows):
+        self._enqueue({(r["user_id"], r["id"]): dict(r) for r in rows})
+
+    def remove(self, user_id, series_ids):
+        self._enqueue({(user_id, series_id): None for series_id in series_ids})
+
+    def _enqueue(self, entries: dict):
+        if not entries:
+            return
+        with self._lock:
+            self._pending.update(entries)
+            for key in entries:
+                self._rejected.pop(key, None)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="ratings-write-behind", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _entries(self, user_id=None, series_id=None) -> dict:
+        # Las de la cola pisan a las que están en vuelo
+        with self._lock:
+            entries = {**self._inflight, **self._pending}
+        return {(uid, sid): r for (uid, sid), r in entries.items()
+                if (user_id is None or uid == user_id) and (series_id is None or sid == series_id)}
+
+    def pending(self, user_id=None, series_id=None) -> list:
+        """Filas escritas que la base todavía no confirmó (sin los borrados)."""
+        return [r for r in self._entries(user_id, series_id).values() if r is not None]
+
+    def overlay(self, rows, user_id=None, series_id=None) -> list:
+        """`rows` leídas de la base con las escrituras y borrados pendientes encima."""
+        pending = self._entries(user_id, series_id)
+        if not pending:
+            return list(rows)
+        merged = []
+        for r in rows:
+            key = (r.get("user_id"), r.get("id"))
+            if key not in pending:
+                merged.append(r)
+            elif pending[key] is not None:
+                merged.append({**r, **pending.pop(key)})
+        return merged + [r for r in pending.values() if r is not None]
+
+    def rejections(self, user_id) -> list:
+        """`(serie, fila, error)` que la base rechazó para `user_id` (fila None si era un borrado)."""
+        with self._lock:
+            return [(series_id, row, error) for (uid, series_id), (row, error) in self._rejected.items()
+                    if uid == user_id]
+
+    def dismiss(self, user_id):
+        with self._lock:
+            for key in [key for key in self._rejected if key[0] == user_id]:
+                del self._rejected[key]
+
+    def _loop(self):
+        while True:
+            self._wake.wait()
+            # Junta el resto de la ráfaga antes de escribir
+            time.sleep(self.window)
+            self.flush()
+            if self.failures:
+                time.sleep(min(self.window * 2 ** self.failures, MAX_BACKOFF))
+
+    def _send(self, batch: dict) -> dict:
+        """Escribe `batch`; devuelve `{clave: (fila, error)}` de las que la base rechaza."""
+        rows = [r for r in batch.values() if r is not None]
+        deletes = {}
+        for (user_id, series_id), r in batch.items():
+            if r is None:
+                deletes.setdefault(user_id, []).append(series_id)
+        try:
+            if rows:
+                self.write(rows)
+            for user_id, series_ids in deletes.items():
+                self.delete(user_id, series_ids)
+            return {}
+        except Exception as e:
+            if not self.permanent(e):
+                raise
+            if len(batch) == 1:
+                return {key: (row, e) for key, row in batch.items()}
+            # Upserts y deletes son idempotentes: repetir la mitad buena no hace daño
+            items = list(batch.items())
+            half = len(items) // 2
+            return {**self._send(dict(items[:half])), **self._send(dict(items[half:]))}
+
+    def flush(self) -> int:
+        """Escribe ya todo lo pendiente; devuelve cuántas filas entraron."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+                self._wake.clear()
+            if not batch:
+                return 0
+            try:
+                rejected = self._send(batch)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = e
+                with self._lock:
+                    for key, row in batch.items():
+                        self._pending.setdefault(key, row)
+                    self._inflight = {}
+                self._wake.set()
+                return 0
+            self.failures = 0
+            self.last_error = None
+            written = {key: row for key, row in batch.items() if key not in rejected}
+            with self._lock:
+                for key, (row, error) in rejected.items():
+                    # Una más nueva en la cola la va a reemplazar
+                    if key not in self._pending:
+                        self._rejected[key] = (row, error)
+                # Las rechazadas dejan de superponerse ya
+                self._inflight = written
+            try:
+                if self.on_flush and written:
+                    self.on_flush(written)
+            except Exception as e:
+                # Un error recargando cachés no puede matar al worker
+                self.flush_errors += 1
+                self.last_error = e
+            finally:
+                with self._lock:
+                    self._inflight = {}
+        return len(written)